@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+# 實價登錄正規化效能比較：逐格 apply（舊版）vs 整欄向量化（_prepare_real_price_df）
+# 用法：python benchmarks/real_price_normalizer.py [重複次數]
+import os
+import sys
+import time
+from unittest import mock
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from components import real_price as rp
+
+
+def prepare_rowwise(raw_df, city):
+    """舊版作法：每一格呼叫一次 _parse_number / _parse_tw_date"""
+    with mock.patch.object(rp, "_parse_number_series", lambda s: s.apply(rp._parse_number)), \
+         mock.patch.object(rp, "_parse_tw_date_series", lambda s: s.apply(rp._parse_tw_date)):
+        return rp._prepare_real_price_df(raw_df, city)
+
+
+def best_of(func, repeat):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main(repeat=3, city="臺中市"):
+    folder = rp.REAL_PRICE_DATA_DIR / rp.CITY_FOLDER_MAP[city]
+    files = sorted(folder.glob("*.csv"))
+    if not files:
+        print(f"找不到實價登錄 CSV：{folder}")
+        return
+
+    print(f"{'檔案':<12}{'列數':>8}{'逐格(ms)':>12}{'向量化(ms)':>12}{'加速':>8}")
+    total_rowwise = total_vector = total_rows = 0
+    for file_path in files:
+        raw = rp._read_manual_real_price_csv(file_path)
+        t_rowwise, expected = best_of(lambda: prepare_rowwise(raw, city), repeat)
+        t_vector, actual = best_of(lambda: rp._prepare_real_price_df(raw, city), repeat)
+        pd.testing.assert_frame_equal(expected, actual, check_exact=True)
+
+        total_rowwise += t_rowwise
+        total_vector += t_vector
+        total_rows += len(raw)
+        print(f"{file_path.name:<12}{len(raw):>8}{t_rowwise * 1000:>12.1f}{t_vector * 1000:>12.1f}"
+              f"{t_rowwise / t_vector:>7.1f}x")
+
+    print(f"{'合計':<12}{total_rows:>8}{total_rowwise * 1000:>12.1f}{total_vector * 1000:>12.1f}"
+          f"{total_rowwise / total_vector:>7.1f}x")
+    print("輸出與逐格版本完全一致")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 3)
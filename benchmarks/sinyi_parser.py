@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+# 信義列表頁解析效能比較：BeautifulSoup（sinyi_parser）vs selectolax（sinyi_fast_parser）
+# 先逐頁確認兩者輸出完全相同，再以每秒解析的卡片數比較速度
+# 用法：python benchmarks/sinyi_parser.py <HTML 目錄> [重複次數]
+# 語料可在抓取時設定 SAVE_HTML_DIR 保存：SAVE_HTML_DIR=./Data/pages python download_data/sinyi_taichung_buy.py
+import contextlib
+import io
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "download_data"))
+
+from sinyi_fast_parser import FAST_PARSER_AVAILABLE, parse_list_page_fast
+from sinyi_parser import parse_list_page
+
+
+def count_cards(html):
+    """頁面上的卡片數（含被類型過濾掉的卡片），以 BeautifulSoup 計算"""
+    from bs4 import BeautifulSoup
+    return len(BeautifulSoup(html, 'html.parser').find_all('div', class_='buy-list-item'))
+
+
+def best_of(func, pages, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        # 解析錯誤訊息不列入計時輸出
+        with contextlib.redirect_stdout(io.StringIO()):
+            for html in pages:
+                func(html)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(corpus_dir, repeat=3):
+    if not FAST_PARSER_AVAILABLE:
+        print("未安裝 selectolax：pip install selectolax")
+        return
+
+    files = sorted(Path(corpus_dir).glob("*.html"))
+    if not files:
+        print(f"找不到 HTML 語料：{corpus_dir}")
+        return
+    pages = [f.read_text(encoding="utf-8") for f in files]
+
+    mismatched = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for f, html in zip(files, pages):
+            if parse_list_page(html) != parse_list_page_fast(html):
+                mismatched.append(f.name)
+    if mismatched:
+        print(f"❌ {len(mismatched)} 頁輸出不一致：{', '.join(mismatched[:10])}")
+        return
+
+    cards = sum(count_cards(html) for html in pages)
+    slow = best_of(parse_list_page, pages, repeat)
+    fast = best_of(parse_list_page_fast, pages, repeat)
+
+    print(f"語料：{len(pages)} 頁、{cards} 張卡片，兩種解析輸出完全相同")
+    print(f"{'解析器':<16}{'耗時(ms)':>12}{'卡片/秒':>12}")
+    print(f"{'BeautifulSoup':<16}{slow * 1000:>12.1f}{cards / slow:>12.0f}")
+    print(f"{'selectolax':<16}{fast * 1000:>12.1f}{cards / fast:>12.0f}")
+    print(f"加速 {slow / fast:.1f}x")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("用法：python benchmarks/sinyi_parser.py <HTML 目錄> [重複次數]")
+        sys.exit(1)
+    main(sys.argv[1], int(sys.argv[2]) if len(sys.argv) > 2 else 3)
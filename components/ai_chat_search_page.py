@@ -1,9 +1,13 @@
 import streamlit as st
-import google.generativeai as genai
 import json
 import pandas as pd
-import re
 from components.favorites import FavoritesManager, normalize_property_id
+from components.listing_store import load_listing_store
+from components.llm_gateway import get_model as get_gemini_model
+from components.listing_index import get_listing_index
+from components.query_parser import get_query_parser_stats, parse_query
+from components.result_set import reuse_result_set
+from components.similarity import SIMILARITY_THRESHOLD, select_similar, similarity_scores
 
 def render_ai_chat_search():
     st.header("🤖 AI 房市顧問")
@@ -15,8 +19,7 @@ def render_ai_chat_search():
         st.stop()
 
     try:
-        genai.configure(api_key=gemini_key)
-        model = genai.GenerativeModel('gemini-2.5-flash')
+        model = get_gemini_model(gemini_key, 'gemini-2.5-flash')
     except Exception as e:
         st.error(f"❌ Gemini 初始化錯誤：{e}")
         st.stop()
@@ -34,10 +37,16 @@ def render_ai_chat_search():
 
     if 'ai_latest_filters' in st.session_state and 'ai_latest_reply' in st.session_state:
         with st.chat_message("assistant"):
-            st.success("✅ 已解析您的需求")
+            if st.session_state.get('ai_parse_source') == "local":
+                st.success("✅ 已解析您的需求（本地規則解析，未呼叫 AI）")
+            else:
+                st.success("✅ 已解析您的需求")
+            parser_stats = get_query_parser_stats()
+            st.caption(f"本地解析涵蓋率 {parser_stats['coverage_rate']:.0%}"
+                       f"（{parser_stats['local']} / {parser_stats['queries']} 次查詢未呼叫 AI）")
 
     if prompt := st.chat_input("請輸入查詢條件，例如：『台中市西屯區 2000 萬內 3房2廳2衛 5樓以上』"):
-        for key in ['ai_latest_filters', 'ai_latest_reply', 'ai_debug_info', 'ai_search_result_text']:
+        for key in ['ai_latest_filters', 'ai_latest_reply', 'ai_debug_info', 'ai_search_result_text', 'ai_parse_source']:
             if key in st.session_state:
                 del st.session_state[key]
 
@@ -48,7 +57,13 @@ def render_ai_chat_search():
         with st.spinner("AI 正在分析您的查詢，並篩選資料中..."):
             result_text = ""
             try:
-                system_prompt = """
+                # 常見說法先以本地規則解析，有看不懂的內容才呼叫 Gemini
+                filters = parse_query(prompt)
+                if filters is not None:
+                    ai_reply = json.dumps(filters, ensure_ascii=False)
+                    st.session_state.ai_parse_source = "local"
+                else:
+                    system_prompt = """
 你是一個房產搜尋助手。請根據使用者的自然語言查詢，提取出搜尋條件。
 
 請以 JSON 格式回傳，格式如下：
@@ -81,14 +96,16 @@ def render_ai_chat_search():
 - 格局：「3房2廳2衛」→ rooms:3, living_rooms:2, bathrooms:2
 - 樓層：「5樓以上」→ floor_min:5；「10樓以下」→ floor_max:10
 """
-                full_prompt = f"{system_prompt}\n\n使用者查詢：{prompt}"
-                response = model.generate_content(full_prompt)
-                ai_reply = response.text.strip()
+                    full_prompt = f"{system_prompt}\n\n使用者查詢：{prompt}"
+                    response = model.generate_content(full_prompt)
+                    ai_reply = response.text.strip()
+
+                    if ai_reply.startswith("```json"):
+                        ai_reply = ai_reply.replace("```json", "").replace("```", "").strip()
 
-                if ai_reply.startswith("```json"):
-                    ai_reply = ai_reply.replace("```json", "").replace("```", "").strip()
+                    filters = json.loads(ai_reply)
+                    st.session_state.ai_parse_source = "llm"
 
-                filters = json.loads(ai_reply)
                 st.session_state.ai_latest_filters = filters
                 st.session_state.ai_latest_reply = ai_reply
                 st.session_state.ai_layout_target = {
@@ -105,185 +122,18 @@ def render_ai_chat_search():
                 if not csv_file:
                     result_text = "❌ 不支援的城市"
                 else:
-                    df = pd.read_csv(f"./Data/{csv_file}")
-
-                    def parse_layout(layout_str):
-                        if pd.isna(layout_str) or not isinstance(layout_str, str):
-                            return None, None, None, None
-                        rooms  = re.search(r'(\d+)房', layout_str)
-                        living = re.search(r'(\d+)廳', layout_str)
-                        bath   = re.search(r'(\d+)衛', layout_str)
-                        study  = re.search(r'(\d+)室', layout_str)
-                        return (
-                            int(rooms.group(1))  if rooms  else None,
-                            int(living.group(1)) if living else None,
-                            int(bath.group(1))   if bath   else None,
-                            int(study.group(1))  if study  else None,
-                        )
-
-                    if '格局' in df.columns:
-                        df[['房間數', '廳數', '衛數', '室數']] = df['格局'].apply(
-                            lambda x: pd.Series(parse_layout(x))
-                        )
-
-                    def quick_parse_district(addr):
-                        if pd.isna(addr) or not isinstance(addr, str):
-                            return ""
-                        match = re.search(r'[市縣](.+?[區鄉鎮市])', addr)
-                        return match.group(1) if match else ""
-
-                    if '地址' in df.columns:
-                        df['行政區'] = df['地址'].apply(quick_parse_district)
-
-                    def parse_floor(floor_str):
-                        if pd.isna(floor_str) or not isinstance(floor_str, str):
-                            return None
-                        match = re.search(r'^(\d+)樓', floor_str)
-                        return int(match.group(1)) if match else None
-
-                    if '樓層' in df.columns:
-                        df['實際樓層'] = df['樓層'].apply(parse_floor)
-
-                    filtered_df = df.copy()
-
-                    num_cols = {
-                        '總價(萬)': 'budget', '屋齡': 'age', '建坪': 'area',
-                        '房間數': 'rooms', '廳數': 'living_rooms',
-                        '衛數': 'bathrooms', '室數': 'study_rooms', '實際樓層': 'floor'
-                    }
-                    for col in num_cols.keys():
-                        if col in filtered_df.columns:
-                            cleaned = filtered_df[col].astype(str).str.replace(',', '')
-                            if col == '屋齡':
-                                cleaned = cleaned.str.replace('年', '').str.strip()
-                            filtered_df[col] = pd.to_numeric(cleaned, errors='coerce')
-
-                    # ── 只保留類型和車位的硬性過濾，其他改為相似度計算 ──
-                    if filters.get('housetype') and filters['housetype'] != "不限":
-                        if '類型' in filtered_df.columns:
-                            filtered_df = filtered_df[
-                                filtered_df['類型'].astype(str).str.contains(
-                                    filters['housetype'], case=False, na=False
-                                )
-                            ]
-
-                    if 'car_grip' in filters and '車位' in filtered_df.columns:
-                        if filters['car_grip'] == "需要":
-                            filtered_df = filtered_df[
-                                (filtered_df['車位'].notna()) &
-                                (filtered_df['車位'] != "無車位") &
-                                (filtered_df['車位'] != 0)
-                            ]
-                        elif filters['car_grip'] == "不要":
-                            filtered_df = filtered_df[
-                                (filtered_df['車位'].isna()) |
-                                (filtered_df['車位'] == "無車位") |
-                                (filtered_df['車位'] == 0)
-                            ]
-
-                    # ── 相似度計算函式 ──
-                    def calc_similarity(row, filters):
-                        scores = []
-
-                        target_district = filters.get('district', '')
-                        if target_district and target_district != '不限':
-                            row_district = str(row.get('行政區', ''))
-                            dist_list = [d.strip() for d in target_district.replace('、', ',').replace('，', ',').split(',') if d.strip()]
-                            district_match = any(d in row_district or row_district in d for d in dist_list)
-                            scores.append(100 if district_match else 30)
-
-                        bmin = filters.get('budget_min', 0)
-                        bmax = filters.get('budget_max', 0)
-                        if bmin > 0 or bmax > 0:
-                            raw_price = row.get('總價(萬)', 0)
-                            price = 0 if (raw_price is None or (isinstance(raw_price, float) and pd.isna(raw_price))) else float(raw_price)
-                            if bmin > 0 and bmax > 0:
-                                if bmin <= price <= bmax:
-                                    scores.append(100)
-                                elif price < bmin:
-                                    scores.append(max(0, round(100 - (bmin - price) / bmin * 150)))
-                                else:
-                                    scores.append(max(0, round(100 - (price - bmax) / bmax * 150)))
-                            elif bmax > 0:
-                                scores.append(100 if price <= bmax else max(0, round(100 - (price - bmax) / bmax * 150)))
-                            elif bmin > 0:
-                                scores.append(100 if price >= bmin else max(0, round(100 - (bmin - price) / bmin * 150)))
-
-                        layout_dims = [('房間數', 'rooms'), ('廳數', 'living_rooms'), ('衛數', 'bathrooms')]
-                        layout_scores = []
-                        for lcol, lkey in layout_dims:
-                            ltarget = filters.get(lkey, 0)
-                            if ltarget > 0:
-                                raw = row.get(lcol, 0)
-                                lactual = 0 if (raw is None or (isinstance(raw, float) and pd.isna(raw))) else int(raw)
-                                if lactual == ltarget:
-                                    layout_scores.append(100)
-                                elif lactual > ltarget:
-                                    layout_scores.append(max(60, round(100 - (lactual - ltarget) * 15)))
-                                else:
-                                    layout_scores.append(max(0, round(100 - (ltarget - lactual) * 35)))
-                        if layout_scores:
-                            scores.append(round(sum(layout_scores) / len(layout_scores)))
-
-                        fmin = filters.get('floor_min', 0)
-                        fmax = filters.get('floor_max', 0)
-                        if fmin > 0 or fmax > 0:
-                            raw_floor = row.get('實際樓層', 0)
-                            floor = 0 if (raw_floor is None or (isinstance(raw_floor, float) and pd.isna(raw_floor))) else int(raw_floor)
-                            if fmin > 0 and fmax > 0:
-                                if fmin <= floor <= fmax:
-                                    scores.append(100)
-                                elif floor < fmin:
-                                    scores.append(max(0, round(100 - (fmin - floor) * 20)))
-                                else:
-                                    scores.append(max(0, round(100 - (floor - fmax) * 20)))
-                            elif fmin > 0:
-                                scores.append(100 if floor >= fmin else max(0, round(100 - (fmin - floor) * 20)))
-                            elif fmax > 0:
-                                scores.append(100 if floor <= fmax else max(0, round(100 - (floor - fmax) * 20)))
-
-                        amin = filters.get('area_min', 0)
-                        amax = filters.get('area_max', 0)
-                        if amin > 0 or amax > 0:
-                            raw_area = row.get('建坪', 0)
-                            area = 0 if (raw_area is None or (isinstance(raw_area, float) and pd.isna(raw_area))) else float(raw_area)
-                            if amin > 0 and amax > 0:
-                                if amin <= area <= amax:
-                                    scores.append(100)
-                                elif area < amin:
-                                    scores.append(max(0, round(100 - (amin - area) / amin * 150)))
-                                else:
-                                    scores.append(max(0, round(100 - (area - amax) / amax * 150)))
-                            elif amin > 0:
-                                scores.append(100 if area >= amin else max(0, round(100 - (amin - area) / amin * 150)))
-                            elif amax > 0:
-                                scores.append(100 if area <= amax else max(0, round(100 - (area - amax) / amax * 150)))
-
-                        age_min = filters.get('age_min', 0)
-                        age_max = filters.get('age_max', 0)
-                        if age_min > 0 or age_max > 0:
-                            raw_age = row.get('屋齡', 0)
-                            age = 0 if (raw_age is None or (isinstance(raw_age, float) and pd.isna(raw_age))) else float(raw_age)
-                            if age_min > 0 and age_max > 0:
-                                if age_min <= age <= age_max:
-                                    scores.append(100)
-                                elif age < age_min:
-                                    scores.append(max(0, round(100 - (age_min - age) * 8)))
-                                else:
-                                    scores.append(max(0, round(100 - (age - age_max) * 8)))
-                            elif age_max > 0:
-                                scores.append(100 if age <= age_max else max(0, round(100 - (age - age_max) * 8)))
-                            elif age_min > 0:
-                                scores.append(100 if age >= age_min else max(0, round(100 - (age_min - age) * 8)))
-
-                        if not scores:
-                            return 100
-                        return round(sum(scores) / len(scores))
-
-                    filtered_df['相似度'] = filtered_df.apply(
-                        lambda row: calc_similarity(row, filters), axis=1
-                    )
-                    filtered_df = filtered_df[filtered_df['相似度'] >= 70].reset_index(drop=True)
+                    # 共用房源資料：格局、行政區、實際樓層與數值欄位已預先解析
+                    df = load_listing_store(csv_file).chat_frame()
+
+                    # ── 只保留類型和車位的硬性過濾（走搜尋索引），其他改為相似度計算 ──
+                    hard_filters = {k: filters[k] for k in ('housetype', 'car_grip') if k in filters}
+                    rows = get_listing_index(df).query(hard_filters)
+
+                    # ── 相似度：各條件整欄計算，保留 >= 70 分的物件（原本順序）──
+                    scores = similarity_scores(df, filters, rows)
+                    selected = select_similar(scores, SIMILARITY_THRESHOLD)
+                    filtered_df = df.iloc[rows[selected]].reset_index(drop=True)
+                    filtered_df['相似度'] = scores[selected]
 
                     st.session_state.ai_search_count += 1
                     st.session_state.ai_filtered_df = filtered_df
@@ -307,7 +157,9 @@ def render_ai_chat_search():
     # ── 顯示搜尋結果 ──
     if 'ai_filtered_df' in st.session_state and not st.session_state.ai_filtered_df.empty:
         st.markdown("---")
-        df = st.session_state.ai_filtered_df.copy()
+        # 同一次搜尋的結果集跨 rerun 沿用，各排序方式只算一次
+        results = reuse_result_set(st.session_state.get('ai_results'), st.session_state.ai_filtered_df)
+        st.session_state.ai_results = results
 
         sort_options = {
             "相似度由高到低": ("相似度", False),
@@ -332,18 +184,12 @@ def render_ai_chat_search():
                 label_visibility="collapsed"
             )
 
-        sort_col_name, ascending = sort_options[selected_sort]
-        if sort_col_name in df.columns:
-            df = df.sort_values(sort_col_name, ascending=ascending, na_position='last')
-
         items_per_page = 10
-        total_items = len(df)
-        total_pages = (total_items + items_per_page - 1) // items_per_page
-        current_page = st.session_state.get('ai_current_page', 1)
-        current_page = max(1, min(current_page, total_pages))
+        current_page_data, current_page, total_pages, total_items = results.page(
+            st.session_state.get('ai_current_page', 1), items_per_page, sort_options[selected_sort]
+        )
         start_idx = (current_page - 1) * items_per_page
         end_idx = min(start_idx + items_per_page, total_items)
-        current_page_data = df.iloc[start_idx:end_idx]
 
         for idx, (index, row) in enumerate(current_page_data.iterrows()):
             with st.container():
@@ -0,0 +1,66 @@
+# components/city_registry.py
+# 房源城市對照：中文名稱 ↔ 信義城市代碼 ↔ 房源 CSV 檔名
+# 爬蟲寫出新城市時登記到 Data/cities.json，城市選單與 name_map 直接由這裡產生
+import json
+import os
+import threading
+import time
+
+from config import DATA_FOLDER, SINYI_CITIES
+
+
+CITY_MANIFEST = "cities.json"
+
+_MANIFEST_LOCK = threading.Lock()
+
+
+def listing_file_name(slug):
+    """城市代碼 → 房源 CSV 檔名，例如 Taichung-city → Taichung-city_buy_properties.csv"""
+    return f"{slug}_buy_properties.csv"
+
+
+def slug_from_listing_file(file_name):
+    """房源 CSV 檔名 → 城市代碼（listing_file_name 的反向）"""
+    return os.path.basename(file_name).removesuffix("_buy_properties.csv")
+
+
+def resolve_city(value):
+    """中文名稱（臺 / 台皆可）或城市代碼 → (代碼, 顯示名稱)；不認得時回傳 (value, value)"""
+    value = str(value).strip()
+    name = value.replace("臺", "台")
+    if name in SINYI_CITIES:
+        return SINYI_CITIES[name], name
+    for city_name, slug in SINYI_CITIES.items():
+        if slug.lower() == value.lower():
+            return slug, city_name
+    return value, value
+
+
+def read_manifest(data_dir=DATA_FOLDER):
+    """爬蟲登記的城市 {檔名: {"name", "slug", "rows", "updated_at"}}；沒有或損毀時回傳空 dict"""
+    try:
+        with open(os.path.join(data_dir, CITY_MANIFEST), encoding="utf-8") as f:
+            manifest = json.load(f)
+        return manifest if isinstance(manifest, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def register_city(slug, name, data_dir=DATA_FOLDER, **info):
+    """登記（或更新）一個已寫出房源 CSV 的城市；多執行緒同時呼叫也安全"""
+    path = os.path.join(data_dir, CITY_MANIFEST)
+    with _MANIFEST_LOCK:
+        manifest = read_manifest(data_dir)
+        manifest[listing_file_name(slug)] = {"name": name, "slug": slug, "updated_at": time.time(), **info}
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2, sort_keys=True)
+        os.replace(tmp_path, path)
+
+
+def listing_name_map(data_dir=DATA_FOLDER):
+    """房源 CSV 檔名 → 城市顯示名稱：內建的城市代碼表加上爬蟲登記的城市"""
+    name_map = {listing_file_name(slug): name for name, slug in SINYI_CITIES.items()}
+    for file_name, entry in read_manifest(data_dir).items():
+        name_map.setdefault(file_name, entry.get("name") or file_name)
+    return name_map
@@ -0,0 +1,164 @@
+# components/columnar_cache.py
+# CSV → 欄式快取（Arrow IPC / Feather）：正規化結果寫在原始檔旁邊，來源沒變就直接 memory-map 讀回
+import hashlib
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+    PYARROW_AVAILABLE = True
+except Exception:
+    PYARROW_AVAILABLE = False
+
+
+CACHE_SUFFIX = ".feather"
+CACHE_META_KEY = b"source_cache"
+
+
+def cache_path_for(source_path):
+    """來源 CSV 對應的快取檔：同資料夾、同檔名、副檔名換成 .feather"""
+    source_path = Path(source_path)
+    return source_path.with_suffix(CACHE_SUFFIX)
+
+
+def source_signature(source_path):
+    stat = os.stat(source_path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def file_sha1(source_path, chunk_size=1 << 20):
+    digest = hashlib.sha1()
+    with open(source_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def read_cache_meta(cache_path):
+    """只讀快取檔的 schema metadata，不載入資料"""
+    if not PYARROW_AVAILABLE or not Path(cache_path).exists():
+        return None
+    try:
+        reader = pa.ipc.open_file(pa.memory_map(str(cache_path), "r"))
+        metadata = reader.schema.metadata or {}
+        raw = metadata.get(CACHE_META_KEY)
+        return json.loads(raw) if raw else None
+    except Exception:
+        return None
+
+
+def _read_table(cache_path):
+    return pa.ipc.open_file(pa.memory_map(str(cache_path), "r")).read_all()
+
+
+def _write_table(table, cache_path, meta):
+    metadata = dict(table.schema.metadata or {})
+    metadata[CACHE_META_KEY] = json.dumps(meta).encode("utf-8")
+    table = table.replace_schema_metadata(metadata)
+
+    cache_path = Path(cache_path)
+    tmp_path = cache_path.with_name(f".{cache_path.name}.{os.getpid()}.tmp")
+    with pa.OSFile(str(tmp_path), "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp_path, cache_path)
+
+
+def load_with_columnar_cache(source_path, builder, schema):
+    """
+    讀取 source_path 的正規化結果，優先使用欄式快取。
+
+    builder(source_path) 負責把原始 CSV 轉成 DataFrame；schema 是正規化邏輯的
+    版本字串，改了正規化規則就換 schema，舊快取會自動失效。
+    快取以來源檔大小 / mtime 判斷；mtime 變了但內容 SHA-1 相同（例如重新 checkout）
+    時只更新 metadata，不重建。回傳 (DataFrame, meta)，meta 含來源的 sha1。
+    無 pyarrow 或快取寫入失敗時直接回傳 builder 的結果。
+    """
+    source_path = Path(source_path)
+    signature = source_signature(source_path)
+
+    if not PYARROW_AVAILABLE:
+        meta = {"schema": schema, "sha1": file_sha1(source_path), **signature}
+        return builder(source_path), meta
+
+    cache_path = cache_path_for(source_path)
+    meta = read_cache_meta(cache_path)
+    if meta and meta.get("schema") == schema:
+        if meta.get("size") == signature["size"] and meta.get("mtime_ns") == signature["mtime_ns"]:
+            try:
+                return _read_table(cache_path).to_pandas(), meta
+            except Exception:
+                pass
+        elif meta.get("size") == signature["size"]:
+            sha1 = file_sha1(source_path)
+            if meta.get("sha1") == sha1:
+                try:
+                    table = _read_table(cache_path)
+                    meta = {"schema": schema, "sha1": sha1, **signature}
+                    try:
+                        _write_table(table, cache_path, meta)
+                    except Exception:
+                        pass
+                    return table.to_pandas(), meta
+                except Exception:
+                    pass
+
+    meta = {"schema": schema, "sha1": file_sha1(source_path), **signature}
+    df = builder(source_path)
+    try:
+        _write_table(pa.Table.from_pandas(df, preserve_index=False), cache_path, meta)
+    except Exception:
+        pass
+    return df, meta
+
+
+def build_all_caches(verbose=True):
+    """建置步驟：預先產生所有房源 CSV 與實價登錄 CSV 的欄式快取，只重建來源有變的檔案"""
+    from config import DATA_FOLDER
+    from components.listing_store import LISTING_CACHE_SCHEMA, read_listing_csv
+    from components.real_price import CITY_FOLDER_MAP, REAL_PRICE_DATA_DIR, load_real_price_file_cached
+
+    results = []
+
+    def run(label, source_path, loader):
+        cache_path = cache_path_for(source_path)
+        before = read_cache_meta(cache_path)
+        start = time.perf_counter()
+        df = loader()
+        elapsed = time.perf_counter() - start
+        after = read_cache_meta(cache_path)
+        status = "reuse" if before and after and before.get("sha1") == after.get("sha1") and before.get("schema") == after.get("schema") else "build"
+        results.append((label, status, len(df), elapsed))
+        if verbose:
+            print(f"[{status}] {label}: {len(df)} 筆，{elapsed * 1000:.0f} ms")
+
+    data_dir = Path(DATA_FOLDER)
+    for source_path in sorted(data_dir.glob("*_buy_properties.csv")):
+        run(source_path.name, source_path,
+            lambda p=source_path: load_with_columnar_cache(p, read_listing_csv, LISTING_CACHE_SCHEMA)[0])
+
+    cities = {}
+    for city, folder_name in CITY_FOLDER_MAP.items():
+        cities.setdefault(folder_name, city)
+    for folder_name, city in sorted(cities.items()):
+        folder_path = REAL_PRICE_DATA_DIR / folder_name
+        for source_path in sorted(folder_path.glob("*.csv")):
+            run(f"{folder_name}/{source_path.name}", source_path,
+                lambda p=source_path, c=city: load_real_price_file_cached(p, c))
+
+    return results
+
+
+if __name__ == "__main__":
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    parent_dir = os.path.dirname(current_dir)
+    if parent_dir not in sys.path:
+        sys.path.insert(0, parent_dir)
+    if not PYARROW_AVAILABLE:
+        print("未安裝 pyarrow，無法建立欄式快取")
+        sys.exit(1)
+    build_all_caches()
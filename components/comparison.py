@@ -7,7 +7,6 @@ import time
 import json
 import sys
 import os
-import requests
 import math
 import hashlib
 from streamlit.components.v1 import html
@@ -52,7 +51,8 @@ if parent_dir not in sys.path:
 try:
     from config import CATEGORY_COLORS, DEFAULT_RADIUS
     from components.place_types import PLACE_TYPES, CHINESE_TO_CATEGORY, NUISANCE_TYPES, IMPACT_TYPES
-    from components.geocoding import geocode_address, haversine
+    from components.geocoding import geocode_addresses
+    from components.places_fetch import PlacesClient
     CONFIG_LOADED = True
 except ImportError as e:
     CONFIG_LOADED = False
@@ -69,6 +69,8 @@ try:
         load_cached_real_price_data,
         filter_nearby_transactions,
         calculate_price_metrics,
+        CityValuation,
+        get_real_price_cube,
         render_real_price_analysis,
         format_real_price_metrics_for_prompt,
         infer_city_from_address,
@@ -93,6 +95,8 @@ except Exception as real_price_import_error:
         load_cached_real_price_data = real_price_module.load_cached_real_price_data
         filter_nearby_transactions = real_price_module.filter_nearby_transactions
         calculate_price_metrics = real_price_module.calculate_price_metrics
+        CityValuation = real_price_module.CityValuation
+        get_real_price_cube = real_price_module.get_real_price_cube
         render_real_price_analysis = real_price_module.render_real_price_analysis
         format_real_price_metrics_for_prompt = real_price_module.format_real_price_metrics_for_prompt
         infer_city_from_address = real_price_module.infer_city_from_address
@@ -959,13 +963,18 @@ class ComparisonAnalyzer:
                 # 步驟1：解析地址
                 st.write("📌 步驟 1/4：解析地址...")
                 houses_data = {}
-                for i, opt in enumerate(s["houses"]):
-                    h = fav_df[(fav_df['標題'] + " | " + fav_df['地址']) == opt].iloc[0]
+                selected_rows = [
+                    fav_df[(fav_df['標題'] + " | " + fav_df['地址']) == opt].iloc[0]
+                    for opt in s["houses"]
+                ]
+                # 全部地址一次批次解析，已快取的地址不會再呼叫 API
+                coords = geocode_addresses([h["地址"] for h in selected_rows], s["server"])
+                for i, h in enumerate(selected_rows):
                     raw_title = str(h.get('\u6a19\u984c', '')).strip()
                     name = raw_title[:30] if raw_title else f'\u672a\u547d\u540d\u623f\u5c4b{i+1}'
                     if name in houses_data:
                         name = f'{name}-{i+1}'
-                    lat, lng = geocode_address(h["地址"], s["server"])
+                    lat, lng = coords.get(h["地址"], (None, None))
                     if not lat or not lng:
                         st.error(f"❌ {name} 地址解析失敗")
                         st.session_state.analysis_in_progress = False
@@ -977,14 +986,24 @@ class ComparisonAnalyzer:
                         "property_summary": self._extract_house_summary(h)
                     }
                 
-                # 步驟2：查詢生活機能設施
+                # 步驟2：查詢生活機能設施（所有房屋 × 關鍵字一次並行送出）
                 st.write("🔍 步驟 2/4：查詢周邊生活機能設施...")
+                keywords = self._place_keywords(s["cats"], s["subs"], s["keyword"])
+                if s.get("include_nuisance", False) and s.get("selected_nuisances"):
+                    keywords += self._nuisance_keywords(s["selected_nuisances"])
+                queries = [
+                    (info["lat"], info["lng"], keyword, s["radius"])
+                    for info in houses_data.values() for keyword in keywords
+                ]
+                st.write(f"   - 同時查詢 {len(houses_data)} 間房屋、{len(set(keywords))} 個關鍵字...")
+                fetched = self._fetch_places(s["server"], queries)
+
                 places_data = {}
                 for idx, (name, info) in enumerate(houses_data.items()):
-                    st.write(f"   - 查詢 {name} 周邊設施...")
                     places = self._query_places_chinese_no_progress(
                         info["lat"], info["lng"], s["server"],
-                        s["cats"], s["subs"], s["radius"], s["keyword"]
+                        s["cats"], s["subs"], s["radius"], s["keyword"],
+                        fetched=fetched
                     )
                     places_data[name] = places
                 
@@ -1001,7 +1020,7 @@ class ComparisonAnalyzer:
                         for nuisance in s["selected_nuisances"]:
                             nuisances = self._query_nuisances_no_progress(
                                 info["lat"], info["lng"], s["server"],
-                                [nuisance], s["radius"]
+                                [nuisance], s["radius"], fetched=fetched
                             )
                             all_nuisances.extend(nuisances)
                         
@@ -1067,27 +1086,43 @@ class ComparisonAnalyzer:
             st.error(f"❌ 分析失敗：{e}")
             st.session_state.analysis_in_progress = False
     
-    def _query_places_chinese_no_progress(self, lat, lng, api_key, categories, subtypes, radius=500, extra=""):
-        """查詢設施"""
-        results = []
-        seen = set()
-        
-        keywords = set()
+    def _place_keywords(self, categories, subtypes, extra=""):
+        """生活機能查詢關鍵字（去重，保留類別與子類別的原始順序）"""
+        keywords = []
         for cat in categories:
             if cat in subtypes:
-                for keyword in subtypes[cat]:
-                    keywords.add(keyword)
+                keywords.extend(subtypes[cat])
         if extra:
-            keywords.add(extra)
+            keywords.append(extra)
+        return list(dict.fromkeys(keywords))
+
+    def _nuisance_keywords(self, nuisances):
+        """嫌惡設施查詢關鍵字（去重，保留原始順序）"""
+        keywords = []
+        for selected_nuisance in nuisances:
+            keywords.extend(NUISANCE_TYPES.get(selected_nuisance, {}).get("keywords", []))
+        return list(dict.fromkeys(keywords))
+
+    def _fetch_places(self, api_key, queries):
+        """並行查詢多筆 (lat, lng, keyword, radius)，回傳 {查詢: 結果}"""
+        return PlacesClient(api_key).search_many(queries)
+
+    def _query_places_chinese_no_progress(self, lat, lng, api_key, categories, subtypes, radius=500, extra="", fetched=None):
+        """查詢設施；fetched 為已並行查好的結果，沒有時自行查詢"""
+        results = []
+        seen = set()
         
-        keywords = list(keywords)
+        keywords = self._place_keywords(categories, subtypes, extra)
         
         if not keywords:
             return results
         
+        if fetched is None:
+            fetched = self._fetch_places(api_key, [(lat, lng, keyword, radius) for keyword in keywords])
+        
         for keyword in keywords:
             try:
-                places = self._search_google_places_chinese(lat, lng, api_key, keyword, radius)
+                places = fetched.get((lat, lng, keyword, radius), [])
                 for p in places:
                     if p[5] > radius:
                         continue
@@ -1103,8 +1138,6 @@ class ComparisonAnalyzer:
                             break
                     
                     results.append((found_cat, keyword, p[2], p[3], p[4], p[5], p[6]))
-                
-                time.sleep(0.3)
             except:
                 continue
         
@@ -1132,15 +1165,14 @@ class ComparisonAnalyzer:
 
         try:
             import traceback
-            import google.generativeai as genai
+            from components.llm_gateway import get_model as get_gemini_model
             key = self._get_gemini_key()
             if not key:
                 msg = "AI\u5acc\u60e1\u8a2d\u65bd\u5206\u6790\u5931\u6557: \u672a\u53d6\u5f97 Gemini API Key"
                 print(msg)
                 st.error(msg)
                 return fallback
-            genai.configure(api_key=key)
-            model = genai.GenerativeModel("gemini-flash-latest")
+            model = get_gemini_model(key, "gemini-flash-latest")
             analyzed = {}
             for start in range(0, len(candidates), 20):
                 batch = candidates[start:start + 20]
@@ -1243,15 +1275,18 @@ class ComparisonAnalyzer:
             st.error(msg)
             return fallback
     
-    def _query_nuisances_no_progress(self, lat, lng, api_key, nuisances, radius):
+    def _query_nuisances_no_progress(self, lat, lng, api_key, nuisances, radius, fetched=None):
         """Query nuisance candidates and annotate AI relevance without removing results."""
         candidates = []
         seen = set()
+        if fetched is None:
+            keywords = self._nuisance_keywords(nuisances)
+            fetched = self._fetch_places(api_key, [(lat, lng, keyword, radius) for keyword in keywords])
         for selected_nuisance in nuisances:
             keywords = NUISANCE_TYPES.get(selected_nuisance, {}).get("keywords", [])
             for keyword in keywords:
                 try:
-                    places = self._search_google_places_chinese(lat, lng, api_key, keyword, radius)
+                    places = fetched.get((lat, lng, keyword, radius), [])
                     for place in places:
                         if place[5] > radius:
                             continue
@@ -1271,7 +1306,6 @@ class ComparisonAnalyzer:
                             "address": place[7] if len(place) > 7 else "",
                             "types": place[8] if len(place) > 8 else [],
                         })
-                    time.sleep(0.3)
                 except Exception:
                     continue
         if not candidates:
@@ -1303,38 +1337,7 @@ class ComparisonAnalyzer:
     
     def _search_google_places_chinese(self, lat, lng, api_key, keyword, radius):
         """Google Places 搜尋"""
-        url = "https://maps.googleapis.com/maps/api/place/textsearch/json"
-        params = {
-            "query": keyword,
-            "location": f"{lat},{lng}",
-            "radius": radius,
-            "key": api_key,
-            "language": "zh-TW"
-        }
-        
-        try:
-            resp = requests.get(url, params=params, timeout=10)
-            resp.raise_for_status()
-            data = resp.json()
-        except:
-            return []
-        
-        results = []
-        for p in data.get("results", []):
-            loc = p["geometry"]["location"]
-            dist = int(haversine(lat, lng, loc["lat"], loc["lng"]))
-            results.append((
-                "文字搜尋",
-                keyword,
-                p.get("name", "未命名"),
-                loc["lat"],
-                loc["lng"],
-                dist,
-                p.get("place_id", ""),
-                p.get("formatted_address") or p.get("vicinity", ""),
-                p.get("types", [])
-            ))
-        return results
+        return PlacesClient(api_key).text_search(lat, lng, keyword, radius)
     
     def _create_facilities_table(self, houses, places):
         """建立設施表格"""
@@ -1517,6 +1520,8 @@ class ComparisonAnalyzer:
                 results[house_name] = {"error": f"實價登錄模組無法載入：{REAL_PRICE_IMPORT_ERROR}"}
             return results
 
+        # 同縣市的房屋共用同一份資料、可比索引、彙總立方體與全市行政區排名
+        valuations = {}
         for house_name, info in houses_data.items():
             target = self._build_real_price_target_house(house_name, info)
             city = target.get("城市", "")
@@ -1524,12 +1529,13 @@ class ComparisonAnalyzer:
                 results[house_name] = {"error": "無法由地址判斷縣市，資料不足，建議放寬條件"}
                 continue
             try:
-                df = load_cached_real_price_data(city)
-                if df.empty:
+                if city not in valuations:
+                    valuations[city] = CityValuation(load_cached_real_price_data(city), get_real_price_cube(city))
+                valuation = valuations[city]
+                if valuation.empty:
                     results[house_name] = {"city": city, "target": target, "error": "尚未放入該縣市的實價登錄 CSV，暫時無法進行價格分析。"}
                     continue
-                transactions = filter_nearby_transactions(df, target)
-                metrics = calculate_price_metrics(transactions, target)
+                metrics = valuation.evaluate(target)
                 results[house_name] = {
                     "city": city,
                     "target": target,
@@ -2900,17 +2906,20 @@ th, td {{ border: 1px solid #d1d5db; padding: 8px 10px; vertical-align: top; }}
         
         with st.spinner("🧠 AI 分析中..."):
             try:
-                import google.generativeai as genai
+                from components.llm_batch import placeholder_writer, stream_text
+                from components.llm_gateway import get_model as get_gemini_model
                 key = st.session_state.get("GEMINI_KEY", "")
                 if not key:
                     st.error("❌ 請在側邊欄填入 Gemini Key")
                     return
                 
-                genai.configure(api_key=key)
-                model = genai.GenerativeModel("gemini-flash-latest")
-                resp = model.generate_content(prompt)
+                model = get_gemini_model(key, "gemini-flash-latest")
+                # 邊產生邊顯示，完成後存入 session 並重新整理成正式結果
+                text = stream_text(model, prompt, placeholder_writer(st.empty()))
+                if not text.strip():
+                    raise ValueError("Gemini 未回傳任何內容")
                 
-                st.session_state.gemini_result = resp.text
+                st.session_state.gemini_result = text
                 st.session_state.used_prompt = prompt
                 st.rerun()
             except Exception as e:
@@ -0,0 +1,105 @@
+# components/cp_ranking_cache.py
+# 地區 CP 值排行榜快取：五大面向分數依（資料版本, 房屋類型）只算一次，換權重只重新加權
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+from components.cp_score import SCORE_DIMENSIONS, combine_scores, score_components
+
+
+MIN_POOL_SIZE = 3
+MAX_WEIGHT_RESULTS = 32
+
+_RANKINGS = {}
+_RANKINGS_LOCK = threading.Lock()
+
+
+def weight_key(weights):
+    """權重 dict → 固定順序的 tuple，作為快取鍵"""
+    return tuple(float(weights[dim]) for dim in SCORE_DIMENSIONS)
+
+
+class DistrictRanking:
+    """單一資料版本、單一房屋類型下，各行政區的比較母體與五大面向原始分數"""
+
+    def __init__(self, version, house_type, district_count, pools):
+        self.version = version
+        self.house_type = house_type
+        self.district_count = district_count
+        self.pools = pools  # [(行政區, 母體 DataFrame, 五大面向分數 DataFrame)]
+        self._top = OrderedDict()
+        self._lock = threading.Lock()
+
+    def cached_top_n(self, weights, top_n=3):
+        with self._lock:
+            key = (weight_key(weights), top_n)
+            if key in self._top:
+                self._top.move_to_end(key)
+                return self._top[key]
+            return None
+
+    def top_n(self, weights, top_n=3):
+        """各區依權重加總後的前 N 名（與逐區重算的排序結果相同）"""
+        cached = self.cached_top_n(weights, top_n)
+        if cached is not None:
+            return cached
+
+        results = []
+        for district, pool, components in self.pools:
+            df_pool = pool.copy()
+            df_pool['CP分數'] = combine_scores(components, weights)
+            df_pool = df_pool.dropna(subset=['CP分數'])
+            df_pool = df_pool.sort_values('CP分數', ascending=False).reset_index(drop=True)
+            top = df_pool.head(top_n).copy()
+            top['行政區'] = district
+            top.insert(0, '區內排名', range(1, len(top) + 1))
+            results.append(top)
+        result = pd.concat(results, ignore_index=True) if results else pd.DataFrame()
+
+        with self._lock:
+            self._top[(weight_key(weights), top_n)] = result
+            while len(self._top) > MAX_WEIGHT_RESULTS:
+                self._top.popitem(last=False)
+        return result
+
+
+def _build_ranking(store, house_type, progress=None):
+    all_df = store.frame
+    districts = sorted(all_df['行政區'].dropna().unique().tolist())
+    districts = [d for d in districts if d]
+    type_mask = all_df['類型'].astype(str).str.contains(house_type, case=False, na=False)
+
+    pools = []
+    for i, district in enumerate(districts):
+        if progress:
+            progress(i, len(districts), district)
+        pool = all_df[(all_df['行政區'] == district) & type_mask].copy()
+        if len(pool) < MIN_POOL_SIZE:
+            continue
+        pools.append((district, pool, score_components(pool)))
+    return DistrictRanking(store.version, house_type, len(districts), pools)
+
+
+def peek_district_ranking(store, house_type):
+    """已算過就回傳快取，否則回傳 None（不觸發計算）"""
+    with _RANKINGS_LOCK:
+        return _RANKINGS.get((store.version, house_type))
+
+
+def get_district_ranking(store, house_type, progress=None):
+    """
+    取得各區五大面向分數。
+
+    同一資料版本、同一房屋類型在 process 內只計算一次；資料版本更新時舊版本的
+    快取一併清除。progress(i, total, 行政區) 只在實際計算時被呼叫。
+    """
+    ranking = peek_district_ranking(store, house_type)
+    if ranking is not None:
+        return ranking
+
+    ranking = _build_ranking(store, house_type, progress)
+    with _RANKINGS_LOCK:
+        for key in [k for k in _RANKINGS if k[0] != store.version]:
+            del _RANKINGS[key]
+        return _RANKINGS.setdefault((store.version, house_type), ranking)
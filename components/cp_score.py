@@ -0,0 +1,128 @@
+# components/cp_score.py
+# 五大面向 CP 值評分引擎：一次向量化計算整個比較母體
+import numpy as np
+import pandas as pd
+
+
+SCORE_DIMENSIONS = ["價格競爭力", "空間效率", "屋齡優勢", "樓層定位", "格局流動性"]
+
+DEFAULT_SCORE_WEIGHTS = {
+    "價格競爭力": 30, "空間效率": 25,
+    "屋齡優勢": 20, "樓層定位": 15, "格局流動性": 10
+}
+
+
+def parse_age_series(series):
+    """屋齡欄位整欄轉數字（與 _parse_age 的 regex 一致）"""
+    values = series.astype(str).str.extract(r'(\d+\.?\d*)', expand=False)
+    values = pd.to_numeric(values, errors='coerce')
+    return values.where(series.notna())
+
+
+def parse_floor_series(series):
+    """樓層欄位整欄轉數字：取「樓」之前第一段數字"""
+    head = series.astype(str).str.split('樓', n=1).str[0]
+    values = pd.to_numeric(head.str.extract(r'(\d+)', expand=False), errors='coerce')
+    return values.where(series.notna())
+
+
+def _percentile_below(sorted_values, targets):
+    """每個目標值在母體中「嚴格小於」的百分位"""
+    counts = np.searchsorted(sorted_values, targets, side='left')
+    return counts / len(sorted_values) * 100
+
+
+def score_components(df_pool):
+    """
+    以 df_pool 同時作為比較母體與評分對象，回傳每列五大面向原始分數。
+
+    分數規則與原本逐列的 _score_one 相同；總價或建坪無效的列分數為 NaN，
+    比較母體數為 0。回傳的 DataFrame 與 df_pool 共用 index。
+    """
+    result = pd.DataFrame(index=df_pool.index, columns=SCORE_DIMENSIONS, dtype=float)
+    result['比較母體數'] = 0
+    if df_pool.empty or '總價(萬)' not in df_pool.columns or '建坪' not in df_pool.columns:
+        return result
+
+    price = pd.to_numeric(df_pool['總價(萬)'], errors='coerce').to_numpy(dtype=float)
+    area = pd.to_numeric(df_pool['建坪'], errors='coerce').to_numpy(dtype=float)
+
+    in_pool = ~np.isnan(price) & ~np.isnan(area)
+    n = int(in_pool.sum())
+    valid = in_pool & (area != 0)
+    if n == 0 or not valid.any():
+        return result
+
+    # 1. 價格競爭力
+    price_pct = _percentile_below(np.sort(price[in_pool]), price)
+    score_price = np.clip(10 - price_pct / 10, 0.0, 10.0)
+
+    # 2. 空間效率（母體中位數使用率只算一次）
+    score_space = np.full(len(df_pool), 5.0)
+    if '主+陽' in df_pool.columns:
+        actual = pd.to_numeric(df_pool['主+陽'], errors='coerce').to_numpy(dtype=float)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            median_usage = pd.Series(actual[in_pool] / area[in_pool]).median()
+            if not pd.isna(median_usage) and median_usage > 0:
+                has_actual = ~np.isnan(actual) & (actual > 0)
+                ratio = np.clip((actual / area / median_usage) * 5, 0.0, 10.0)
+                score_space = np.where(has_actual, ratio, 5.0)
+
+    # 3. 屋齡優勢
+    score_age = np.full(len(df_pool), 5.0)
+    if '屋齡' in df_pool.columns:
+        age = parse_age_series(df_pool['屋齡']).to_numpy(dtype=float)
+        pool_age = age[in_pool]
+        pool_age = np.sort(pool_age[~np.isnan(pool_age)])
+        if len(pool_age) > 0:
+            age_pct = _percentile_below(pool_age, age)
+            score_age = np.where(np.isnan(age), 5.0, np.clip(10 - age_pct / 10, 0.0, 10.0))
+
+    # 4. 樓層定位
+    score_floor = np.full(len(df_pool), 5.0)
+    if '樓層' in df_pool.columns:
+        floor = parse_floor_series(df_pool['樓層']).to_numpy(dtype=float)
+        pool_floor = floor[in_pool]
+        pool_floor = np.sort(pool_floor[~np.isnan(pool_floor)])
+        if len(pool_floor) > 0:
+            floor_pct = _percentile_below(pool_floor, floor)
+            score_floor = np.where(
+                np.isnan(floor), 5.0, np.clip(10 - np.abs(floor_pct - 50) / 5, 0.0, 10.0)
+            )
+
+    # 5. 格局流動性（母體格局次數只數一次）
+    score_layout = np.zeros(len(df_pool))
+    if '格局' in df_pool.columns:
+        layout = df_pool['格局'].astype(str).str.strip()
+        counts = layout[in_pool].value_counts()
+        same_cnt = layout.map(counts).fillna(0).to_numpy(dtype=float)
+        same_cnt[(layout == '').to_numpy()] = 0
+        score_layout = np.clip((same_cnt / n * 100) / 3, 0.0, 10.0)
+
+    scores = np.column_stack([score_price, score_space, score_age, score_floor, score_layout])
+    scores[~valid] = np.nan
+    result[SCORE_DIMENSIONS] = scores
+    result.loc[valid, '比較母體數'] = n
+    return result
+
+
+def combine_scores(components, weights):
+    """五大面向原始分數依權重加總，回傳 0~100 的總分（與原本 round 一次的結果相同）"""
+    weighted = (
+        components['價格競爭力'].to_numpy(dtype=float) * (weights['價格競爭力'] / 100) +
+        components['空間效率'].to_numpy(dtype=float)   * (weights['空間效率']   / 100) +
+        components['屋齡優勢'].to_numpy(dtype=float)   * (weights['屋齡優勢']   / 100) +
+        components['樓層定位'].to_numpy(dtype=float)   * (weights['樓層定位']   / 100) +
+        components['格局流動性'].to_numpy(dtype=float) * (weights['格局流動性'] / 100)
+    )
+    totals = [np.nan if np.isnan(v) else round(float(v) * 10, 1) for v in weighted]
+    return pd.Series(totals, index=components.index, dtype=float)
+
+
+def score_pool(df_pool, weights=None):
+    """對整個比較母體評分，回傳五大面向原始分數、比較母體數與總分"""
+    if weights is None:
+        weights = DEFAULT_SCORE_WEIGHTS
+    components = score_components(df_pool)
+    components['總分'] = combine_scores(components, weights)
+    return components
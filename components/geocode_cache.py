@@ -0,0 +1,126 @@
+# components/geocode_cache.py
+# 地址 → 座標的磁碟快取（SQLite），地址先正規化（臺/台、全形數字、空白）再當作鍵
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from contextlib import contextmanager
+
+from config import GEOCODE_CACHE_PATH
+
+
+def normalize_address(address):
+    """地址正規化：全形轉半形（NFKC）、台→臺、去除所有空白"""
+    if address is None:
+        return ""
+    text = unicodedata.normalize("NFKC", str(address))
+    text = text.replace("台", "臺")
+    return re.sub(r"\s+", "", text)
+
+
+class GeocodeCache:
+    """
+    地址座標快取，含命中 / 未命中計數。
+
+    只存成功解析的結果；資料庫無法開啟或寫入時自動停用，查詢照常進行。
+    """
+
+    def __init__(self, path=GEOCODE_CACHE_PATH):
+        self.path = path
+        self.enabled = True
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "stores": 0}
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            with self._connect() as conn:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS geocode (
+                        address TEXT PRIMARY KEY,
+                        lat REAL NOT NULL,
+                        lng REAL NOT NULL,
+                        created_at REAL NOT NULL
+                    )
+                """)
+        except Exception:
+            self.enabled = False
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _count(self, name, n=1):
+        with self._lock:
+            self._stats[name] += n
+
+    def get_many(self, addresses):
+        """回傳 {原始地址: (lat, lng)}，只含命中的地址"""
+        keys = {address: normalize_address(address) for address in addresses}
+        found = {}
+        if self.enabled and keys:
+            try:
+                unique_keys = list(set(keys.values()))
+                with self._connect() as conn:
+                    for start in range(0, len(unique_keys), 500):
+                        chunk = unique_keys[start:start + 500]
+                        rows = conn.execute(
+                            f"SELECT address, lat, lng FROM geocode WHERE address IN ({','.join('?' * len(chunk))})",
+                            chunk
+                        ).fetchall()
+                        found.update({row[0]: (row[1], row[2]) for row in rows})
+            except Exception:
+                found = {}
+        result = {address: found[key] for address, key in keys.items() if key in found}
+        self._count("hits", len(result))
+        self._count("misses", len(keys) - len(result))
+        return result
+
+    def get(self, address):
+        return self.get_many([address]).get(address)
+
+    def put_many(self, coords):
+        """寫入 {原始地址: (lat, lng)}"""
+        rows = [
+            (normalize_address(address), float(lat), float(lng), time.time())
+            for address, (lat, lng) in coords.items()
+            if lat is not None and lng is not None
+        ]
+        if not self.enabled or not rows:
+            return
+        try:
+            with self._connect() as conn:
+                conn.executemany("INSERT OR REPLACE INTO geocode VALUES (?, ?, ?, ?)", rows)
+            self._count("stores", len(rows))
+        except Exception:
+            pass
+
+    def put(self, address, lat, lng):
+        self.put_many({address: (lat, lng)})
+
+    def stats(self):
+        """命中 / 未命中 / 寫入次數與命中率"""
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+
+_DEFAULT_CACHE = None
+_DEFAULT_CACHE_LOCK = threading.Lock()
+
+
+def get_geocode_cache():
+    """整個 process 共用的地址座標快取"""
+    global _DEFAULT_CACHE
+    with _DEFAULT_CACHE_LOCK:
+        if _DEFAULT_CACHE is None:
+            _DEFAULT_CACHE = GeocodeCache()
+        return _DEFAULT_CACHE
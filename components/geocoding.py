@@ -1,8 +1,20 @@
 # components/geocoding.py
 import math
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
 import requests
 import streamlit as st
 
+from config import GEOCODE_MAX_WORKERS, GEOCODE_RATE_PER_SEC, GOOGLE_MAPS_BASE_URL
+from components.geocode_cache import get_geocode_cache
+from components.rate_limit import TokenBucket
+
+
+_GEOCODE_LIMITER = TokenBucket(GEOCODE_RATE_PER_SEC)
+
 
 def haversine(lat1, lon1, lat2, lon2):
     """計算兩點間的大圓距離"""
@@ -10,7 +22,7 @@ def haversine(lat1, lon1, lat2, lon2):
     phi1, phi2 = math.radians(lat1), math.radians(lat2)
     d_phi = math.radians(lat2 - lat1)
     d_lambda = math.radians(lon2 - lon1)
-    
+
     a = (
         math.sin(d_phi/2)**2 +
         math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda/2)**2
@@ -18,27 +30,124 @@ def haversine(lat1, lon1, lat2, lon2):
     return R * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
 
 
+def haversine_many(lat1, lon1, lat2, lon2):
+    """haversine 的 NumPy 版本：參數可為純量或陣列（依 broadcasting），回傳公尺"""
+    R = 6371000
+    phi1, phi2 = np.radians(lat1), np.radians(lat2)
+    d_phi = np.radians(np.subtract(lat2, lat1))
+    d_lambda = np.radians(np.subtract(lon2, lon1))
+
+    a = (
+        np.sin(d_phi/2)**2 +
+        np.cos(phi1) * np.cos(phi2) * np.sin(d_lambda/2)**2
+    )
+    return R * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+
+def _fetch_geocode(address, api_key, session=None):
+    """呼叫 Geocoding API；找不到回傳 (None, None)，連線錯誤直接拋出"""
+    url = GOOGLE_MAPS_BASE_URL + "geocode/json"
+    params = {"address": address, "key": api_key, "language": "zh-TW"}
+    _GEOCODE_LIMITER.acquire()
+    response = (session or requests).get(url, params=params, timeout=10)
+    data = response.json()
+
+    if data.get("status") == "OK" and data.get("results"):
+        loc = data["results"][0]["geometry"]["location"]
+        return loc["lat"], loc["lng"]
+    return None, None
+
+
+def _default_api_key():
+    return st.session_state.get("GMAPS_SERVER_KEY") or st.session_state.get("GOOGLE_MAPS_KEY", "")
+
+
 def geocode_address(address: str, api_key: str = None):
-    """將地址轉換為經緯度座標"""
+    """將地址轉換為經緯度座標（先查地址快取）"""
+    cache = get_geocode_cache()
+    cached = cache.get(address)
+    if cached:
+        return cached
+
     if api_key is None:
-        api_key = st.session_state.get("GMAPS_SERVER_KEY") or st.session_state.get("GOOGLE_MAPS_KEY", "")
-    
+        api_key = _default_api_key()
+
     if not api_key:
         st.error("❌ 缺少 Google Maps API Key")
         return None, None
-    
-    url = "https://maps.googleapis.com/maps/api/geocode/json"
-    params = {"address": address, "key": api_key, "language": "zh-TW"}
-    
+
     try:
-        response = requests.get(url, params=params, timeout=10)
-        data = response.json()
+        lat, lng = _fetch_geocode(address, api_key)
     except Exception as e:
         st.error(f"地址解析失敗: {e}")
         return None, None
-    
-    if data.get("status") == "OK" and data.get("results"):
-        loc = data["results"][0]["geometry"]["location"]
-        return loc["lat"], loc["lng"]
-    
-    return None, None
+
+    if lat is not None and lng is not None:
+        cache.put(address, lat, lng)
+    return lat, lng
+
+
+def geocode_addresses(addresses, api_key=None, max_workers=GEOCODE_MAX_WORKERS):
+    """
+    批次地理編碼，回傳 {地址: (lat, lng)}。
+
+    快取命中的地址不打 API；其餘地址並行查詢並寫回快取。
+    解析失敗的地址值為 (None, None)。
+    """
+    addresses = list(dict.fromkeys(a for a in addresses if a))
+    cache = get_geocode_cache()
+    result = cache.get_many(addresses)
+    missing = [a for a in addresses if a not in result]
+    if not missing:
+        return result
+
+    if api_key is None:
+        api_key = _default_api_key()
+    if not api_key:
+        result.update({a: (None, None) for a in missing})
+        return result
+
+    session = requests.Session()
+
+    def fetch(address):
+        try:
+            return _fetch_geocode(address, api_key, session)
+        except Exception:
+            return None, None
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(missing)))) as pool:
+        fetched = dict(zip(missing, pool.map(fetch, missing)))
+
+    cache.put_many({a: c for a, c in fetched.items() if c[0] is not None and c[1] is not None})
+    result.update(fetched)
+    return result
+
+
+def get_geocode_stats():
+    """地址快取命中 / 未命中計數，供監控使用"""
+    return get_geocode_cache().stats()
+
+
+def prewarm_listing_geocodes(api_key, filename=None, batch_size=200, verbose=True):
+    """離線預熱：把房源 CSV 內所有地址先解析進快取，之後的比較分析不必再打 API"""
+    from components.listing_store import DEFAULT_LISTING_FILE, get_listing_df
+
+    df = get_listing_df(filename or DEFAULT_LISTING_FILE)
+    addresses = list(dict.fromkeys(df["地址"].dropna().astype(str).tolist()))
+    resolved = 0
+    for start in range(0, len(addresses), batch_size):
+        batch = geocode_addresses(addresses[start:start + batch_size], api_key)
+        resolved += sum(1 for lat, lng in batch.values() if lat is not None)
+        if verbose:
+            print(f"[geocode] {min(start + batch_size, len(addresses))}/{len(addresses)}，成功 {resolved}")
+    return resolved, len(addresses)
+
+
+if __name__ == "__main__":
+    # 用法：GMAPS_SERVER_KEY=xxx python -m components.geocoding [房源CSV檔名]
+    key = os.environ.get("GMAPS_SERVER_KEY") or os.environ.get("GOOGLE_MAPS_KEY", "")
+    if not key:
+        print("請設定環境變數 GMAPS_SERVER_KEY 或 GOOGLE_MAPS_KEY")
+        sys.exit(1)
+    prewarm_listing_geocodes(key, sys.argv[1] if len(sys.argv) > 1 else None)
+    print(get_geocode_stats())
@@ -0,0 +1,344 @@
+# components/listing_history.py
+# 房源快照歷史：每次抓取結果依日期存成一個分區（只新增、不覆寫），以 編號 去重；
+# 任兩個快照以 編號 雜湊連接比對新上架 / 下架 / 調價，並由價格事件紀錄提供每個物件的價格歷史。
+# 只有價格事件紀錄隨資料提交；日期分區留在本機（或排程的快取），不在時由紀錄還原上一次的狀態
+import datetime
+import io
+import os
+import subprocess
+import sys
+import threading
+
+import pandas as pd
+
+from config import LISTING_HISTORY_FOLDER
+
+
+SNAPSHOT_SUFFIX = ".csv.gz"
+PRICE_LOG = "price_log.csv"
+ID_COLUMN = "編號"
+PRICE_COLUMN = "總價(萬)"
+NO_ID = "無編號"
+PRICE_LOG_COLUMNS = ["日期", ID_COLUMN, PRICE_COLUMN, "事件"]
+
+# 快照日期以台灣時間計（排程在 UTC 執行）
+TAIPEI_TZ = datetime.timezone(datetime.timedelta(hours=8))
+
+_WRITE_LOCK = threading.Lock()
+_SNAPSHOTS = {}
+_HISTORIES = {}
+_CACHE_LOCK = threading.Lock()
+
+
+def city_history_dir(slug, history_dir=LISTING_HISTORY_FOLDER):
+    return os.path.join(history_dir, slug)
+
+
+def snapshot_path(slug, date, history_dir=LISTING_HISTORY_FOLDER):
+    return os.path.join(city_history_dir(slug, history_dir), f"{date}{SNAPSHOT_SUFFIX}")
+
+
+def today():
+    return datetime.datetime.now(TAIPEI_TZ).date().isoformat()
+
+
+def list_snapshots(slug, history_dir=LISTING_HISTORY_FOLDER):
+    """已存的快照日期（YYYY-MM-DD），由舊到新"""
+    folder = city_history_dir(slug, history_dir)
+    if not os.path.isdir(folder):
+        return []
+    return sorted(f[:-len(SNAPSHOT_SUFFIX)] for f in os.listdir(folder) if f.endswith(SNAPSHOT_SUFFIX))
+
+
+def normalize_snapshot(df):
+    """去掉沒有編號的列、以 編號 去重（保留第一筆），總價轉成數字"""
+    df = df[df[ID_COLUMN].notna()].copy()
+    df[ID_COLUMN] = df[ID_COLUMN].astype(str).str.strip()
+    df = df[(df[ID_COLUMN] != "") & (df[ID_COLUMN] != NO_ID)]
+    df = df.drop_duplicates(subset=[ID_COLUMN], keep="first")
+    df[PRICE_COLUMN] = pd.to_numeric(df[PRICE_COLUMN], errors="coerce")
+    return df.reset_index(drop=True)
+
+
+def _read_snapshot(path):
+    return pd.read_csv(path, dtype={ID_COLUMN: str})
+
+
+def load_snapshot(slug, date, history_dir=LISTING_HISTORY_FOLDER):
+    """
+    讀取某一天的快照。分區寫入後不再變動，同一個檔案在 process 內只讀一次；
+    回傳的是共用物件，呼叫端若要修改請先 copy。
+    """
+    path = os.path.abspath(snapshot_path(slug, date, history_dir))
+    with _CACHE_LOCK:
+        frame = _SNAPSHOTS.get(path)
+    if frame is None:
+        frame = _read_snapshot(path)
+        with _CACHE_LOCK:
+            _SNAPSHOTS[path] = frame
+    return frame
+
+
+def diff_snapshots(old, new):
+    """
+    比對兩個快照（皆已以 編號 去重），回傳 {"new", "removed", "price_changed"}。
+
+    以 編號 雜湊連接：新上架 / 下架為兩邊的差集，調價為交集中總價不同者；
+    price_changed 為新快照的資料加上「原價(萬)」與「價差(萬)」。
+    """
+    old_ids = pd.Index(old[ID_COLUMN])
+    new_ids = pd.Index(new[ID_COLUMN])
+
+    added = new[~new_ids.isin(old_ids)]
+    removed = old[~old_ids.isin(new_ids)]
+
+    old_price = pd.Series(old[PRICE_COLUMN].to_numpy(), index=old_ids)
+    kept = new[new_ids.isin(old_ids)]
+    before = old_price.reindex(kept[ID_COLUMN]).to_numpy()
+    after = kept[PRICE_COLUMN].to_numpy()
+    changed = (before != after) & ~(pd.isna(before) & pd.isna(after))
+
+    price_changed = kept[changed].copy()
+    price_changed["原價(萬)"] = before[changed]
+    price_changed["價差(萬)"] = after[changed] - before[changed]
+
+    return {
+        "new": added.reset_index(drop=True),
+        "removed": removed.reset_index(drop=True),
+        "price_changed": price_changed.reset_index(drop=True),
+    }
+
+
+def diff_dates(slug, old_date, new_date, history_dir=LISTING_HISTORY_FOLDER):
+    """比對同一城市的兩個快照日期"""
+    return diff_snapshots(
+        load_snapshot(slug, old_date, history_dir),
+        load_snapshot(slug, new_date, history_dir),
+    )
+
+
+def _price_events(date, old, new):
+    """兩個快照之間的價格事件：上架（含首次快照）、調價、下架"""
+    if old is None:
+        events = [new[[ID_COLUMN, PRICE_COLUMN]].assign(事件="上架")]
+    else:
+        diff = diff_snapshots(old, new)
+        events = [
+            diff["new"][[ID_COLUMN, PRICE_COLUMN]].assign(事件="上架"),
+            diff["price_changed"][[ID_COLUMN, PRICE_COLUMN]].assign(事件="調價"),
+            diff["removed"][[ID_COLUMN]].assign(**{PRICE_COLUMN: float("nan"), "事件": "下架"}),
+        ]
+    events = pd.concat(events, ignore_index=True)
+    events.insert(0, "日期", date)
+    return events[PRICE_LOG_COLUMNS]
+
+
+def _write_atomic(path, write):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def rebuild_price_log(slug, history_dir=LISTING_HISTORY_FOLDER):
+    """依序比對所有快照重建價格事件紀錄（快照不是依日期順序寫入時使用）"""
+    folder = city_history_dir(slug, history_dir)
+    previous = None
+    events = []
+    for date in list_snapshots(slug, history_dir):
+        snapshot = load_snapshot(slug, date, history_dir)
+        events.append(_price_events(date, previous, snapshot))
+        previous = snapshot
+    log = pd.concat(events, ignore_index=True) if events else pd.DataFrame(columns=PRICE_LOG_COLUMNS)
+    _write_atomic(os.path.join(folder, PRICE_LOG),
+                  lambda p: log.to_csv(p, index=False, encoding="utf-8"))
+    return len(log)
+
+
+def state_from_price_log(log):
+    """
+    由價格事件紀錄還原最後一次快照的 編號 與 總價（最後事件不是下架的物件）。
+    紀錄已涵蓋每次快照與前一次的差異，不需要保留日期分區也能接著比對。
+    """
+    last = log.drop_duplicates(subset=[ID_COLUMN], keep="last")
+    active = last[last["事件"] != "下架"]
+    return active[[ID_COLUMN, PRICE_COLUMN]].reset_index(drop=True)
+
+
+def _read_price_log(log_path):
+    if not os.path.exists(log_path):
+        return None
+    return pd.read_csv(log_path, dtype={ID_COLUMN: str, "日期": str})
+
+
+def record_snapshot(df, slug, date=None, history_dir=LISTING_HISTORY_FOLDER, update_log=True):
+    """
+    把一次抓取結果存成 date（預設今天）的快照分區，回傳與前一次的差異；
+    當天已有快照（或紀錄已記到當天）時不覆寫，回傳 None。
+
+    分區以 gzip 壓縮的 CSV 保存在本機，不隨資料提交；
+    新快照比價格事件紀錄的最後一天新時，與紀錄還原的上一次狀態比對並附加到紀錄
+    （此時差異中的下架資料只有 編號 與 總價），否則以本機的分區整份重建。
+    """
+    date = date or today()
+    folder = city_history_dir(slug, history_dir)
+    path = snapshot_path(slug, date, history_dir)
+    log_path = os.path.join(folder, PRICE_LOG)
+
+    with _WRITE_LOCK:
+        if os.path.exists(path):
+            return None
+        log = _read_price_log(log_path) if update_log else None
+        log_last = log["日期"].max() if log is not None and not log.empty else None
+        if log_last == date:
+            return None
+        os.makedirs(folder, exist_ok=True)
+
+        snapshot = normalize_snapshot(df)
+        _write_atomic(path, lambda p: snapshot.to_csv(p, index=False, encoding="utf-8", compression="gzip"))
+
+        dates = list_snapshots(slug, history_dir)
+        earlier = [d for d in dates if d < date]
+        # 以讀回的分區比對，型別與之後 load_snapshot 的結果一致
+        snapshot = load_snapshot(slug, date, history_dir)
+        appending = log_last is not None and date > log_last
+        if appending:
+            previous = state_from_price_log(log)
+        else:
+            previous = load_snapshot(slug, earlier[-1], history_dir) if earlier else None
+        diff = diff_snapshots(previous, snapshot) if previous is not None else {
+            "new": snapshot, "removed": snapshot.iloc[0:0], "price_changed": snapshot.iloc[0:0],
+        }
+
+        if update_log:
+            if appending or (log is None and not earlier):
+                events = _price_events(date, previous, snapshot)
+                events.to_csv(log_path, mode="a", index=False, header=log is None, encoding="utf-8")
+            else:
+                rebuild_price_log(slug, history_dir)
+        return diff
+
+
+def _load_price_log(slug, history_dir):
+    path = os.path.abspath(os.path.join(city_history_dir(slug, history_dir), PRICE_LOG))
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None, None
+    signature = (stat.st_mtime_ns, stat.st_size)
+    return path, signature
+
+
+def price_history(slug, history_dir=LISTING_HISTORY_FOLDER):
+    """
+    每個物件的價格歷史（index 為 編號）：首次上架、最後調價日、初始 / 目前總價、降價與漲價次數。
+
+    由價格事件紀錄整欄計算，紀錄檔沒變就重用上次的結果；沒有歷史時回傳空表。
+    """
+    path, signature = _load_price_log(slug, history_dir)
+    if path is None:
+        return pd.DataFrame()
+
+    with _CACHE_LOCK:
+        cached = _HISTORIES.get(path)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+
+    log = pd.read_csv(path, dtype={ID_COLUMN: str})
+    # 紀錄依日期附加；重新上架也視為一次價格觀察
+    prices = log[log["事件"] != "下架"].sort_values(["日期"], kind="stable")
+    grouped = prices.groupby(ID_COLUMN, sort=False)
+    step = grouped[PRICE_COLUMN].diff()
+
+    history = pd.DataFrame({
+        "首次上架": grouped["日期"].first(),
+        "最後調價": prices[step.notna() & (step != 0)].groupby(ID_COLUMN)["日期"].last(),
+        "初始總價(萬)": grouped[PRICE_COLUMN].first(),
+        "目前總價(萬)": grouped[PRICE_COLUMN].last(),
+        "降價次數": (step < 0).groupby(prices[ID_COLUMN], sort=False).sum(),
+        "漲價次數": (step > 0).groupby(prices[ID_COLUMN], sort=False).sum(),
+    })
+    history[["降價次數", "漲價次數"]] = history[["降價次數", "漲價次數"]].fillna(0).astype(int)
+
+    with _CACHE_LOCK:
+        _HISTORIES[path] = (signature, history)
+    return history
+
+
+def price_trail(slug, house_id, history_dir=LISTING_HISTORY_FOLDER):
+    """單一物件的價格事件（日期、總價、事件），由舊到新"""
+    path, _ = _load_price_log(slug, history_dir)
+    if path is None:
+        return pd.DataFrame(columns=PRICE_LOG_COLUMNS)
+    log = pd.read_csv(path, dtype={ID_COLUMN: str})
+    return log[log[ID_COLUMN] == str(house_id).strip()].reset_index(drop=True)
+
+
+def price_change_label(history, house_id):
+    """價格歷史 → 顯示文字，例如「降價 3 次（1888 → 1688 萬）」；沒有調價紀錄時回傳空字串"""
+    house_id = str(house_id).strip()
+    if history is None or history.empty or house_id not in history.index:
+        return ""
+    entry = history.loc[house_id]
+    parts = []
+    if entry["降價次數"]:
+        parts.append(f"降價 {entry['降價次數']} 次")
+    if entry["漲價次數"]:
+        parts.append(f"漲價 {entry['漲價次數']} 次")
+    if not parts:
+        return ""
+    return f"{'、'.join(parts)}（{entry['初始總價(萬)']:,.0f} → {entry['目前總價(萬)']:,.0f} 萬）"
+
+
+def backfill_from_git(csv_path, slug, history_dir=LISTING_HISTORY_FOLDER, repo_dir="."):
+    """
+    以 git 紀錄中房源 CSV 的每個版本補建快照（同一天多次提交取最後一次），回傳補建的快照數。
+    已存在的日期不覆寫；補完後重建一次價格事件紀錄。
+    """
+    rel_path = os.path.relpath(os.path.abspath(csv_path), os.path.abspath(repo_dir)).replace(os.sep, "/")
+    log = subprocess.run(
+        ["git", "log", "--reverse", "--format=%H %cs", "--", rel_path],
+        cwd=repo_dir, capture_output=True, text=True, check=True,
+    ).stdout.split()
+    versions = dict(zip(log[1::2], log[0::2]))  # 日期 → 當天最後一次提交
+
+    written = 0
+    for date, commit in sorted(versions.items()):
+        content = subprocess.run(
+            ["git", "show", f"{commit}:{rel_path}"], cwd=repo_dir, capture_output=True, check=True,
+        ).stdout
+        df = pd.read_csv(io.BytesIO(content), encoding="utf-8-sig", dtype={ID_COLUMN: str})
+        if record_snapshot(df, slug, date, history_dir, update_log=False) is not None:
+            written += 1
+    rebuild_price_log(slug, history_dir)
+    return written
+
+
+def _print_diff(diff):
+    print(f"新上架 {len(diff['new'])}、下架 {len(diff['removed'])}、調價 {len(diff['price_changed'])}")
+    changed = diff["price_changed"]
+    if not changed.empty:
+        print(changed[[ID_COLUMN, "標題", "原價(萬)", PRICE_COLUMN, "價差(萬)"]]
+              .sort_values("價差(萬)").head(20).to_string(index=False))
+
+
+if __name__ == "__main__":
+    # 在專案根目錄執行：
+    #   python -m components.listing_history backfill <城市代碼> [CSV 路徑]
+    #   python -m components.listing_history diff <城市代碼> [舊日期 新日期]（預設最近兩次快照）
+    args = sys.argv[1:]
+    if len(args) < 2 or args[0] not in ("backfill", "diff"):
+        print("用法：python -m components.listing_history backfill|diff <城市代碼> ...")
+        sys.exit(1)
+    command, city = args[0], args[1]
+    if command == "backfill":
+        from components.city_registry import listing_file_name
+        from config import DATA_FOLDER
+        csv_path = args[2] if len(args) > 2 else os.path.join(DATA_FOLDER, listing_file_name(city))
+        print(f"補建 {backfill_from_git(csv_path, city)} 個快照")
+    else:
+        dates = args[2:4] if len(args) > 3 else list_snapshots(city)[-2:]
+        if len(dates) < 2:
+            print("快照不足兩個，無法比對")
+            sys.exit(1)
+        print(f"{city}：{dates[0]} → {dates[1]}")
+        _print_diff(diff_dates(city, dates[0], dates[1]))
@@ -0,0 +1,223 @@
+# components/listing_index.py
+# 房源條件搜尋索引：數值欄位用排序陣列做區間查詢，類別欄位用倒排列表（posting list），
+# 查詢只在列編號上做交集、不複製整張表，相同條件直接由 LRU 回傳
+import threading
+import weakref
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+
+QUERY_CACHE_SIZE = 128
+
+COUNT_COLUMNS = {"num_rooms": "房間數", "num_living": "廳數", "num_baths": "衛數"}
+
+_INDEXES = {}
+_INDEXES_LOCK = threading.Lock()
+
+
+def normalize_filters(filters):
+    """
+    篩選條件 → 只含實際生效條件的 tuple（作為 LRU 的鍵）。
+    判斷規則與原本逐條過濾相同：「不限」、0 與預設上下限都視為沒有條件。
+    """
+    key = []
+    if filters.get('district') and filters['district'] != "不限":
+        key.append(('district', filters['district']))
+    if filters.get('housetype') and filters['housetype'] != "不限":
+        key.append(('housetype', filters['housetype']))
+    if filters.get('budget_min', 0) > 0:
+        key.append(('budget_min', filters['budget_min']))
+    if filters.get('budget_max', 1000000) < 1000000:
+        key.append(('budget_max', filters['budget_max']))
+    age_min, age_max = filters.get('age_min', 0), filters.get('age_max', 100)
+    if not (age_min == 0 and age_max == 100):
+        key.append(('age', (age_min, age_max)))
+    if filters.get('area_min', 0) > 0:
+        key.append(('area_min', filters['area_min']))
+    if filters.get('car_grip') in ("需要", "不要"):
+        key.append(('car_grip', filters['car_grip']))
+    for name in COUNT_COLUMNS:
+        if filters.get(name) and filters[name] != "不限":
+            key.append((name, filters[name]))
+    return tuple(key)
+
+
+class _RangeIndex:
+    """數值欄位：非空值依大小排序後的值與對應列編號"""
+
+    def __init__(self, series):
+        values = pd.to_numeric(series, errors='coerce').to_numpy(dtype=float)
+        valid = np.flatnonzero(~np.isnan(values))
+        order = np.argsort(values[valid], kind='stable')
+        self.values = values
+        self.sorted_values = values[valid][order]
+        self.sorted_rows = valid[order]
+
+    def rows(self, low=None, high=None):
+        """low <= 值 <= high 的列編號（由小到大）"""
+        start = 0 if low is None else np.searchsorted(self.sorted_values, low, side='left')
+        stop = len(self.sorted_values) if high is None else np.searchsorted(self.sorted_values, high, side='right')
+        return np.sort(self.sorted_rows[start:stop])
+
+    def keep(self, rows, low=None, high=None):
+        """只保留 rows 中符合區間的列（候選列已經很少時比查排序陣列快）"""
+        values = self.values[rows]
+        mask = ~np.isnan(values)
+        if low is not None:
+            mask &= values >= low
+        if high is not None:
+            mask &= values <= high
+        return rows[mask]
+
+
+class _PostingIndex:
+    """類別欄位：每個相異值 → 出現該值的列編號（由小到大）；空值的鍵為 None"""
+
+    def __init__(self, series):
+        codes, uniques = pd.factorize(series, use_na_sentinel=True)
+        order = np.argsort(codes, kind='stable')
+        bounds = np.searchsorted(codes[order], np.arange(-1, len(uniques) + 1))
+        self.postings = {}
+        for code in range(-1, len(uniques)):
+            rows = order[bounds[code + 1]:bounds[code + 2]]
+            if len(rows):
+                self.postings[None if code < 0 else uniques[code]] = rows
+
+    def rows(self, predicate):
+        """值（空值為 None）符合 predicate 的所有列編號"""
+        parts = [rows for value, rows in self.postings.items() if predicate(value)]
+        if not parts:
+            return np.empty(0, dtype=np.intp)
+        return parts[0] if len(parts) == 1 else np.sort(np.concatenate(parts))
+
+
+class ListingIndex:
+    """
+    單一房源資料表的搜尋索引；各欄位的索引第一次用到時才建立。
+
+    查詢結果是列編號（位置），呼叫端以 frame.iloc 取出需要的列即可。
+    索引只保留資料表的弱參照，不會讓資料表因為索引而無法回收。
+    """
+
+    def __init__(self, frame, cache_size=QUERY_CACHE_SIZE):
+        self._frame = weakref.ref(frame)
+        self.columns = frame.columns
+        self.size = len(frame)
+        self.cache_size = cache_size
+        self._columns = {}
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _column(self, kind, column, builder):
+        key = (kind, column)
+        with self._lock:
+            if key not in self._columns:
+                self._columns[key] = builder(self._frame()[column])
+            return self._columns[key]
+
+    def _ranges(self, column):
+        return self._column('range', column, _RangeIndex)
+
+    def _postings(self, column):
+        return self._column('posting', column, _PostingIndex)
+
+    def _counts(self, column):
+        # 房 / 廳 / 衛數先轉成數字再建倒排列表（與 pd.to_numeric(..., errors='coerce') 相同）
+        return self._column('count', column, lambda s: _PostingIndex(pd.to_numeric(s, errors='coerce')))
+
+    def query(self, filters):
+        """符合條件的列編號（由小到大，唯讀）；相同條件重用上次結果"""
+        key = normalize_filters(filters)
+        with self._lock:
+            rows = self._cache.get(key)
+            if rows is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return rows
+            self.misses += 1
+
+        rows = self._evaluate(dict(key))
+        rows.setflags(write=False)
+        with self._lock:
+            self._cache[key] = rows
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return rows
+
+    def _evaluate(self, active):
+        columns = self.columns
+        candidates = []
+
+        # 先取類別條件的倒排列表，由最小的集合開始交集
+        if 'district' in active and '行政區' in columns:
+            district = active['district']
+            candidates.append(self._postings('行政區').rows(lambda v: v == district))
+        if 'housetype' in active and '類型' in columns:
+            pattern = active['housetype']
+            # 比對每個相異值一次，等同 astype(str).str.contains(pattern, case=False, na=False)
+            types = self._postings('類型')
+            values = pd.Series([str(v) if v is not None else 'nan' for v in types.postings], dtype=object)
+            matched = {v for v, ok in zip(types.postings, values.str.contains(pattern, case=False, na=False)) if ok}
+            candidates.append(types.rows(lambda v: v in matched))
+        if 'car_grip' in active and '車位' in columns:
+            def has_parking(v):
+                return v is not None and v != "無車位" and v != 0
+            want = active['car_grip'] == "需要"
+            candidates.append(self._postings('車位').rows(lambda v: has_parking(v) == want))
+        for name, column in COUNT_COLUMNS.items():
+            if name in active:
+                if column not in columns:
+                    raise KeyError(column)
+                count = active[name]
+                candidates.append(self._counts(column).rows(lambda v: v is not None and v == count))
+
+        rows = None
+        for posting in sorted(candidates, key=len):
+            rows = posting if rows is None else np.intersect1d(rows, posting, assume_unique=True)
+
+        # 區間條件：已有候選列時直接檢查候選列的值，否則查排序陣列
+        ranges = []
+        if '總價(萬)' in columns and ('budget_min' in active or 'budget_max' in active):
+            ranges.append(('總價(萬)', active.get('budget_min'), active.get('budget_max')))
+        if 'age' in active and '屋齡' in columns:
+            ranges.append(('屋齡',) + tuple(active['age']))
+        if 'area_min' in active and '建坪' in columns:
+            ranges.append(('建坪', active['area_min'], None))
+        for column, low, high in ranges:
+            index = self._ranges(column)
+            if rows is None:
+                rows = index.rows(low, high)
+            else:
+                rows = index.keep(rows, low, high)
+
+        if rows is None:
+            rows = np.arange(self.size)
+        return np.asarray(rows, dtype=np.intp)
+
+    def stats(self):
+        return {"rows": self.size, "cached_queries": len(self._cache), "hits": self.hits, "misses": self.misses}
+
+
+def get_listing_index(frame):
+    """
+    取得資料表的索引；同一個 DataFrame 物件在 process 內只建一次（例如 ListingStore 的 search_frame），
+    物件被回收時索引一併移除。
+    """
+    key = id(frame)
+
+    def forget(ref):
+        with _INDEXES_LOCK:
+            if key in _INDEXES and _INDEXES[key][0] is ref:
+                del _INDEXES[key]
+
+    with _INDEXES_LOCK:
+        entry = _INDEXES.get(key)
+        if entry is not None and entry[0]() is frame:
+            return entry[1]
+        index = ListingIndex(frame)
+        _INDEXES[key] = (weakref.ref(frame, forget), index)
+        return index
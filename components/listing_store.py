@@ -0,0 +1,143 @@
+# components/listing_store.py
+# 房源資料集中載入：每個 CSV 版本只解析一次，所有頁面共用同一份正規化資料
+import os
+import threading
+
+import pandas as pd
+
+from config import DATA_FOLDER
+from components.columnar_cache import load_with_columnar_cache
+from components.cp_score import parse_age_series, parse_floor_series
+
+
+DEFAULT_LISTING_FILE = "Taichung-city_buy_properties.csv"
+
+# 衍生欄位規則有變動時請更新，磁碟上的欄式快取會自動重建
+LISTING_CACHE_SCHEMA = "listing-v1"
+
+CATEGORY_COLUMNS = ["行政區", "類型", "車位"]
+
+LAYOUT_PATTERNS = {
+    "房間數": r'(\d+)房',
+    "廳數":   r'(\d+)廳',
+    "衛數":   r'(\d+)(?:\.\d+)?衛',
+    "室數":   r'(\d+)室',
+}
+
+_STORES = {}
+_STORES_LOCK = threading.Lock()
+
+
+def _file_signature(path):
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def build_listing_frame(raw_df):
+    """原始房源 CSV → 型別化、含衍生欄位的標準資料表（全部整欄運算）"""
+    df = raw_df.copy()
+
+    if '地址' in df.columns:
+        district = df['地址'].astype(str).str.extract(r'[市縣](.+?[區鄉鎮市])', expand=False)
+        df['行政區'] = district.where(df['地址'].notna()).fillna("")
+
+    for col in ['建坪', '主+陽', '總價(萬)']:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+
+    if '屋齡' in df.columns:
+        df['屋齡數值'] = parse_age_series(df['屋齡'])
+
+    if '樓層' in df.columns:
+        floor_text = df['樓層'].astype(str)
+        df['樓層數值'] = parse_floor_series(df['樓層'])
+        total = pd.to_numeric(floor_text.str.extract(r'/(\d+)樓', expand=False), errors='coerce')
+        df['總樓層'] = total.where(df['樓層'].notna())
+
+    if '格局' in df.columns:
+        layout_text = df['格局'].astype(str)
+        for col, pattern in LAYOUT_PATTERNS.items():
+            counts = pd.to_numeric(layout_text.str.extract(pattern, expand=False), errors='coerce')
+            df[col] = counts.where(df['格局'].notna())
+
+    for col in CATEGORY_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype('category')
+
+    return df
+
+
+def read_listing_csv(path):
+    """讀取原始房源 CSV 並建立標準資料表"""
+    return build_listing_frame(pd.read_csv(path))
+
+
+class ListingStore:
+    """單一 CSV 版本的房源資料；各頁面需要的檢視表第一次用到時才建立"""
+
+    def __init__(self, path, signature, version, frame):
+        self.path = path
+        self.signature = signature
+        self.version = version
+        self.frame = frame
+        self._views = {}
+        self._lock = threading.Lock()
+
+    def _view(self, name, builder):
+        with self._lock:
+            if name not in self._views:
+                self._views[name] = builder(self.frame)
+            return self._views[name]
+
+    def search_frame(self):
+        """條件搜尋用：屋齡轉為數字（預售 / 空白視為 0）"""
+        def build(frame):
+            df = frame.copy()
+            if '屋齡數值' in df.columns:
+                df['屋齡'] = df['屋齡數值'].fillna(0)
+            return df
+        return self._view('search', build)
+
+    def chat_frame(self):
+        """AI 對話搜尋用：屋齡數值化並補上「N樓」開頭的實際樓層"""
+        def build(frame):
+            df = frame.copy()
+            if '屋齡數值' in df.columns:
+                df['屋齡'] = df['屋齡數值']
+            if '樓層' in df.columns:
+                floor = df['樓層'].astype(str).str.extract(r'^(\d+)樓', expand=False)
+                df['實際樓層'] = pd.to_numeric(floor, errors='coerce').where(df['樓層'].notna())
+            return df
+        return self._view('chat', build)
+
+
+def load_listing_store(filename=DEFAULT_LISTING_FILE, data_dir=DATA_FOLDER):
+    """
+    取得房源資料。
+
+    以檔案 mtime / 大小判斷是否為同一版本，同一版本在整個 process 內只解析一次，
+    所有 Streamlit session 共用；CSV 更新後下一次呼叫會自動重建。
+    process 重啟時優先讀取 CSV 旁的欄式快取，不必重新解析。
+    version 為檔案內容的 SHA-1，可作為下游快取的資料版本鍵。
+    """
+    path = os.path.abspath(os.path.join(data_dir, filename))
+    signature = _file_signature(path)
+
+    with _STORES_LOCK:
+        store = _STORES.get(path)
+        if store is not None and store.signature == signature:
+            return store
+
+        frame, meta = load_with_columnar_cache(path, read_listing_csv, LISTING_CACHE_SCHEMA)
+        if store is not None and store.version == meta["sha1"]:
+            store.signature = signature
+            return store
+
+        store = ListingStore(path, signature, meta["sha1"], frame)
+        _STORES[path] = store
+        return store
+
+
+def get_listing_df(filename=DEFAULT_LISTING_FILE, data_dir=DATA_FOLDER):
+    """取得標準房源資料表（共用物件，呼叫端若要修改請先 copy）"""
+    return load_listing_store(filename, data_dir).frame
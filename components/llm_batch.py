@@ -0,0 +1,136 @@
+# components/llm_batch.py
+# Gemini 批次分析執行器：每間房屋的各面向並行產生，總結在各面向完成後產生；
+# 同時進行的房屋數、同時呼叫數與單次呼叫逾時都可設定；另提供單次呼叫的容錯與串流包裝
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout, as_completed
+
+from config import GEMINI_BATCH_HOUSES, GEMINI_CALL_TIMEOUT, GEMINI_MAX_CONCURRENT_CALLS
+
+
+def safe_generate(model, prompt, fallback_text, timeout=None):
+    """Gemini 容錯包裝：失敗時回退到本地文字；timeout 秒數會交給 API 的 request_options"""
+    try:
+        if timeout:
+            response = model.generate_content(prompt, request_options={"timeout": timeout})
+        else:
+            response = model.generate_content(prompt)
+        text = getattr(response, "text", "") or ""
+        text = text.strip()
+        return text if text else fallback_text
+    except Exception:
+        return fallback_text
+
+
+def stream_text(model, prompt, on_text=None, timeout=None):
+    """
+    串流呼叫：每收到一段文字就以目前累積的全文呼叫 on_text(text)，回傳完整文字。
+    錯誤直接拋出；model 只需要提供 generate_content(prompt, stream=True) 並產生帶 .text 的片段。
+    """
+    kwargs = {"stream": True}
+    if timeout:
+        kwargs["request_options"] = {"timeout": timeout}
+    pieces = []
+    for chunk in model.generate_content(prompt, **kwargs):
+        try:
+            piece = getattr(chunk, "text", "") or ""
+        except Exception:
+            piece = ""
+        if piece:
+            pieces.append(piece)
+            if on_text:
+                on_text("".join(pieces))
+    return "".join(pieces)
+
+
+def stream_generate(model, prompt, fallback_text, on_text=None, timeout=None):
+    """safe_generate 的串流版本：回傳值與 safe_generate 相同，失敗時回退到本地文字"""
+    try:
+        text = stream_text(model, prompt, on_text, timeout).strip()
+        return text if text else fallback_text
+    except Exception:
+        return fallback_text
+
+
+def placeholder_writer(placeholder, header=""):
+    """把串流中的文字畫到 Streamlit placeholder（st.empty()），結尾加游標提示仍在產生"""
+    def write(text):
+        placeholder.markdown(f"{header}{text} ▌")
+    return write
+
+
+class _Call:
+    """送進呼叫池的單次呼叫；記錄實際開始時間，逾時從開始呼叫才起算"""
+
+    def __init__(self, pool, model, prompt, fallback, timeout):
+        self.fallback = fallback
+        self.timeout = timeout
+        self.started_at = None
+        self._started = threading.Event()
+        self.future = None
+        if prompt:
+            self.future = pool.submit(self._run, model, prompt, fallback)
+            # 呼叫池關閉時排隊中的呼叫會被取消、_run 不會執行；完成回呼確保等待端不會永遠卡住
+            self.future.add_done_callback(lambda _future: self._started.set())
+
+    def _run(self, model, prompt, fallback):
+        self.started_at = time.monotonic()
+        self._started.set()
+        return safe_generate(model, prompt, fallback, self.timeout)
+
+    def result(self):
+        if self.future is None:
+            return self.fallback
+        self._started.wait()
+        if self.started_at is None:
+            return self.fallback
+        remaining = self.started_at + self.timeout - time.monotonic()
+        try:
+            return self.future.result(timeout=max(0.0, remaining))
+        except FutureTimeout:
+            return self.fallback
+        except Exception:
+            return self.fallback
+
+
+def run_analysis_batch(model, jobs, max_concurrent_calls=GEMINI_MAX_CONCURRENT_CALLS,
+                       max_concurrent_houses=GEMINI_BATCH_HOUSES, call_timeout=GEMINI_CALL_TIMEOUT,
+                       on_progress=None):
+    """
+    執行多間房屋的分析呼叫。
+
+    jobs 為 list，每個元素是 {"sections": {名稱: (prompt, fallback)}, "summary": (prompt, fallback)}；
+    prompt 為空字串時不呼叫模型，直接使用 fallback。
+    回傳與 jobs 同順序的 dict（各面向名稱與 "summary" → 文字）。
+    on_progress(完成數, 總數, job 索引) 在呼叫端執行緒中觸發，可直接更新 Streamlit 元件。
+    model 只需要提供 generate_content(prompt, **kwargs)，測試時可換成假的模型物件。
+    """
+    results = [None] * len(jobs)
+    if not jobs:
+        return results
+
+    call_pool = ThreadPoolExecutor(max_workers=max(1, max_concurrent_calls))
+    house_pool = ThreadPoolExecutor(max_workers=max(1, max_concurrent_houses))
+
+    def run_house(job):
+        calls = {
+            name: _Call(call_pool, model, prompt, fallback, call_timeout)
+            for name, (prompt, fallback) in job["sections"].items()
+        }
+        texts = {name: call.result() for name, call in calls.items()}
+        summary_prompt, summary_fallback = job["summary"]
+        texts["summary"] = _Call(call_pool, model, summary_prompt, summary_fallback, call_timeout).result()
+        return texts
+
+    try:
+        futures = {house_pool.submit(run_house, job): i for i, job in enumerate(jobs)}
+        for done, future in enumerate(as_completed(futures), start=1):
+            index = futures[future]
+            results[index] = future.result()
+            if on_progress:
+                on_progress(done, len(jobs), index)
+    finally:
+        house_pool.shutdown(wait=False, cancel_futures=True)
+        # 逾時的呼叫可能仍在背景執行，不等待它們結束
+        call_pool.shutdown(wait=False, cancel_futures=True)
+    return results
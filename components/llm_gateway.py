@@ -0,0 +1,452 @@
+# components/llm_gateway.py
+# Gemini 呼叫的統一入口：共用模型物件、回應磁碟快取（SQLite）、相同 prompt 同時呼叫只送一次、延遲與命中率統計
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+import google.generativeai as genai
+from google.generativeai import client as genai_client
+
+from config import GEMINI_CACHE_MAX_BYTES, GEMINI_CACHE_PATH, GEMINI_CACHE_TTL_SECONDS
+
+# 每個 API key 各自的連線依賴 google-generativeai 的內部結構（_ClientManager、GenerativeModel._client），
+# requirements.txt 固定了版本；升級後這些結構不存在時直接報錯，避免改用其他工作階段的全域 key
+_SDK_MISMATCH = (
+    f"google-generativeai {getattr(genai, '__version__', '?')} 不支援以 API key 綁定個別連線，"
+    "請安裝 requirements.txt 指定的版本"
+)
+
+
+def cache_key(model_name, prompt, generation_config=None, system_instruction=None):
+    """模型名稱 + prompt + 生成參數的 sha256；API key 與逾時設定不影響回應內容，不列入"""
+    payload = json.dumps(
+        {
+            "model": model_name,
+            "system": system_instruction,
+            "prompt": prompt,
+            "config": generation_config,
+        },
+        ensure_ascii=False, sort_keys=True, default=str
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    Gemini 文字回應快取。
+
+    超過 ttl 秒的資料視為過期；總大小超過 max_bytes 時依最後使用時間淘汰。
+    資料庫無法開啟或寫入時自動停用，呼叫照常進行。
+    """
+
+    def __init__(self, path=GEMINI_CACHE_PATH, ttl=GEMINI_CACHE_TTL_SECONDS, max_bytes=GEMINI_CACHE_MAX_BYTES):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.enabled = True
+        self._lock = threading.Lock()
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            with self._connect() as conn:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS responses (
+                        key TEXT PRIMARY KEY,
+                        model TEXT NOT NULL,
+                        text TEXT NOT NULL,
+                        nbytes INTEGER NOT NULL,
+                        created_at REAL NOT NULL,
+                        accessed_at REAL NOT NULL
+                    )
+                """)
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses (accessed_at)")
+        except Exception:
+            self.enabled = False
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get(self, key):
+        if not self.enabled:
+            return None
+        now = time.time()
+        try:
+            with self._lock, self._connect() as conn:
+                row = conn.execute(
+                    "SELECT text FROM responses WHERE key = ? AND created_at >= ?",
+                    (key, now - self.ttl)
+                ).fetchone()
+                if row is None:
+                    return None
+                conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            return row[0]
+        except Exception:
+            return None
+
+    def put(self, key, model_name, text):
+        if not self.enabled:
+            return
+        now = time.time()
+        nbytes = len(text.encode("utf-8"))
+        try:
+            with self._lock, self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, model_name, text, nbytes, now, now)
+                )
+                conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl,))
+                self._evict(conn)
+        except Exception:
+            pass
+
+    def _evict(self, conn):
+        total = conn.execute("SELECT COALESCE(SUM(nbytes), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # 淘汰到上限的九成，避免每次寫入都觸發
+        target = total - int(self.max_bytes * 0.9)
+        freed = 0
+        doomed = []
+        for key, nbytes in conn.execute("SELECT key, nbytes FROM responses ORDER BY accessed_at"):
+            doomed.append((key,))
+            freed += nbytes
+            if freed >= target:
+                break
+        conn.executemany("DELETE FROM responses WHERE key = ?", doomed)
+
+    def clear(self):
+        if not self.enabled:
+            return
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM responses")
+
+
+def chunk_text(chunk):
+    """串流片段的文字；沒有文字的片段（例如只有安全性評分）回傳空字串"""
+    try:
+        return getattr(chunk, "text", "") or ""
+    except Exception:
+        return ""
+
+
+def collect_stream_parts(stream, on_text=None):
+    """
+    收集串流回應（可能含 function_call）的所有 parts，相鄰的文字片段合併成一個 part；
+    每收到文字就以目前累積的文字呼叫 on_text(text)。回傳的 parts 可直接放回對話紀錄。
+    """
+    parts = []
+    buffer = []
+    text = ""
+
+    def flush():
+        if buffer:
+            parts.append(genai.protos.Part(text="".join(buffer)))
+            buffer.clear()
+
+    for chunk in stream:
+        if not chunk.candidates:
+            continue
+        for part in chunk.candidates[0].content.parts:
+            piece = getattr(part, "text", "") or ""
+            if piece:
+                buffer.append(piece)
+                text += piece
+                if on_text:
+                    on_text(text)
+            elif getattr(part, "function_call", None) and part.function_call.name:
+                flush()
+                parts.append(part)
+    flush()
+    return parts
+
+
+class GatewayResponse:
+    """快取回應的替身，提供與 genai 回應相同的 .text"""
+
+    def __init__(self, text, cached=False):
+        self.text = text
+        self.cached = cached
+
+
+class LLMGateway:
+    """
+    Gemini 呼叫閘道。
+
+    - 模型物件依 (API key, 模型, system_instruction) 共用，每個 key 各自一條連線，不使用 genai.configure 的全域設定
+    - 文字回應依 cache_key 寫入磁碟快取，重開同一份分析直接讀取
+    - 相同 key 的呼叫同時進行時只有第一個真的送出，其餘等待同一個結果
+    - 失敗或空白回應不快取，例外照常拋給呼叫端
+    """
+
+    def __init__(self, cache=None, use_cache=True, model_factory=None):
+        self.cache = cache or (ResponseCache() if use_cache else None)
+        self._model_factory = model_factory or self._create_model
+        self._models = {}
+        self._models_lock = threading.Lock()
+        self._clients = {}
+        self._clients_lock = threading.Lock()
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "requests": 0, "hits": 0, "misses": 0, "coalesced": 0,
+            "api_calls": 0, "errors": 0, "api_seconds": 0.0, "api_max_seconds": 0.0,
+            "streams": 0, "first_token_seconds": 0.0,
+        }
+
+    def _client_for(self, api_key):
+        """API key 專屬的 GenerativeService 連線（同一個 key 的模型共用）"""
+        with self._clients_lock:
+            client = self._clients.get(api_key)
+            if client is None:
+                if not hasattr(genai_client, "_ClientManager"):
+                    raise RuntimeError(_SDK_MISMATCH)
+                manager = genai_client._ClientManager()
+                manager.configure(api_key=api_key)
+                client = manager.get_default_client("generative")
+                self._clients[api_key] = client
+            return client
+
+    def _create_model(self, api_key, model_name, system_instruction):
+        if system_instruction:
+            model = genai.GenerativeModel(model_name, system_instruction=system_instruction)
+        else:
+            model = genai.GenerativeModel(model_name)
+        if api_key:
+            # genai 的模型在第一次呼叫時才以全域預設設定建立連線，那時的全域 key 可能已被其他工作階段換掉；
+            # 建立時就綁上這個 key 自己的連線（沒有 key 時照舊使用環境變數的預設設定）
+            if not hasattr(model, "_client"):
+                # 改寫不存在的屬性不會生效，呼叫會默默改用全域 key，寧可直接失敗
+                raise RuntimeError(_SDK_MISMATCH)
+            model._client = self._client_for(api_key)
+        return model
+
+    def get_model(self, api_key, model_name, system_instruction=None):
+        """共用的 genai 模型物件（不經快取，例如需要 tools 的對話）"""
+        key = (api_key, model_name, system_instruction)
+        with self._models_lock:
+            model = self._models.get(key)
+            if model is None:
+                model = self._model_factory(api_key, model_name, system_instruction)
+                self._models[key] = model
+            return model
+
+    def _count(self, **deltas):
+        with self._stats_lock:
+            for name, n in deltas.items():
+                self._stats[name] += n
+
+    def _record_latency(self, seconds):
+        with self._stats_lock:
+            self._stats["api_calls"] += 1
+            self._stats["api_seconds"] += seconds
+            self._stats["api_max_seconds"] = max(self._stats["api_max_seconds"], seconds)
+
+    @staticmethod
+    def _api_kwargs(generation_config, request_options):
+        kwargs = {}
+        if generation_config:
+            kwargs["generation_config"] = generation_config
+        if request_options:
+            kwargs["request_options"] = request_options
+        return kwargs
+
+    def _call_api(self, model, prompt, generation_config, request_options):
+        kwargs = self._api_kwargs(generation_config, request_options)
+        started = time.monotonic()
+        try:
+            response = model.generate_content(prompt, **kwargs)
+            text = getattr(response, "text", "") or ""
+        finally:
+            self._record_latency(time.monotonic() - started)
+        return text
+
+    def _lookup(self, key, use_cache):
+        """
+        查快取與進行中的呼叫，回傳 (cache, 快取文字, future, 是否由本次呼叫負責送出)。
+        快取命中時 future 為 None；由本次送出時呼叫端必須以 _finish 結束。
+        """
+        self._count(requests=1)
+        cache = self.cache if use_cache else None
+        if cache is not None:
+            text = cache.get(key)
+            if text is not None:
+                self._count(hits=1)
+                return cache, text, None, False
+
+        with self._inflight_lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[key] = future
+
+        if leader:
+            self._count(misses=1)
+        else:
+            self._count(coalesced=1)
+        return cache, None, future, leader
+
+    def _finish(self, key):
+        with self._inflight_lock:
+            self._inflight.pop(key, None)
+
+    def generate_text(self, api_key, model_name, prompt, generation_config=None,
+                      system_instruction=None, request_options=None, use_cache=True):
+        """
+        產生文字回應，回傳 (text, 是否來自快取或同時進行的呼叫)。
+
+        request_options（例如 timeout）只影響這次呼叫，不列入快取鍵。
+        """
+        key = cache_key(model_name, prompt, generation_config, system_instruction)
+        cache, text, future, leader = self._lookup(key, use_cache)
+        if future is None:
+            return text, True
+        if not leader:
+            return future.result(), True
+
+        try:
+            model = self.get_model(api_key, model_name, system_instruction)
+            text = self._call_api(model, prompt, generation_config, request_options)
+        except BaseException as e:
+            self._count(errors=1)
+            future.set_exception(e)
+            raise
+        else:
+            if cache is not None and text.strip():
+                cache.put(key, model_name, text)
+            future.set_result(text)
+            return text, False
+        finally:
+            self._finish(key)
+
+    def stream_text(self, api_key, model_name, prompt, generation_config=None,
+                    system_instruction=None, request_options=None, use_cache=True):
+        """
+        串流版 generate_text：逐段產生文字片段（generator）。
+
+        快取命中或相同 prompt 正在產生時，一次產生完整文字；
+        串流完整結束才寫入快取，中途中斷或失敗都不快取。
+        """
+        key = cache_key(model_name, prompt, generation_config, system_instruction)
+        cache, text, future, leader = self._lookup(key, use_cache)
+        if future is None:
+            yield text
+            return
+        if not leader:
+            yield future.result()
+            return
+
+        pieces = []
+        completed = False
+        started = time.monotonic()
+        try:
+            model = self.get_model(api_key, model_name, system_instruction)
+            kwargs = self._api_kwargs(generation_config, request_options)
+            for chunk in model.generate_content(prompt, stream=True, **kwargs):
+                piece = chunk_text(chunk)
+                if not piece:
+                    continue
+                if not pieces:
+                    self._count(streams=1, first_token_seconds=time.monotonic() - started)
+                pieces.append(piece)
+                yield piece
+            completed = True
+        except BaseException as e:
+            # GeneratorExit（呼叫端提前停止讀取）也走這裡，讓等待中的呼叫一起結束
+            self._count(errors=1)
+            future.set_exception(e if isinstance(e, Exception) else RuntimeError("串流已中斷"))
+            raise
+        finally:
+            self._record_latency(time.monotonic() - started)
+            if completed:
+                text = "".join(pieces)
+                if cache is not None and text.strip():
+                    cache.put(key, model_name, text)
+                future.set_result(text)
+            self._finish(key)
+
+    def stats(self):
+        """請求數、快取命中 / 合併 / 實際呼叫次數、命中率與 API 平均 / 最大延遲（秒）"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        served = stats["hits"] + stats["coalesced"]
+        stats["hit_rate"] = served / stats["requests"] if stats["requests"] else 0.0
+        stats["api_avg_seconds"] = stats["api_seconds"] / stats["api_calls"] if stats["api_calls"] else 0.0
+        stats["first_token_avg_seconds"] = (
+            stats["first_token_seconds"] / stats["streams"] if stats["streams"] else 0.0
+        )
+        return stats
+
+
+class GatewayModel:
+    """
+    綁定 API key 與模型名稱的模型替身：generate_content(prompt) 經過閘道快取，
+    回傳帶 .text 的物件，可直接交給 safe_generate / run_analysis_batch；
+    stream=True 時回傳逐段帶 .text 的片段，可交給 stream_generate。
+    """
+
+    def __init__(self, gateway, api_key, model_name, system_instruction=None, generation_config=None):
+        self.gateway = gateway
+        self.api_key = api_key
+        self.model_name = model_name
+        self.system_instruction = system_instruction
+        self.generation_config = generation_config
+
+    def generate_content(self, prompt, generation_config=None, request_options=None, stream=False, **kwargs):
+        if stream and not kwargs:
+            pieces = self.gateway.stream_text(
+                self.api_key, self.model_name, prompt,
+                generation_config=generation_config or self.generation_config,
+                system_instruction=self.system_instruction,
+                request_options=request_options,
+            )
+            return (GatewayResponse(piece) for piece in pieces)
+        if kwargs or stream:
+            # tools 等其他參數的回應不只有文字，直接呼叫原始模型
+            model = self.gateway.get_model(self.api_key, self.model_name, self.system_instruction)
+            return model.generate_content(
+                prompt, generation_config=generation_config or self.generation_config,
+                request_options=request_options, stream=stream, **kwargs
+            )
+        text, cached = self.gateway.generate_text(
+            self.api_key, self.model_name, prompt,
+            generation_config=generation_config or self.generation_config,
+            system_instruction=self.system_instruction,
+            request_options=request_options,
+        )
+        return GatewayResponse(text, cached)
+
+
+_DEFAULT_GATEWAY = None
+_DEFAULT_GATEWAY_LOCK = threading.Lock()
+
+
+def get_gateway():
+    """整個 process 共用的 Gemini 閘道"""
+    global _DEFAULT_GATEWAY
+    with _DEFAULT_GATEWAY_LOCK:
+        if _DEFAULT_GATEWAY is None:
+            _DEFAULT_GATEWAY = LLMGateway()
+        return _DEFAULT_GATEWAY
+
+
+def get_model(api_key, model_name, system_instruction=None, generation_config=None):
+    """經過快取的模型替身；需要 tools 等原始回應時請用 get_gateway().get_model()"""
+    return GatewayModel(get_gateway(), api_key, model_name, system_instruction, generation_config)
+
+
+def get_llm_stats():
+    """Gemini 閘道統計，供監控使用"""
+    return get_gateway().stats()
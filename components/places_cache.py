@@ -0,0 +1,213 @@
+# components/places_cache.py
+# Places 文字搜尋的磁碟快取（SQLite）：同關鍵字、同 geohash 格、同半徑級距直接重用，
+# 較小半徑的查詢落在已快取的大圓內時以 haversine 過濾，不再打 API
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from config import (
+    PLACES_CACHE_MAX_BYTES, PLACES_CACHE_PATH, PLACES_CACHE_TTL_SECONDS,
+    PLACES_GEOHASH_PRECISION, PLACES_RADIUS_STEP,
+)
+from components.geocoding import haversine
+
+
+_GEOHASH_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+# 緯度 1 度約 111 km，用來把半徑換算成候選範圍
+_METERS_PER_DEGREE_LAT = 111320.0
+
+# 候選快取的最大搜尋範圍（公尺）：中心相距超過此距離的快取不會被拿來涵蓋其他查詢
+_MAX_COVER_SPAN = 5000
+
+
+def geohash_encode(lat, lng, precision=PLACES_GEOHASH_PRECISION):
+    """標準 geohash 編碼（precision 7 約 150 m 見方）"""
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    chars = []
+    bit, ch, even = 0, 0, True
+    while len(chars) < precision:
+        rng, value = (lng_range, lng) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        if value >= mid:
+            ch |= 1 << (4 - bit)
+            rng[0] = mid
+        else:
+            rng[1] = mid
+        even = not even
+        if bit < 4:
+            bit += 1
+        else:
+            chars.append(_GEOHASH_BASE32[ch])
+            bit, ch = 0, 0
+    return "".join(chars)
+
+
+def radius_bucket(radius, step=PLACES_RADIUS_STEP):
+    """半徑無條件進位到 step 的倍數；未命中時以此半徑向 API 查詢"""
+    return int(math.ceil(max(float(radius), 1.0) / step) * step)
+
+
+class PlacesCache:
+    """
+    Places 查詢結果快取。
+
+    每筆快取存原始查詢中心、查詢半徑與地點清單（不含距離），讀取時依新的中心重算距離。
+    超過 ttl 秒的資料視為過期；總大小超過 max_bytes 時依最後使用時間淘汰。
+    資料庫無法開啟或寫入時自動停用，不影響查詢本身。
+    """
+
+    def __init__(self, path=PLACES_CACHE_PATH, ttl=PLACES_CACHE_TTL_SECONDS,
+                 max_bytes=PLACES_CACHE_MAX_BYTES, precision=PLACES_GEOHASH_PRECISION):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.precision = precision
+        self.enabled = True
+        self._lock = threading.Lock()
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            with self._connect() as conn:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS places (
+                        keyword TEXT NOT NULL,
+                        geohash TEXT NOT NULL,
+                        radius INTEGER NOT NULL,
+                        lat REAL NOT NULL,
+                        lng REAL NOT NULL,
+                        payload TEXT NOT NULL,
+                        nbytes INTEGER NOT NULL,
+                        created_at REAL NOT NULL,
+                        accessed_at REAL NOT NULL,
+                        PRIMARY KEY (keyword, geohash, radius)
+                    )
+                """)
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_places_keyword_lat ON places (keyword, lat)")
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_places_accessed ON places (accessed_at)")
+        except Exception:
+            self.enabled = False
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def lookup(self, keyword, lat, lng, radius):
+        """
+        找出能完整涵蓋 (lat, lng, radius) 的快取，回傳地點 dict 清單；沒有則回傳 None。
+
+        同一 geohash 格、同一半徑級距的查詢視為同一筆；其他快取只要
+        「中心距離 + 查詢半徑 ≤ 快取半徑」也可直接使用。
+        """
+        if not self.enabled:
+            return None
+        now = time.time()
+        bucket = radius_bucket(radius)
+        key = (keyword, geohash_encode(lat, lng, self.precision), bucket)
+        try:
+            with self._lock, self._connect() as conn:
+                row = conn.execute(
+                    "SELECT keyword, geohash, radius, payload FROM places "
+                    "WHERE keyword = ? AND geohash = ? AND radius = ? AND created_at >= ?",
+                    (*key, now - self.ttl)
+                ).fetchone()
+                if row is None:
+                    lat_span = _MAX_COVER_SPAN / _METERS_PER_DEGREE_LAT
+                    candidates = conn.execute(
+                        "SELECT keyword, geohash, radius, payload, lat, lng FROM places "
+                        "WHERE keyword = ? AND lat BETWEEN ? AND ? AND radius >= ? AND created_at >= ? "
+                        "ORDER BY radius",
+                        (keyword, lat - lat_span, lat + lat_span, radius, now - self.ttl)
+                    ).fetchall()
+                    row = next(
+                        (c[:4] for c in candidates if haversine(lat, lng, c[4], c[5]) + radius <= c[2]),
+                        None
+                    )
+                if row is None:
+                    return None
+                conn.execute(
+                    "UPDATE places SET accessed_at = ? WHERE keyword = ? AND geohash = ? AND radius = ?",
+                    (now, *row[:3])
+                )
+            return json.loads(row[3])
+        except Exception:
+            return None
+
+    def store(self, keyword, lat, lng, radius, places):
+        """寫入一次 API 查詢結果（radius 為實際查詢半徑）"""
+        if not self.enabled:
+            return
+        now = time.time()
+        payload = json.dumps(places, ensure_ascii=False)
+        nbytes = len(payload.encode("utf-8"))
+        try:
+            with self._lock, self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO places VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (keyword, geohash_encode(lat, lng, self.precision), int(radius),
+                     lat, lng, payload, nbytes, now, now)
+                )
+                conn.execute("DELETE FROM places WHERE created_at < ?", (now - self.ttl,))
+                self._evict(conn)
+        except Exception:
+            pass
+
+    def _evict(self, conn):
+        total = conn.execute("SELECT COALESCE(SUM(nbytes), 0) FROM places").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # 淘汰到上限的九成，避免每次寫入都觸發
+        target = total - int(self.max_bytes * 0.9)
+        freed = 0
+        doomed = []
+        for keyword, geohash, radius, nbytes in conn.execute(
+            "SELECT keyword, geohash, radius, nbytes FROM places ORDER BY accessed_at"
+        ):
+            doomed.append((keyword, geohash, radius))
+            freed += nbytes
+            if freed >= target:
+                break
+        conn.executemany("DELETE FROM places WHERE keyword = ? AND geohash = ? AND radius = ?", doomed)
+
+    def places_for_keyword(self, keyword):
+        """某關鍵字所有未過期快取的地點（可能重複，由呼叫端去重）"""
+        if not self.enabled:
+            return []
+        try:
+            with self._lock, self._connect() as conn:
+                rows = conn.execute(
+                    "SELECT payload FROM places WHERE keyword = ? AND created_at >= ?",
+                    (keyword, time.time() - self.ttl)
+                ).fetchall()
+        except Exception:
+            return []
+        return [place for (payload,) in rows for place in json.loads(payload)]
+
+    def clear(self):
+        if not self.enabled:
+            return
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM places")
+
+
+_DEFAULT_CACHE = None
+_DEFAULT_CACHE_LOCK = threading.Lock()
+
+
+def get_places_cache():
+    """整個 process 共用的 Places 快取"""
+    global _DEFAULT_CACHE
+    with _DEFAULT_CACHE_LOCK:
+        if _DEFAULT_CACHE is None:
+            _DEFAULT_CACHE = PlacesCache()
+        return _DEFAULT_CACHE
@@ -0,0 +1,165 @@
+# components/places_fetch.py
+# Google Places 文字搜尋的並行查詢層：共用連線池、全域 token bucket 限速、失敗重試
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from config import GOOGLE_MAPS_BASE_URL, PLACES_MAX_WORKERS, PLACES_RATE_PER_SEC
+from components.geocoding import haversine_many
+from components.places_cache import get_places_cache, radius_bucket
+from components.rate_limit import TokenBucket
+
+
+TEXT_SEARCH_PATH = "place/textsearch/json"
+
+# HTTP 狀態碼 / Places API status 屬於暫時性錯誤時才重試
+RETRY_HTTP_STATUS = {429, 500, 502, 503, 504}
+RETRY_API_STATUS = {"OVER_QUERY_LIMIT", "UNKNOWN_ERROR"}
+
+# 只有正常回應才寫入快取（REQUEST_DENIED 等錯誤不快取）
+CACHEABLE_API_STATUS = {"OK", "ZERO_RESULTS"}
+
+
+_LIMITER = TokenBucket(PLACES_RATE_PER_SEC)
+
+_SESSIONS = {}
+_SESSIONS_LOCK = threading.Lock()
+
+
+def _get_session(pool_size):
+    """依連線池大小共用 requests.Session，避免每次查詢重新建立 TLS 連線"""
+    with _SESSIONS_LOCK:
+        session = _SESSIONS.get(pool_size)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _SESSIONS[pool_size] = session
+        return session
+
+
+def extract_places(data):
+    """Places 回應 → 與查詢中心無關的地點 dict（可直接快取）"""
+    places = []
+    for p in data.get("results", []):
+        loc = p["geometry"]["location"]
+        places.append({
+            "name": p.get("name", "未命名"),
+            "lat": loc["lat"],
+            "lng": loc["lng"],
+            "place_id": p.get("place_id", ""),
+            "address": p.get("formatted_address") or p.get("vicinity", ""),
+            "types": p.get("types", []),
+        })
+    return places
+
+
+def build_place_rows(places, lat, lng, keyword, radius):
+    """地點 dict → (來源, 關鍵字, 名稱, 緯度, 經度, 距離, place_id, 地址, types)，只保留半徑內"""
+    distances = haversine_many(lat, lng, [p["lat"] for p in places], [p["lng"] for p in places])
+    results = []
+    for place, dist in zip(places, distances):
+        dist = int(dist)
+        if dist > radius:
+            continue
+        results.append((
+            "文字搜尋",
+            keyword,
+            place["name"],
+            place["lat"],
+            place["lng"],
+            dist,
+            place["place_id"],
+            place["address"],
+            place["types"]
+        ))
+    return results
+
+
+class PlacesClient:
+    """
+    Places 文字搜尋客戶端。
+
+    base_url 可改成本機測試伺服器；limiter 預設為整個 process 共用的限速器，
+    多個分析同時執行也不會超過 API 配額。cache 預設為共用的磁碟快取，
+    use_cache=False 時每次都直接查詢。
+    """
+
+    def __init__(self, api_key, base_url=GOOGLE_MAPS_BASE_URL, max_workers=PLACES_MAX_WORKERS,
+                 limiter=None, retries=3, backoff=0.5, timeout=10, cache=None, use_cache=True):
+        self.api_key = api_key
+        self.url = base_url.rstrip("/") + "/" + TEXT_SEARCH_PATH
+        self.max_workers = max(1, int(max_workers))
+        self.limiter = limiter or _LIMITER
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.cache = cache or (get_places_cache() if use_cache else None)
+        self.session = _get_session(self.max_workers)
+
+    def _request(self, params):
+        for attempt in range(self.retries + 1):
+            last_try = attempt == self.retries
+            self.limiter.acquire()
+            try:
+                resp = self.session.get(self.url, params=params, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout):
+                if last_try:
+                    raise
+            else:
+                if resp.status_code not in RETRY_HTTP_STATUS or last_try:
+                    resp.raise_for_status()
+                    data = resp.json()
+                    if data.get("status") not in RETRY_API_STATUS or last_try:
+                        return data
+            time.sleep(self.backoff * (2 ** attempt))
+
+    def text_search(self, lat, lng, keyword, radius):
+        """
+        單一關鍵字查詢，回傳半徑內的地點；重試後仍失敗回傳空 list。
+
+        有快取時先查快取；未命中則以進位後的半徑級距查詢並寫入，
+        讓附近、半徑較小的後續查詢也能直接命中。
+        """
+        if self.cache is not None:
+            places = self.cache.lookup(keyword, lat, lng, radius)
+            if places is not None:
+                return build_place_rows(places, lat, lng, keyword, radius)
+
+        fetch_radius = radius_bucket(radius) if self.cache is not None else radius
+        params = {
+            "query": keyword,
+            "location": f"{lat},{lng}",
+            "radius": fetch_radius,
+            "key": self.api_key,
+            "language": "zh-TW"
+        }
+        try:
+            data = self._request(params)
+        except Exception:
+            return []
+
+        places = extract_places(data)
+        if self.cache is not None and data.get("status", "OK") in CACHEABLE_API_STATUS:
+            self.cache.store(keyword, lat, lng, fetch_radius, places)
+        return build_place_rows(places, lat, lng, keyword, radius)
+
+    def search_many(self, queries):
+        """
+        並行執行多筆 (lat, lng, keyword, radius) 查詢。
+
+        回傳 dict，鍵為查詢 tuple、值與 text_search 相同；重複的查詢只送一次。
+        結果只依查詢內容決定，與完成順序無關。
+        """
+        unique = list(dict.fromkeys(queries))
+        if not unique:
+            return {}
+        if len(unique) == 1 or self.max_workers == 1:
+            return {q: self.text_search(*q) for q in unique}
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(unique))) as pool:
+            results = pool.map(lambda q: self.text_search(*q), unique)
+            return dict(zip(unique, results))
@@ -2,21 +2,20 @@ import streamlit as st
 import pandas as pd
 from utils import display_pagination
 from components.favorites import FavoritesManager, normalize_property_id
+from components.city_registry import slug_from_listing_file
+from components.listing_history import price_change_label, price_history
+from components.result_set import reuse_result_set
 
-def display_pagination(df, items_per_page=10):
+def display_pagination(results, items_per_page=10, sort=None):
+    """結果集分頁：只取出當頁的列；排序順序由結果集記住，換頁不必重新排序"""
     if 'current_search_page' not in st.session_state:
         st.session_state.current_search_page = 1
 
-    current_page = st.session_state.current_search_page
-    total_items = len(df)
-    total_pages = (total_items + items_per_page - 1) // items_per_page
-    current_page = max(1, min(current_page, total_pages))
+    current_page_data, current_page, total_pages, total_items = results.page(
+        st.session_state.current_search_page, items_per_page, sort
+    )
     st.session_state.current_search_page = current_page
 
-    start_idx = (current_page - 1) * items_per_page
-    end_idx = min(start_idx + items_per_page, total_items)
-    current_page_data = df.iloc[start_idx:end_idx]
-
     return current_page_data, current_page, total_pages, total_items
 
 
@@ -30,8 +29,9 @@ def render_property_list():
     if 'filtered_df' not in st.session_state or st.session_state.filtered_df.empty:
         return
 
-    df = st.session_state.filtered_df.copy()
-    df = df.drop_duplicates(subset=['編號'], keep='first')
+    # 同一次搜尋的結果集跨 rerun 沿用（去重與各排序方式只算一次）
+    results = reuse_result_set(st.session_state.get('search_results'), st.session_state.filtered_df, unique_by='編號')
+    st.session_state.search_results = results
 
     search_params = st.session_state.search_params
 
@@ -58,23 +58,24 @@ def render_property_list():
             label_visibility="collapsed"   # 隱藏標籤，讓版面更簡潔
         )
 
-    # 套用排序
+    # 套用排序（None 為原本順序）
     sort_value = sort_options[selected_sort]
-    if sort_value is not None:                          # ← 改這裡
-        sort_col_name, ascending = sort_value
-        if sort_col_name in df.columns:
-            df = df.sort_values(by=sort_col_name, ascending=ascending, na_position='last')
     # ────────────────────────────────────────────────────
 
-    current_page_data, current_page, total_pages, total_items = display_pagination(df, items_per_page=10)
+    current_page_data, current_page, total_pages, total_items = display_pagination(
+        results, items_per_page=10, sort=sort_value
+    )
+
+    # 每個物件的調價紀錄（沒有快照歷史時為空表）
+    history = price_history(slug_from_listing_file(search_params['file'])) if search_params.get('file') else None
 
     for idx, (index, row) in enumerate(current_page_data.iterrows()):
-        render_property_card(row, current_page, idx)
+        render_property_card(row, current_page, idx, history)
 
     render_pagination_controls(current_page, total_pages, total_items)
 
 
-def render_property_card(row, current_page, idx):
+def render_property_card(row, current_page, idx, history=None):
     with st.container():
         global_idx = (current_page - 1) * 10 + idx + 1
 
@@ -91,6 +92,9 @@ def render_property_card(row, current_page, idx):
             if pd.notna(row['建坪']) and row['建坪'] > 0:
                 unit_price = (row['總價(萬)'] * 10000) / row['建坪']
                 st.caption(f"單價: ${unit_price:,.0f}/坪")
+            price_label = price_change_label(history, row['編號'])
+            if price_label:
+                st.caption(f"🏷️ {price_label}")
 
         col1, col2, col3, col4, col5, col6, col7 = st.columns([1, 1, 1, 1, 1, 1, 1])
         with col1:
@@ -0,0 +1,181 @@
+# components/query_parser.py
+# AI 對話搜尋的本地查詢解析：常見的行政區、預算、格局、樓層、屋齡、坪數、類型與車位說法直接用規則解析，
+# 整句都看得懂時不必呼叫 Gemini；有看不懂的部分才交給 LLM，並統計本地解析的涵蓋率
+import re
+import threading
+
+from config import TAICHUNG_DISTRICTS
+
+
+# 「左右 / 大約」換算成 ±10% 的範圍
+AROUND_RATIO = 0.1
+
+_CN_DIGITS = {"零": 0, "一": 1, "二": 2, "兩": 2, "三": 3, "四": 4, "五": 5, "六": 6, "七": 7, "八": 8, "九": 9}
+_NUM = r"(\d+(?:\.\d+)?|[零一二兩三四五六七八九十]+)"
+_RANGE_SEP = r"\s*(?:-|~|～|到|至)\s*"
+_UPPER = r"(?:以內|之內|以下|內|有找)"
+_LOWER = r"(?:以上|起跳|起)"
+_AROUND_AFTER = r"(?:左右|上下)"
+_AROUND_BEFORE = r"(?:大約|大概|約)"
+_AT_MOST = r"(?:不超過|低於|少於|最多|預算|總價)"
+
+_CITY_RE = re.compile(r"[台臺]中市?")
+_HOUSETYPES = {"電梯大樓": "大樓", "大樓": "大樓", "華廈": "華廈", "公寓": "公寓", "套房": "套房",
+               "透天厝": "透天", "透天": "透天", "別墅": "別墅"}
+_HOUSETYPE_RE = re.compile("|".join(sorted(_HOUSETYPES, key=len, reverse=True)))
+_NO_PARKING_RE = re.compile(r"(?:不要|不需要|不用|不含|免|無|沒有)\s*車位")
+_PARKING_RE = re.compile(r"(?:需要|要|有|含|附帶|附|帶)?\s*車位")
+_LAYOUT_RES = [
+    ("rooms", re.compile(_NUM + r"\s*房")),
+    ("living_rooms", re.compile(_NUM + r"\s*廳")),
+    ("bathrooms", re.compile(_NUM + r"\s*衛(?:浴)?")),
+    ("study_rooms", re.compile(_NUM + r"\s*室")),
+]
+
+# 解析完後可以忽略的字詞與標點
+_FILLER_RE = re.compile(
+    r"我想要|我想|我要|想要|想找|想買|幫我|請|找|買|要|的|在|位於|附近|物件|房子|房屋|房產|"
+    r"和|跟|或|及|還有|預算|總價|格局|屋齡|[\s,，、。.!！?？;；:：/()（）「」『』]"
+)
+
+
+def _district_aliases():
+    """行政區全名與省略「區」的說法（單字的東 / 西 / 南 / 北 / 中 必須帶「區」）"""
+    aliases = {}
+    for name in TAICHUNG_DISTRICTS:
+        aliases[name] = name
+        short = name[:-1]
+        if len(short) >= 2:
+            aliases.setdefault(short, name)
+    return aliases
+
+
+_DISTRICTS = _district_aliases()
+_DISTRICT_RE = re.compile("|".join(sorted(_DISTRICTS, key=len, reverse=True)))
+
+_stats = {"queries": 0, "local": 0}
+_stats_lock = threading.Lock()
+
+
+def _to_number(text):
+    """阿拉伯數字或一到九十九的中文數字 → 數字（整數值回傳 int）"""
+    if text[0].isdigit():
+        value = float(text)
+        return int(value) if value.is_integer() else value
+    if "十" in text:
+        tens, _, ones = text.partition("十")
+        return (_CN_DIGITS.get(tens, 1) if tens else 1) * 10 + (_CN_DIGITS.get(ones, 0) if ones else 0)
+    return _CN_DIGITS[text] if len(text) == 1 else int("".join(str(_CN_DIGITS[c]) for c in text))
+
+
+def _amount(number, unit):
+    return _to_number(number)
+
+
+def _money(number, unit):
+    """金額換算成「萬」"""
+    value = round(_to_number(number) * {"億": 10000, "千萬": 1000}.get(unit, 1), 4)
+    return int(value) if float(value).is_integer() else value
+
+
+def _around(value):
+    return round(value * (1 - AROUND_RATIO)), round(value * (1 + AROUND_RATIO))
+
+
+class _Query:
+    """待解析的字串：每條規則取走符合的片段，最後看剩下的內容是否都能忽略"""
+
+    def __init__(self, text):
+        self.text = text
+        self.filters = {}
+
+    def take(self, pattern):
+        match = re.search(pattern, self.text) if isinstance(pattern, str) else pattern.search(self.text)
+        if match:
+            self.text = self.text[:match.start()] + " " + self.text[match.end():]
+        return match
+
+    def quantity(self, unit, min_key, max_key, convert=_amount, prefix=""):
+        """「A-B 單位」「N 單位以內 / 以上 / 左右」等說法，每個鍵只取第一次出現的說法"""
+        unit_group = f"({unit})"
+        match = self.take(prefix + _NUM + rf"\s*(?:{unit})?" + _RANGE_SEP + _NUM + r"\s*" + unit_group)
+        if match:
+            low, high = convert(match.group(1), match.group(3)), convert(match.group(2), match.group(3))
+            self.filters[min_key], self.filters[max_key] = min(low, high), max(low, high)
+            return
+        match = (self.take(prefix + _AROUND_BEFORE + r"?\s*" + _NUM + r"\s*" + unit_group + r"\s*" + _AROUND_AFTER)
+                 or self.take(prefix + _AROUND_BEFORE + r"\s*" + _NUM + r"\s*" + unit_group))
+        if match:
+            self.filters[min_key], self.filters[max_key] = _around(convert(match.group(1), match.group(2)))
+            return
+        match = self.take(prefix + _NUM + r"\s*" + unit_group + r"\s*" + _LOWER)
+        if match:
+            self.filters[min_key] = convert(match.group(1), match.group(2))
+        match = (self.take(prefix + _NUM + r"\s*" + unit_group + r"\s*" + _UPPER)
+                 or self.take(_AT_MOST + r"\s*" + _NUM + r"\s*" + unit_group))
+        if match:
+            self.filters[max_key] = convert(match.group(1), match.group(2))
+
+    def leftover(self):
+        return _FILLER_RE.sub("", self.text)
+
+
+def _parse(text):
+    query = _Query(text)
+    filters = query.filters
+
+    if query.take(_CITY_RE):
+        filters["city"] = "台中市"
+
+    districts = []
+    while (match := query.take(_DISTRICT_RE)):
+        districts.append(_DISTRICTS[match.group()])
+    if districts:
+        filters["district"] = "、".join(dict.fromkeys(districts))
+
+    if query.take(_NO_PARKING_RE):
+        filters["car_grip"] = "不要"
+    elif query.take(_PARKING_RE):
+        filters["car_grip"] = "需要"
+
+    match = query.take(_HOUSETYPE_RE)
+    if match:
+        filters["housetype"] = _HOUSETYPES[match.group()]
+
+    query.quantity("億|千萬|萬", "budget_min", "budget_max", convert=_money)
+    query.quantity("坪", "area_min", "area_max")
+    query.quantity("樓|層", "floor_min", "floor_max")
+    query.quantity("年", "age_min", "age_max", prefix=r"(?:屋齡\s*)?")
+
+    for key, pattern in _LAYOUT_RES:
+        match = query.take(pattern)
+        if match:
+            filters[key] = _to_number(match.group(1))
+
+    return filters, query.leftover()
+
+
+def parse_query(text, record=True):
+    """
+    自然語言查詢 → 與 Gemini 回傳相同格式的條件 dict；有無法解析的內容（或什麼都沒解析到）時回傳 None，
+    交給 LLM 處理。record 時計入涵蓋率統計。
+    """
+    filters, leftover = _parse(text or "")
+    result = filters if filters and not leftover else None
+    if record:
+        with _stats_lock:
+            _stats["queries"] += 1
+            _stats["local"] += result is not None
+    return result
+
+
+def get_query_parser_stats():
+    """本地解析統計：查詢數、本地解析數、交給 LLM 的次數與涵蓋率"""
+    with _stats_lock:
+        queries, local = _stats["queries"], _stats["local"]
+    return {
+        "queries": queries,
+        "local": local,
+        "llm": queries - local,
+        "coverage_rate": local / queries if queries else 0.0,
+    }
@@ -1,18 +1,26 @@
-import io
 import math
 import re
+import threading
+import weakref
 from datetime import datetime, timedelta
 from pathlib import Path
 
+import numpy as np
 import pandas as pd
 import plotly.express as px
 import streamlit as st
 
+from components.columnar_cache import load_with_columnar_cache
+from components.real_price_cube import RealPriceCube
+
 
 SUPPORTED_REAL_PRICE_CITY = "臺中市"
 
 REAL_PRICE_DATA_DIR = Path(__file__).resolve().parents[1] / "real_price"
 
+# Bump when the normalization rules change so cached .feather files are rebuilt.
+REAL_PRICE_CACHE_SCHEMA = "real-price-v1"
+
 CITY_FOLDER_MAP = {
     "臺中市": "taichung",
     "台中市": "taichung",
@@ -113,6 +121,41 @@ def _parse_tw_date(value):
     return pd.NaT
 
 
+def _is_text_series(series):
+    return pd.api.types.infer_dtype(series, skipna=True) in ("string", "empty")
+
+
+def _parse_number_series(series):
+    """Column-wise _parse_number: same first-number rule, without a Python call per cell."""
+    if pd.api.types.is_numeric_dtype(series):
+        return series.astype(float)
+    if not _is_text_series(series):
+        return series.apply(_parse_number)
+    text = series.str.replace(",", "", regex=False)
+    # float() on the matched text also accepts non-ASCII digits, exactly like _parse_number.
+    return text.str.extract(r"(-?\d+(?:\.\d+)?)", expand=False).astype(float)
+
+
+def _parse_tw_date_series(series):
+    """Column-wise _parse_tw_date: 7 digits are ROC yyymmdd, 8 digits are yyyymmdd."""
+    if not _is_text_series(series):
+        return series.apply(_parse_tw_date)
+    digits = series.str.replace(r"\D", "", regex=True)
+    length = digits.str.len()
+    number = digits.where(length.isin([7, 8])).astype(float)
+    parts = pd.DataFrame({
+        "year": number // 10000 + (length == 7) * 1911,
+        "month": number // 100 % 100,
+        "day": number % 100,
+    }, index=series.index)
+    dates = pd.to_datetime(parts, errors="coerce")
+    # Years beyond the datetime64[ns] range still become Timestamps in _parse_tw_date.
+    rejected = dates.isna() & parts.notna().all(axis=1)
+    if rejected.any() and series[rejected].apply(_parse_tw_date).notna().any():
+        return series.apply(_parse_tw_date)
+    return dates
+
+
 def _pick_column(df, candidates):
     for col in candidates:
         if col in df.columns:
@@ -140,24 +183,60 @@ def _find_real_price_header_line(lines):
     return None
 
 
-def _read_csv_bytes(data):
-    text, enc = _decode_csv_text(data)
+# Only the first bytes are decoded to find the encoding, the header line and the
+# English second header row; the rest is streamed by pandas' C parser.
+REAL_PRICE_SNIFF_BYTES = 1 << 16
+
+
+def _is_english_header(line):
+    return line.isascii() and any(ch.isalpha() for ch in line)
+
+
+def _sniff_real_price_csv(head):
+    """(encoding, encoding_errors, rows to skip) for a raw MOI CSV, from its first bytes."""
+    cut = head.rfind(b"\n")
+    text, enc = _decode_csv_text(head[:cut] if cut > 0 else head)
     lines = text.splitlines()
     header_idx = _find_real_price_header_line(lines)
     if header_idx is None:
         preview = "\n".join(lines[:5])[:500]
         raise ValueError(f"找不到實價登錄 CSV 表頭，可能下載到非 CSV 內容。前段內容：{preview}")
-
-    csv_text = "\n".join(lines[header_idx:])
+    skip = list(range(header_idx))
+    if header_idx + 1 < len(lines) and _is_english_header(lines[header_idx + 1]):
+        skip.append(header_idx + 1)
+    if enc == "utf-8-ignore":
+        return "utf-8", "ignore", skip
+    return enc, "strict", skip
+
+
+def read_real_price_csv(open_binary, chunksize=None):
+    """
+    Read a raw MOI CSV without decoding it into one string.
+
+    open_binary() returns a new binary stream each call (a file or a zip member);
+    it is opened once to sniff the header and once to parse. With chunksize an
+    iterator of DataFrames (all columns str) is returned and the stream is closed
+    when it is exhausted.
+    """
+    with open_binary() as stream:
+        head = stream.read(REAL_PRICE_SNIFF_BYTES)
+    encoding, errors, skip = _sniff_real_price_csv(head)
     read_kwargs = {
+        "encoding": encoding,
+        "encoding_errors": errors,
+        "skiprows": skip,
         "dtype": str,
-        "engine": "python",
         "on_bad_lines": "skip",
     }
-    try:
-        return pd.read_csv(io.StringIO(csv_text), **read_kwargs)
-    except TypeError:
-        return pd.read_csv(io.StringIO(csv_text), dtype=str, engine="python", error_bad_lines=False)
+    if chunksize is None:
+        with open_binary() as stream:
+            return pd.read_csv(stream, **read_kwargs)
+
+    def chunks():
+        with open_binary() as stream:
+            yield from pd.read_csv(stream, chunksize=chunksize, **read_kwargs)
+
+    return chunks()
 
 
 def _prepare_real_price_df(df, city=""):
@@ -174,14 +253,14 @@ def _prepare_real_price_df(df, city=""):
     address_col = _pick_column(df, ["土地位置建物門牌", "地址"])
 
     out = pd.DataFrame()
-    out["交易日期"] = df[date_col].apply(_parse_tw_date) if date_col else pd.NaT
+    out["交易日期"] = _parse_tw_date_series(df[date_col]) if date_col else pd.NaT
     out["行政區"] = df[district_col].astype(str).str.strip() if district_col else ""
     out["建物型態"] = df[building_type_col].astype(str).str.strip() if building_type_col else ""
-    area_m2 = df[area_col].apply(_parse_number) if area_col else math.nan
+    area_m2 = _parse_number_series(df[area_col]) if area_col else math.nan
     out["建坪"] = pd.to_numeric(area_m2, errors="coerce") / 3.305785
-    total_yuan = df[price_col].apply(_parse_number) if price_col else math.nan
+    total_yuan = _parse_number_series(df[price_col]) if price_col else math.nan
     out["總價(萬)"] = pd.to_numeric(total_yuan, errors="coerce") / 10000
-    out["屋齡"] = df[age_col].apply(_parse_number) if age_col else math.nan
+    out["屋齡"] = _parse_number_series(df[age_col]) if age_col else math.nan
     out["地址"] = df[address_col].astype(str).str.strip() if address_col else ""
     out["城市"] = normalize_city_name(city)
     out["單價(萬/坪)"] = out["總價(萬)"] / out["建坪"]
@@ -195,7 +274,7 @@ def _read_manual_real_price_csv(file_path):
     """Read manually committed real price CSV from real_price."""
     file_path = Path(file_path)
     try:
-        return _read_csv_bytes(file_path.read_bytes())
+        return read_real_price_csv(lambda: open(file_path, "rb"))
     except Exception:
         pass
 
@@ -229,9 +308,94 @@ def _load_manual_real_price_file(file_path, city):
     return _normalize_manual_real_price_df(_read_manual_real_price_csv(file_path), city)
 
 
+def load_real_price_file_cached(file_path, city):
+    """Load one period CSV through the columnar cache written next to it."""
+    city = normalize_city_name(city)
+    schema = f"{REAL_PRICE_CACHE_SCHEMA}:{city}"
+    df, _ = load_with_columnar_cache(
+        file_path, lambda path: _load_manual_real_price_file(path, city), schema
+    )
+    return df
+
+
+_CITY_FRAMES = {}
+_CITY_FRAMES_LOCK = threading.Lock()
+
+
+def _real_price_source_signature(city):
+    """(name, mtime, size) of every source file for city; changes whenever a CSV is added or updated."""
+    paths = []
+    folder_name = CITY_FOLDER_MAP.get(city)
+    if folder_name:
+        paths.extend(sorted((REAL_PRICE_DATA_DIR / folder_name).glob("*.csv")))
+    filename = CITY_FILE_MAP.get(city)
+    if filename:
+        paths.append(REAL_PRICE_DATA_DIR / filename)
+    signature = []
+    for path in paths:
+        try:
+            stat = path.stat()
+        except OSError:
+            continue
+        signature.append((str(path), stat.st_mtime_ns, stat.st_size))
+    return tuple(signature)
+
+
+_CITY_CUBES = {}
+_CITY_CUBES_LOCK = threading.Lock()
+
+
+def get_real_price_cube(city):
+    """
+    Rollup cube (行政區 x 建物型態 x 季度) for a city, kept for the process.
+
+    Only period CSVs that are new or changed since the last call are aggregated;
+    the per-file tables are then summed by group.
+    """
+    city = normalize_city_name(city)
+    signature = _real_price_source_signature(city)
+    # The merged legacy CSV is only used when the city folder has no period files.
+    folder_name = CITY_FOLDER_MAP.get(city)
+    folder_path = str(REAL_PRICE_DATA_DIR / folder_name) if folder_name else None
+    if folder_path and any(str(Path(name).parent) == folder_path for name, _, _ in signature):
+        signature = tuple(entry for entry in signature if str(Path(entry[0]).parent) == folder_path)
+    with _CITY_CUBES_LOCK:
+        cube = _CITY_CUBES.setdefault(city, RealPriceCube())
+    cube.refresh([
+        (name, (mtime, size), lambda name=name: _load_cube_source(name, city))
+        for name, mtime, size in signature
+    ])
+    return cube
+
+
+def _load_cube_source(file_path, city):
+    # Unreadable files are skipped here; load_cached_real_price_data already warns about them.
+    try:
+        return load_real_price_file_cached(file_path, city)
+    except Exception:
+        return pd.DataFrame()
+
+
 def load_cached_real_price_data(city):
-    """Load manually provided real price CSV files for a city from the GitHub project."""
+    """
+    Real price transactions for a city, loaded once per process.
+
+    The frame is shared by every caller (and by the comparable index built on it);
+    copy before modifying. It is reloaded when a source CSV is added or changed.
+    """
     city = normalize_city_name(city)
+    signature = _real_price_source_signature(city)
+    with _CITY_FRAMES_LOCK:
+        cached = _CITY_FRAMES.get(city)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+        df = _load_real_price_data(city)
+        _CITY_FRAMES[city] = (signature, df)
+        return df
+
+
+def _load_real_price_data(city):
+    """Load manually provided real price CSV files for a city from the GitHub project."""
     folder_name = CITY_FOLDER_MAP.get(city)
     if folder_name:
         folder_path = REAL_PRICE_DATA_DIR / folder_name
@@ -239,7 +403,7 @@ def load_cached_real_price_data(city):
             frames = []
             for file_path in sorted(folder_path.glob("*.csv")):
                 try:
-                    frame = _load_manual_real_price_file(file_path, city)
+                    frame = load_real_price_file_cached(file_path, city)
                     if not frame.empty:
                         frame["資料檔案"] = file_path.name
                         frames.append(frame)
@@ -256,19 +420,156 @@ def load_cached_real_price_data(city):
     if not file_path.exists():
         return pd.DataFrame()
 
-    return _load_manual_real_price_file(file_path, city)
+    return load_real_price_file_cached(file_path, city)
 
 
-def _matches_building_type(series, target_type):
+def _building_type_token(target_type):
+    """Leading word of a building type ("住宅大樓(11層含以上有電梯)" -> "住宅大樓"), matched as a substring."""
     target_type = "" if target_type is None else str(target_type).strip()
-    if not target_type:
-        return pd.Series(True, index=series.index)
-    token = target_type.split("(")[0].split("/")[0].strip()
+    return target_type.split("(")[0].split("/")[0].strip()
+
+
+def _matches_building_type(series, target_type):
+    token = _building_type_token(target_type)
     if not token:
         return pd.Series(True, index=series.index)
     return series.astype(str).str.contains(re.escape(token), na=False)
 
 
+class _ComparablePartition:
+    """Transactions of one (行政區, 建物型態) group, sorted by date and by 建坪."""
+
+    def __init__(self, rows, dates, areas):
+        self.date_rows = rows[np.argsort(dates[rows], kind="stable")]
+        self.date_values = dates[self.date_rows]
+        with_area = rows[~np.isnan(areas[rows])]
+        self.area_rows = with_area[np.argsort(areas[with_area], kind="stable")]
+        self.area_values = areas[self.area_rows]
+
+    def since(self, cutoff):
+        """Rows traded on or after cutoff (NaT dates sort first and are never included)."""
+        return self.date_rows[np.searchsorted(self.date_values, cutoff, side="left"):]
+
+    def area_between(self, low, high):
+        """Rows with low <= 建坪 <= high, like Series.between."""
+        start = np.searchsorted(self.area_values, low, side="left")
+        stop = np.searchsorted(self.area_values, high, side="right")
+        return self.area_rows[start:stop]
+
+
+class ComparableIndex:
+    """
+    Comparable-transaction lookup for one real price frame.
+
+    Rows are grouped by (行政區, 建物型態); each group keeps date-sorted and
+    area-sorted row arrays, so every step of the relaxation cascade in
+    filter_nearby_transactions is a few binary searches over small groups.
+    District / type matching (substring, as before) runs once per distinct value.
+    """
+
+    def __init__(self, df):
+        work = df.copy()
+        work["交易日期"] = pd.to_datetime(work["交易日期"], errors="coerce")
+        self.work = work
+        self.dates = work["交易日期"].to_numpy(dtype="datetime64[ns]").view("int64")
+        self.areas = work["建坪"].to_numpy(dtype=float, na_value=np.nan)
+        self.ages = work["屋齡"].to_numpy(dtype=float, na_value=np.nan)
+
+        district_codes, self.districts = pd.factorize(work["行政區"].astype(str))
+        type_codes, self.building_types = pd.factorize(work["建物型態"].astype(str))
+        group_codes = district_codes.astype(np.int64) * max(len(self.building_types), 1) + type_codes
+        order = np.argsort(group_codes, kind="stable")
+        starts = np.flatnonzero(np.r_[True, np.diff(group_codes[order]) != 0]) if len(order) else []
+        self.partitions = {}
+        for start, stop in zip(starts, list(starts[1:]) + [len(order)]):
+            rows = order[start:stop]
+            key = (self.districts[district_codes[rows[0]]], self.building_types[type_codes[rows[0]]])
+            self.partitions[key] = _ComparablePartition(rows, self.dates, self.areas)
+
+        self.sorted_dates = np.sort(self.dates)
+        self._recent = None
+        self._lock = threading.Lock()
+
+    def recent_frame(self, cutoff):
+        """Transactions on or after cutoff in original order (shared; copy before modifying)."""
+        count = len(self.sorted_dates) - np.searchsorted(self.sorted_dates, cutoff, side="left")
+        with self._lock:
+            if self._recent is not None and self._recent[0] == count:
+                return self._recent[1]
+        recent = self.work[self.dates >= cutoff].reset_index(drop=True)
+        with self._lock:
+            self._recent = (count, recent)
+        return recent
+
+    def _groups(self, district, building_type):
+        districts = list(self.districts) if not district else [d for d in self.districts if district in d]
+        token = _building_type_token(building_type)
+        types = list(self.building_types) if not token else [t for t in self.building_types if token in t]
+        return [self.partitions[key] for key in ((d, t) for d in districts for t in types) if key in self.partitions]
+
+    def comparable_rows(self, cutoff, district, building_type, area, age):
+        """Row positions chosen by the relaxation cascade (first step with >= 10 rows), ascending."""
+        has_area = not math.isnan(area) and area > 0
+        has_age = not math.isnan(age)
+        full = self._groups(district, building_type)
+        by_district = self._groups(district, "") if building_type else full
+
+        def collect(groups, area_range=None, with_age=False):
+            parts = []
+            for group in groups:
+                if area_range is None:
+                    rows = group.since(cutoff)
+                else:
+                    rows = group.area_between(*area_range)
+                    rows = rows[self.dates[rows] >= cutoff]
+                if with_age:
+                    ages = self.ages[rows]
+                    ages = np.where(np.isnan(ages), age, ages)
+                    rows = rows[(ages >= max(age - 10, 0)) & (ages <= age + 10)]
+                parts.append(rows)
+            return np.sort(np.concatenate(parts)) if parts else np.empty(0, dtype=np.intp)
+
+        steps = []
+        if has_area:
+            steps.append(lambda: collect(full, (area * 0.7, area * 1.3), has_age))
+            steps.append(lambda: collect(full, (area * 0.7, area * 1.3)))
+            steps.append(lambda: collect(full, (area * 0.5, area * 1.5)))
+        elif has_age:
+            steps.append(lambda: collect(full, with_age=True))
+        steps.append(lambda: collect(full))
+        steps.append(lambda: collect(by_district))
+        steps.append(lambda: collect(list(self.partitions.values())))
+
+        rows = np.empty(0, dtype=np.intp)
+        for step in steps:
+            rows = step()
+            if len(rows) >= 10:
+                break
+        return rows
+
+
+_COMPARABLE_INDEXES = {}
+_COMPARABLE_INDEXES_LOCK = threading.Lock()
+
+
+def get_comparable_index(df):
+    """Comparable index for df, built once per DataFrame object and dropped when it is collected."""
+    key = id(df)
+
+    def forget(ref):
+        with _COMPARABLE_INDEXES_LOCK:
+            if key in _COMPARABLE_INDEXES and _COMPARABLE_INDEXES[key][0] is ref:
+                del _COMPARABLE_INDEXES[key]
+
+    with _COMPARABLE_INDEXES_LOCK:
+        entry = _COMPARABLE_INDEXES.get(key)
+        if entry is not None and entry[0]() is df:
+            return entry[1]
+        index = ComparableIndex(df)
+        _COMPARABLE_INDEXES[key] = (weakref.ref(df, forget), index)
+        return index
+
+
 def filter_nearby_transactions(df, target_house):
     """Filter transactions by recent 5 years and similar property conditions."""
     if df is None or df.empty:
@@ -280,65 +581,16 @@ def filter_nearby_transactions(df, target_house):
     area = _parse_number(target.get("建坪"))
     age = _parse_number(target.get("屋齡"))
 
-    work = df.copy()
-    work["交易日期"] = pd.to_datetime(work["交易日期"], errors="coerce")
-    cutoff = pd.Timestamp(datetime.now() - timedelta(days=365 * 5))
-    work = work[work["交易日期"] >= cutoff]
-    if work.empty:
-        return work
-
-    base = work.copy()
-    steps = []
-    mask = pd.Series(True, index=base.index)
-    if district:
-        mask &= base["行政區"].astype(str).str.contains(re.escape(district), na=False)
-    if building_type:
-        mask &= _matches_building_type(base["建物型態"], building_type)
-    if not math.isnan(area) and area > 0:
-        mask &= base["建坪"].between(area * 0.7, area * 1.3)
-    if not math.isnan(age):
-        mask &= base["屋齡"].fillna(age).between(max(age - 10, 0), age + 10)
-    steps.append(mask)
-
-    mask = pd.Series(True, index=base.index)
-    if district:
-        mask &= base["行政區"].astype(str).str.contains(re.escape(district), na=False)
-    if building_type:
-        mask &= _matches_building_type(base["建物型態"], building_type)
-    if not math.isnan(area) and area > 0:
-        mask &= base["建坪"].between(area * 0.7, area * 1.3)
-    steps.append(mask)
-
-    mask = pd.Series(True, index=base.index)
-    if district:
-        mask &= base["行政區"].astype(str).str.contains(re.escape(district), na=False)
-    if building_type:
-        mask &= _matches_building_type(base["建物型態"], building_type)
-    if not math.isnan(area) and area > 0:
-        mask &= base["建坪"].between(area * 0.5, area * 1.5)
-    steps.append(mask)
-
-    mask = pd.Series(True, index=base.index)
-    if district:
-        mask &= base["行政區"].astype(str).str.contains(re.escape(district), na=False)
-    if building_type:
-        mask &= _matches_building_type(base["建物型態"], building_type)
-    steps.append(mask)
-
-    mask = pd.Series(True, index=base.index)
-    if district:
-        mask &= base["行政區"].astype(str).str.contains(re.escape(district), na=False)
-    steps.append(mask)
-
-    steps.append(pd.Series(True, index=base.index))
-
-    selected = pd.DataFrame()
-    for mask in steps:
-        selected = base[mask].copy()
-        if len(selected) >= 10:
-            break
+    index = get_comparable_index(df)
+    cutoff = pd.Timestamp(datetime.now() - timedelta(days=365 * 5)).value
+    base = index.recent_frame(cutoff)
+    if base.empty:
+        return base.copy()
+
+    rows = index.comparable_rows(cutoff, district, building_type, area, age)
+    selected = index.work.iloc[rows].copy()
     selected = selected.sort_values("交易日期", ascending=False).reset_index(drop=True)
-    selected.attrs["recent_city_transactions"] = base.reset_index(drop=True)
+    selected.attrs["recent_city_transactions"] = base
     selected.attrs["filter_target"] = target
     return selected
 
@@ -454,15 +706,41 @@ def _build_price_distribution(tx, target_unit_price):
     return dist
 
 
-def calculate_price_metrics(transactions, target_house):
-    """Calculate price metrics for target house and comparable transactions."""
+def _district_ranking(city_tx, one_year_cutoff):
+    """City-wide district ranking by average unit price over the last year (all years if none)."""
+    date_col = "\u4ea4\u6613\u65e5\u671f"
+    unit_col = "\u55ae\u50f9(\u842c/\u576a)"
+    if city_tx is None or city_tx.empty:
+        return pd.DataFrame()
+    city_tx = city_tx.copy()
+    city_tx[date_col] = pd.to_datetime(city_tx[date_col], errors="coerce")
+    city_tx[unit_col] = pd.to_numeric(city_tx[unit_col], errors="coerce")
+    rank_base = city_tx[(city_tx[date_col] >= one_year_cutoff)].dropna(subset=["\u884c\u653f\u5340", unit_col])
+    if rank_base.empty:
+        rank_base = city_tx.dropna(subset=["\u884c\u653f\u5340", unit_col])
+    if rank_base.empty:
+        return pd.DataFrame()
+    district_rank = rank_base.groupby("\u884c\u653f\u5340", as_index=False).agg({unit_col: "mean"})
+    counts = rank_base.groupby("\u884c\u653f\u5340").size().reset_index(name="\u6210\u4ea4\u91cf")
+    district_rank = district_rank.merge(counts, on="\u884c\u653f\u5340", how="left")
+    district_rank = district_rank.rename(columns={unit_col: "\u5e73\u5747\u55ae\u50f9"}).sort_values("\u5e73\u5747\u55ae\u50f9", ascending=False).reset_index(drop=True)
+    district_rank["\u6392\u540d"] = district_rank.index + 1
+    return district_rank[["\u6392\u540d", "\u884c\u653f\u5340", "\u5e73\u5747\u55ae\u50f9", "\u6210\u4ea4\u91cf"]]
+
+
+def calculate_price_metrics(transactions, target_house, district_ranking=None):
+    """
+    Calculate price metrics for target house and comparable transactions.
+
+    district_ranking: precomputed city-wide ranking (see CityValuation); computed
+    from the transactions' recent_city_transactions when omitted.
+    """
     target = target_house or {}
     area = _parse_number(target.get("\u5efa\u576a"))
     price = _parse_number(target.get("\u7e3d\u50f9(\u842c)"))
     target_unit_price = price / area if area and not math.isnan(area) and not math.isnan(price) else math.nan
 
     tx = transactions.copy() if transactions is not None else pd.DataFrame()
-    city_tx = transactions.attrs.get("recent_city_transactions", pd.DataFrame()).copy() if transactions is not None else pd.DataFrame()
     metrics = {
         "target_unit_price": target_unit_price,
         "nearby_one_year_avg": math.nan,
@@ -561,22 +839,18 @@ def calculate_price_metrics(transactions, target_house):
     metrics["price_distribution"] = _build_price_distribution(tx, target_unit_price)
 
     target_district = str(target.get("\u884c\u653f\u5340", "")).strip()
-    if city_tx is not None and not city_tx.empty:
-        city_tx[date_col] = pd.to_datetime(city_tx[date_col], errors="coerce")
-        city_tx[unit_col] = pd.to_numeric(city_tx[unit_col], errors="coerce")
-        rank_base = city_tx[(city_tx[date_col] >= one_year_cutoff)].dropna(subset=["\u884c\u653f\u5340", unit_col])
-        if rank_base.empty:
-            rank_base = city_tx.dropna(subset=["\u884c\u653f\u5340", unit_col])
-        if not rank_base.empty:
-            district_rank = rank_base.groupby("\u884c\u653f\u5340", as_index=False).agg({unit_col: "mean"})
-            counts = rank_base.groupby("\u884c\u653f\u5340").size().reset_index(name="\u6210\u4ea4\u91cf")
-            district_rank = district_rank.merge(counts, on="\u884c\u653f\u5340", how="left")
-            district_rank = district_rank.rename(columns={unit_col: "\u5e73\u5747\u55ae\u50f9"}).sort_values("\u5e73\u5747\u55ae\u50f9", ascending=False).reset_index(drop=True)
-            district_rank["\u6392\u540d"] = district_rank.index + 1
-            metrics["district_ranking"] = district_rank[["\u6392\u540d", "\u884c\u653f\u5340", "\u5e73\u5747\u55ae\u50f9", "\u6210\u4ea4\u91cf"]].copy()
-            if target_district and target_district in district_rank["\u884c\u653f\u5340"].astype(str).tolist():
-                row = district_rank[district_rank["\u884c\u653f\u5340"].astype(str) == target_district].iloc[0]
-                metrics["district_rank_text"] = f"{target_district} \u8fd1\u4e00\u5e74\u5747\u50f9 {row['\u5e73\u5747\u55ae\u50f9']:.2f} \u842c/\u576a\uff0c\u53f0\u4e2d\u5e02\u6392\u540d\u7b2c {int(row['\u6392\u540d'])}/{len(district_rank)}"
+    if district_ranking is None:
+        city_tx = transactions.attrs.get("recent_city_transactions", pd.DataFrame())
+        district_ranking = _district_ranking(city_tx, one_year_cutoff)
+    if not district_ranking.empty:
+        district_rank = district_ranking
+        metrics["district_ranking"] = district_rank.copy()
+        if target_district and target_district in district_rank["\u884c\u653f\u5340"].astype(str).tolist():
+            row = district_rank[district_rank["\u884c\u653f\u5340"].astype(str) == target_district].iloc[0]
+            # Cube rankings cover whole quarters and name them; otherwise the window is the last 365 days.
+            period = district_rank.attrs.get("period")
+            period_label = f"{period} " if period else "\u8fd1\u4e00\u5e74"
+            metrics["district_rank_text"] = f"{target_district} {period_label}\u5747\u50f9 {row['\u5e73\u5747\u55ae\u50f9']:.2f} \u842c/\u576a\uff0c\u53f0\u4e2d\u5e02\u6392\u540d\u7b2c {int(row['\u6392\u540d'])}/{len(district_rank)}"
 
     display_cols = [date_col, "\u884c\u653f\u5340", "\u5efa\u7269\u578b\u614b", "\u5730\u5740", "\u5efa\u576a", "\u5c4b\u9f61", "\u7e3d\u50f9(\u842c)", unit_col]
     available = [c for c in display_cols if c in tx.columns]
@@ -599,6 +873,85 @@ def calculate_price_metrics(transactions, target_house):
     return metrics
 
 
+class CityValuation:
+    """
+    Value several houses against one city's transactions.
+
+    The comparable index, the recent-5-years frame and the city-wide district
+    ranking are built once and shared, so each extra house only costs its own
+    comparable lookup and metrics.
+
+    With a rollup cube (get_real_price_cube), the district ranking and the
+    district-level trend / market heat are read from the cube's groups instead
+    of the transactions; its periods are whole quarters.
+    """
+
+    def __init__(self, df, cube=None):
+        self.df = df
+        self.cube = cube if cube is not None and not cube.empty else None
+        self._ranking = None
+        self._lock = threading.Lock()
+
+    @property
+    def empty(self):
+        return self.df is None or self.df.empty
+
+    def district_ranking(self):
+        with self._lock:
+            if self._ranking is None and self.cube is not None:
+                now = pd.Timestamp(datetime.now())
+                self._ranking = self.cube.district_ranking(now - timedelta(days=365), since=now - timedelta(days=365 * 5))
+            elif self._ranking is None:
+                index = get_comparable_index(self.df)
+                now = datetime.now()
+                recent = index.recent_frame(pd.Timestamp(now - timedelta(days=365 * 5)).value)
+                self._ranking = _district_ranking(recent, pd.Timestamp(now) - timedelta(days=365))
+            return self._ranking
+
+    def evaluate(self, target_house):
+        """
+        Price metrics for one target house.
+
+        Without a cube this is the same as
+        calculate_price_metrics(filter_nearby_transactions(df, target), target).
+        With a cube, the district ranking covers whole quarters, so districts with
+        close averages can swap ranks and district_rank_text names the quarters.
+        The result also gets the district_trend and district_market_heat_label /
+        district_market_heat_detail keys (see district_market).
+        """
+        transactions = filter_nearby_transactions(self.df, target_house)
+        ranking = self.district_ranking() if not transactions.empty else None
+        if ranking is not None:
+            # pandas deep-copies attrs on every copy/sort; the shared city frame is
+            # only needed for the ranking, which is already computed.
+            transactions.attrs.pop("recent_city_transactions", None)
+        metrics = calculate_price_metrics(transactions, target_house, district_ranking=ranking)
+        if self.cube is not None:
+            metrics.update(self.district_market(target_house))
+        return metrics
+
+    def district_market(self, target_house):
+        """Trend and volume of the target's whole district and building type, served from the cube."""
+        target = target_house or {}
+        district = str(target.get("\u884c\u653f\u5340", "")).strip()
+        token = _building_type_token(target.get("\u985e\u578b", target.get("\u5efa\u7269\u578b\u614b", "")))
+        trend = self.cube.trend(district, token, since=pd.Timestamp(datetime.now()) - timedelta(days=365 * 5))
+        heat = self.cube.market_heat(district, token)
+        scope = " ".join(part for part in (district, token) if part) or "\u5168\u5e02"
+        change_text = _fmt_metric(heat["change_pct"], "%") if not math.isnan(heat["change_pct"]) else "\u7121\u524d\u671f\u8cc7\u6599"
+        return {
+            "district_trend": trend.rename(columns={"\u671f\u9593": "\u5e74\u4efd"}),
+            "district_market_heat_label": heat["label"],
+            "district_market_heat_detail": f"{scope} {heat['period']} {heat['recent']} \u7b46\uff0c\u524d\u56db\u5b63 {heat['previous']} \u7b46\uff0c\u91cf\u8b8a\u5316 {change_text}",
+        }
+
+
+def evaluate_houses(city, targets):
+    """Price metrics for several target houses in one city, loading the city's data once."""
+    valuation = CityValuation(load_cached_real_price_data(city), get_real_price_cube(city))
+    return [valuation.evaluate(target) for target in targets]
+
+
 
 
 
@@ -762,6 +1115,11 @@ def render_real_price_analysis(metrics):
             st.line_chart(yearly.set_index("\u5e74\u4efd"))
         else:
             st.info("\u8fd1 5 \u5e74\u8da8\u52e2\u8cc7\u6599\u4e0d\u8db3")
+        district_trend = metrics.get("district_trend")
+        if isinstance(district_trend, pd.DataFrame) and not district_trend.empty:
+            st.markdown("#### \u540c\u5340\u540c\u985e\u578b\u6574\u9ad4\u884c\u60c5")
+            st.caption(f"\u4ea4\u6613\u71b1\u5ea6\uff1a{metrics.get('district_market_heat_label', '\u7121\u8cc7\u6599')}\uff08{metrics.get('district_market_heat_detail', '')}\uff09")
+            st.line_chart(district_trend.set_index("\u5e74\u4efd")[["\u5e73\u5747\u55ae\u50f9", "\u4e2d\u4f4d\u6578\u55ae\u50f9"]])
 
     with tabs[3]:
         dist = metrics.get("price_distribution")
@@ -0,0 +1,258 @@
+# components/real_price_cube.py
+# 實價登錄彙總立方體：依（行政區, 建物型態, 季度）預先彙總單價的筆數、總和、平方和與分位數草圖，
+# 每個來源 CSV 各自彙總一次，新增 / 更新季度檔時只重算那個檔案；趨勢、熱度與行政區排名只需掃描各組彙總
+import math
+import threading
+
+import numpy as np
+import pandas as pd
+
+
+KEY_COLUMNS = ["行政區", "建物型態", "季度"]
+UNIT_COLUMN = "單價(萬/坪)"
+
+# 分位數草圖：單價依對數分桶，相鄰桶界相差 SKETCH_GAMMA 倍，估計值的相對誤差約 1%
+SKETCH_GAMMA = 1.02
+SKETCH_MIN = 0.1
+SKETCH_MAX = 1000.0
+SKETCH_BUCKETS = int(math.ceil(math.log(SKETCH_MAX / SKETCH_MIN) / math.log(SKETCH_GAMMA))) + 1
+
+# 行政區 × 建物型態的量能熱度：資料中最近四季的成交量較再前四季增減超過此比例時為升溫 / 降溫
+HEAT_CHANGE_PCT = 10
+HEAT_QUARTERS = 4
+
+
+def _bucket_of(values):
+    ratio = np.clip(values, SKETCH_MIN, SKETCH_MAX) / SKETCH_MIN
+    return np.clip(np.ceil(np.log(ratio) / math.log(SKETCH_GAMMA)), 0, SKETCH_BUCKETS - 1).astype(np.int64)
+
+
+def _bucket_value(bucket):
+    # 桶 (下界, 上界] 的代表值，使上下界的相對誤差相同
+    return SKETCH_MIN * SKETCH_GAMMA ** bucket * 2 / (SKETCH_GAMMA + 1)
+
+
+def sketch_quantile(sketch, q):
+    """由草圖（各桶筆數）估計分位數；沒有資料時為 NaN"""
+    total = sketch.sum()
+    if total <= 0:
+        return math.nan
+    bucket = int(np.searchsorted(np.cumsum(sketch), q * (total - 1), side="right"))
+    return float(_bucket_value(min(bucket, SKETCH_BUCKETS - 1)))
+
+
+class CellTable:
+    """
+    一批交易依（行政區, 建物型態, 季度）彙總後的結果：
+    keys 為各組的鍵（DataFrame），count / total / total_sq 為單價的筆數、總和、平方和，
+    sketch 為各組的分位數草圖（組數 × SKETCH_BUCKETS 的筆數矩陣）。
+    """
+
+    def __init__(self, keys, count, total, total_sq, sketch):
+        self.keys = keys.reset_index(drop=True)
+        self.count = count
+        self.total = total
+        self.total_sq = total_sq
+        self.sketch = sketch
+
+    def __len__(self):
+        return len(self.keys)
+
+    @classmethod
+    def empty(cls):
+        return cls(pd.DataFrame(columns=KEY_COLUMNS), np.zeros(0, dtype=np.int64), np.zeros(0), np.zeros(0),
+                   np.zeros((0, SKETCH_BUCKETS), dtype=np.int64))
+
+    @classmethod
+    def from_transactions(cls, frame):
+        """由正規化後的交易（交易日期、行政區、建物型態、單價）彙總；單價或日期缺漏的列不計"""
+        if frame is None or frame.empty:
+            return cls.empty()
+        dates = pd.to_datetime(frame["交易日期"], errors="coerce")
+        prices = pd.to_numeric(frame[UNIT_COLUMN], errors="coerce")
+        valid = (dates.notna() & prices.notna()).to_numpy()
+        if not valid.any():
+            return cls.empty()
+        keys = pd.DataFrame({
+            "行政區": frame["行政區"].astype(str).to_numpy()[valid],
+            "建物型態": frame["建物型態"].astype(str).to_numpy()[valid],
+            "季度": dates[valid].dt.to_period("Q").astype(str).to_numpy(),
+        })
+        prices = prices.to_numpy(dtype=float)[valid]
+        return cls._group(keys, np.ones(len(keys), dtype=np.int64), prices, prices * prices,
+                          sketch_rows=_bucket_of(prices))
+
+    @classmethod
+    def _group(cls, keys, count, total, total_sq, sketch=None, sketch_rows=None):
+        """依鍵相加；sketch_rows（每筆交易的桶號）與 sketch（既有草圖）擇一"""
+        codes = keys.groupby(KEY_COLUMNS, sort=True).ngroup().to_numpy()
+        groups = int(codes.max()) + 1 if len(codes) else 0
+        first = np.unique(codes, return_index=True)[1]
+        if sketch_rows is not None:
+            grouped_sketch = np.bincount(codes * SKETCH_BUCKETS + sketch_rows, minlength=groups * SKETCH_BUCKETS)
+            grouped_sketch = grouped_sketch.reshape(groups, SKETCH_BUCKETS)
+        else:
+            grouped_sketch = np.zeros((groups, SKETCH_BUCKETS), dtype=np.int64)
+            np.add.at(grouped_sketch, codes, sketch)
+        return cls(
+            keys.iloc[first],
+            np.bincount(codes, weights=count, minlength=groups).astype(np.int64),
+            np.bincount(codes, weights=total, minlength=groups),
+            np.bincount(codes, weights=total_sq, minlength=groups),
+            grouped_sketch,
+        )
+
+    @classmethod
+    def combine(cls, tables):
+        """合併多個彙總表（例如各季度檔），同一組的統計量直接相加"""
+        tables = [t for t in tables if len(t)]
+        if not tables:
+            return cls.empty()
+        if len(tables) == 1:
+            return tables[0]
+        return cls._group(
+            pd.concat([t.keys for t in tables], ignore_index=True),
+            np.concatenate([t.count for t in tables]),
+            np.concatenate([t.total for t in tables]),
+            np.concatenate([t.total_sq for t in tables]),
+            sketch=np.concatenate([t.sketch for t in tables]),
+        )
+
+
+def _summarize(table, mask, labels, name):
+    """mask 選出的各組依 labels（與選出的組對齊）再彙總：成交量、平均、標準差與中位數"""
+    if not mask.any():
+        return pd.DataFrame(columns=[name, "成交量", "平均單價", "標準差", "中位數單價"])
+    codes, labels = pd.factorize(np.asarray(labels), sort=True)
+    count = np.bincount(codes, weights=table.count[mask], minlength=len(labels))
+    total = np.bincount(codes, weights=table.total[mask], minlength=len(labels))
+    total_sq = np.bincount(codes, weights=table.total_sq[mask], minlength=len(labels))
+    sketch = np.zeros((len(labels), SKETCH_BUCKETS), dtype=np.int64)
+    np.add.at(sketch, codes, table.sketch[mask])
+
+    mean = total / count
+    variance = np.where(count > 1, (total_sq - count * mean ** 2) / np.maximum(count - 1, 1), np.nan)
+    return pd.DataFrame({
+        name: labels,
+        "成交量": count.astype(np.int64),
+        "平均單價": mean,
+        "標準差": np.sqrt(np.maximum(variance, 0)),
+        "中位數單價": [sketch_quantile(row, 0.5) for row in sketch],
+    })
+
+
+def _quarter_of(timestamp):
+    """timestamp 所在的季度，例如 "2024Q3"（季度字串可直接比大小）"""
+    return str(pd.Timestamp(timestamp).to_period("Q"))
+
+
+class RealPriceCube:
+    """
+    單一縣市的實價登錄彙總立方體。
+
+    每個來源檔保留一份 CellTable；refresh 時只重新彙總新增或變更的檔案，
+    再把各檔的彙總表相加（只看組數，不看交易筆數）。查詢都在合併後的彙總表上進行。
+    期間以季度為單位：「近一年」是與近 365 天重疊的季度。
+    """
+
+    def __init__(self):
+        self._partials = {}
+        self.table = CellTable.empty()
+        self._lock = threading.Lock()
+        self.rebuilt_files = 0
+
+    def refresh(self, sources):
+        """
+        sources 為 [(名稱, 簽章, 讀取函式)]；簽章沒變的檔案沿用既有彙總，
+        讀取函式回傳該檔正規化後的交易。回傳本次重新彙總的檔案數。
+        """
+        with self._lock:
+            names = {name for name, _, _ in sources}
+            changed = [(name, signature, loader) for name, signature, loader in sources
+                       if name not in self._partials or self._partials[name][0] != signature]
+            removed = [name for name in self._partials if name not in names]
+            if not changed and not removed:
+                return 0
+            for name in removed:
+                del self._partials[name]
+            for name, signature, loader in changed:
+                self._partials[name] = (signature, CellTable.from_transactions(loader()))
+            self.table = CellTable.combine([self._partials[name][1] for name in sorted(self._partials)])
+            self.rebuilt_files += len(changed)
+            return len(changed)
+
+    @property
+    def empty(self):
+        return len(self.table) == 0
+
+    def _mask(self, district="", type_token="", since=None, until=None):
+        keys = self.table.keys
+        mask = np.ones(len(keys), dtype=bool)
+        if district:
+            mask &= keys["行政區"].str.contains(district, regex=False).to_numpy()
+        if type_token:
+            mask &= keys["建物型態"].str.contains(type_token, regex=False).to_numpy()
+        if since is not None:
+            mask &= (keys["季度"] >= since).to_numpy()
+        if until is not None:
+            mask &= (keys["季度"] < until).to_numpy()
+        return mask
+
+    def district_ranking(self, one_year_cutoff, since=None):
+        """
+        全市各行政區平均單價排名，欄位同 _district_ranking。
+        期間為與 one_year_cutoff 之後重疊的季度（最多約 15 個月）；這段期間沒有成交時改用
+        since（預設全部期間）以來的季度。實際涵蓋的季度記在 attrs["period"]，例如 "2024Q4–2025Q3"。
+        """
+        columns = ["排名", "行政區", "平均單價", "成交量"]
+        districts = self.table.keys["行政區"].to_numpy()
+        mask = self._mask(since=_quarter_of(one_year_cutoff))
+        summary = _summarize(self.table, mask, districts[mask], "行政區")
+        if summary.empty:
+            mask = self._mask(since=_quarter_of(since) if since is not None else None)
+            summary = _summarize(self.table, mask, districts[mask], "行政區")
+        if summary.empty:
+            return pd.DataFrame(columns=columns)
+        ranking = summary.sort_values("平均單價", ascending=False, kind="stable").reset_index(drop=True)
+        ranking["排名"] = ranking.index + 1
+        ranking = ranking[columns]
+        quarters = self.table.keys["季度"][mask]
+        ranking.attrs["period"] = f"{quarters.min()}–{quarters.max()}"
+        return ranking
+
+    def trend(self, district="", type_token="", since=None, freq="year"):
+        """行政區 × 建物型態每年（freq="quarter" 時每季）的成交量、平均與中位數單價"""
+        mask = self._mask(district, type_token, since=_quarter_of(since) if since is not None else None)
+        quarters = self.table.keys["季度"][mask]
+        labels = quarters.to_numpy() if freq == "quarter" else quarters.str[:4].astype(int).to_numpy()
+        return _summarize(self.table, mask, labels, "期間")
+
+    def market_heat(self, district="", type_token=""):
+        """
+        資料中最近 HEAT_QUARTERS 季與再前 HEAT_QUARTERS 季的成交量比較
+        （實價登錄有揭露時差，以資料最新一季為準而不是今天）。
+        回傳 dict：label（升溫 / 持平 / 降溫 / 無資料）、period、recent、previous、change_pct。
+        """
+        result = {"label": "無資料", "period": "", "recent": 0, "previous": 0, "change_pct": math.nan}
+        if self.empty:
+            return result
+        latest = pd.Period(self.table.keys["季度"].max(), freq="Q")
+        start, previous_start = latest - (HEAT_QUARTERS - 1), latest - (2 * HEAT_QUARTERS - 1)
+        recent = int(self.table.count[self._mask(district, type_token, since=str(start))].sum())
+        previous = int(self.table.count[self._mask(district, type_token, since=str(previous_start),
+                                                   until=str(start))].sum())
+        change = (recent - previous) / previous * 100 if previous else math.nan
+        if math.isnan(change):
+            label = "無資料" if not recent else "持平"
+        elif change >= HEAT_CHANGE_PCT:
+            label = "升溫"
+        elif change <= -HEAT_CHANGE_PCT:
+            label = "降溫"
+        else:
+            label = "持平"
+        result.update(label=label, period=f"{start}–{latest}", recent=recent, previous=previous, change_pct=change)
+        return result
+
+    def stats(self):
+        return {"files": len(self._partials), "cells": len(self.table), "transactions": int(self.table.count.sum()),
+                "rebuilt_files": self.rebuilt_files}
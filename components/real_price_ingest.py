@@ -0,0 +1,240 @@
+# components/real_price_ingest.py
+# 實價登錄原始檔匯入：內政部的季度 CSV 或全國 zip（lvr_landcsv.zip）逐塊串流讀取、正規化，
+# 依縣市 / 成交季度寫成分區 CSV，記憶體只跟區塊大小有關，並回報每秒處理的筆數
+import json
+import os
+import re
+import sys
+import time
+import zipfile
+from pathlib import Path
+
+from components.columnar_cache import file_sha1
+from components.real_price import (
+    CITY_FILE_CODES,
+    CITY_FOLDER_MAP,
+    REAL_PRICE_DATA_DIR,
+    _prepare_real_price_df,
+    normalize_city_name,
+    read_real_price_csv,
+)
+from config import SINYI_CITIES
+
+
+CHUNK_ROWS = 50_000
+
+# 分區根目錄：<根目錄>/<縣市資料夾>/<成交季度>/<來源>.csv；
+# 每個來源在 <縣市資料夾>/_sources/<來源>.json 記錄原始檔的 sha1 與寫出的分區
+INGEST_DATA_DIR = REAL_PRICE_DATA_DIR / "partitions"
+SOURCES_DIR = "_sources"
+
+# 路徑中的發布季別，例如 .../114S3/lvr_landcsv.zip → 114S3
+SEASON_RE = re.compile(r"(1\d{2}S[1-4])", re.IGNORECASE)
+
+# 全國壓縮檔中不動產買賣的主表，例如 b_lvr_land_a.csv（b = 臺中市）；
+# _build / _land / _park 明細表與預售屋、租賃（_b / _c）不匯入
+MEMBER_RE = re.compile(r"(?:^|/)([a-z])_lvr_land_a\.csv$", re.IGNORECASE)
+
+CITY_BY_CODE = {code: normalize_city_name(city) for city, code in CITY_FILE_CODES.items()}
+
+
+def city_folder(city):
+    """分區使用的縣市資料夾：已有實價登錄資料夾的沿用（例如 taichung），其餘用信義城市代碼"""
+    city = normalize_city_name(city)
+    if city in CITY_FOLDER_MAP:
+        return CITY_FOLDER_MAP[city]
+    slug = SINYI_CITIES.get(city.replace("臺", "台"))
+    return slug.lower() if slug else city
+
+
+def source_name(path, sha1, source=None):
+    """
+    分區檔使用的來源名稱：指定的 source，否則路徑中的發布季別（例如 114S3），
+    都沒有時為「檔名-sha1 前 8 碼」。內政部每季的檔名都一樣（lvr_landcsv.zip、b_lvr_land_a.csv），
+    不能只用檔名，否則新一季會蓋掉舊一季的分區。
+    """
+    if not source:
+        season = SEASON_RE.findall(str(Path(path).resolve()))
+        source = season[-1].upper() if season else f"{Path(path).stem}-{sha1[:8]}"
+    return re.sub(r"[^\w.-]", "_", str(source))
+
+
+def iter_sources(paths, city=None, source=None):
+    """
+    CSV / zip 路徑 → [(來源名稱, 縣市, 開啟函式, 原始檔 sha1)]。
+    zip 內依檔名代碼判斷縣市；單一 CSV 依檔名代碼，或由 city 指定。source 只能搭配單一路徑。
+    """
+    paths = [Path(path) for path in paths]
+    if source and len(paths) > 1:
+        raise ValueError("指定來源名稱時一次只能匯入一個檔案")
+    sources = []
+    for path in paths:
+        sha1 = file_sha1(path)
+        name = source_name(path, sha1, source)
+        if zipfile.is_zipfile(path):
+            with zipfile.ZipFile(path) as archive:
+                members = [member for member in archive.namelist() if MEMBER_RE.search(member)]
+            for member in sorted(members):
+                code = MEMBER_RE.search(member).group(1).lower()
+                if code in CITY_BY_CODE:
+                    sources.append((name, CITY_BY_CODE[code],
+                                    lambda path=path, member=member: _open_member(path, member), sha1))
+            continue
+        match = MEMBER_RE.search(path.name)
+        source_city = city or (CITY_BY_CODE.get(match.group(1).lower()) if match else None)
+        if not source_city:
+            raise ValueError(f"無法由檔名判斷縣市，請指定縣市：{path}")
+        sources.append((name, normalize_city_name(source_city), lambda path=path: open(path, "rb"), sha1))
+    return sources
+
+
+def _open_member(path, member):
+    # 關閉 ZipFile 後，已開啟的成員串流仍可讀到串流自己關閉為止
+    with zipfile.ZipFile(path) as archive:
+        return archive.open(member)
+
+
+class PartitionWriter:
+    """
+    正規化後的交易依成交季度附加到 <根目錄>/<縣市資料夾>/<季度>/<來源>.csv。
+
+    每個（縣市, 來源）先以 check 檢查：同名來源已由內容不同的原始檔寫過時拒絕（replace 時允許），
+    同一次匯入中兩個不同的原始檔用了同一個名稱也拒絕。begin 刪掉這個來源既有的所有分區，
+    重新匯入不會重複，新資料沒有的季度也不會留下舊檔；寫完後以 finish 記錄分區清單。
+    """
+
+    def __init__(self, out_dir=INGEST_DATA_DIR, replace=False):
+        self.out_dir = Path(out_dir)
+        self.replace = replace
+        self.written = {}
+        self._claimed = {}
+
+    def _manifest_path(self, city, source):
+        return self.out_dir / city_folder(city) / SOURCES_DIR / f"{source}.json"
+
+    def _write_manifest(self, city, source, manifest):
+        path = self._manifest_path(city, source)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        tmp_path.write_text(json.dumps(manifest, ensure_ascii=False, indent=2), encoding="utf-8")
+        os.replace(tmp_path, path)
+
+    def _existing(self, city, source):
+        return sorted((self.out_dir / city_folder(city)).glob(f"*/{source}.csv"))
+
+    def check(self, city, source, sha1):
+        claimed = self._claimed.setdefault((city_folder(city), source), sha1)
+        if claimed != sha1:
+            raise ValueError(f"{city}：兩個不同的原始檔都使用來源名稱 {source}，請分別指定來源名稱")
+        if self.replace:
+            return
+        manifest_path = self._manifest_path(city, source)
+        manifest = json.loads(manifest_path.read_text(encoding="utf-8")) if manifest_path.exists() else {}
+        if (manifest or self._existing(city, source)) and manifest.get("sha1") != sha1:
+            raise ValueError(
+                f"{city} 的來源 {source} 已由另一個原始檔（sha1 {manifest.get('sha1', '未知')}）寫過分區，"
+                f"不覆寫；請指定其他來源名稱，或確認要取代時使用 replace"
+            )
+
+    def begin(self, city, source, sha1):
+        for path in self._existing(city, source):
+            path.unlink()
+        # 先記下 sha1（未完成），中途失敗時用同一個檔案重跑即可
+        self._write_manifest(city, source, {"source": source, "sha1": sha1, "complete": False})
+
+    def finish(self, city, source, sha1, rows):
+        folder = self.out_dir / city_folder(city)
+        partitions = sorted(str(path.relative_to(folder)) for path in self.written
+                            if path.name == f"{source}.csv" and folder in path.parents)
+        self._write_manifest(city, source, {"source": source, "sha1": sha1, "complete": True,
+                                            "rows": rows, "partitions": partitions})
+
+    def write(self, frame, city, source):
+        if frame.empty:
+            return
+        quarters = frame["交易日期"].dt.to_period("Q").astype(str)
+        for quarter, part in frame.groupby(quarters, sort=True):
+            path = self.out_dir / city_folder(city) / quarter / f"{source}.csv"
+            first = path not in self.written
+            if first:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                part.to_csv(path, index=False, encoding="utf-8-sig")
+            else:
+                part.to_csv(path, mode="a", header=False, index=False, encoding="utf-8")
+            self.written[path] = self.written.get(path, 0) + len(part)
+
+
+def ingest(paths, out_dir=INGEST_DATA_DIR, city=None, chunksize=CHUNK_ROWS, progress=None,
+           source=None, replace=False):
+    """
+    匯入 paths（CSV 或 zip）中的所有不動產買賣交易，回傳統計 dict：
+    rows（讀到的原始列數）、kept（正規化後寫出的筆數）、seconds、rows_per_sec、partitions、sources。
+    progress(source, city, rows, rows_per_sec) 每處理完一個區塊呼叫一次。
+    source 指定來源名稱（預設見 source_name）；replace 時允許覆寫同名但內容不同的來源。
+    """
+    writer = PartitionWriter(out_dir, replace=replace)
+    started = time.perf_counter()
+    totals = {"rows": 0, "kept": 0, "sources": []}
+
+    sources = iter_sources(paths, city, source)
+    # 全部先檢查再開始寫，有衝突時不會只匯入一半
+    for name, source_city, _, sha1 in sources:
+        writer.check(source_city, name, sha1)
+
+    for source, source_city, opener, sha1 in sources:
+        writer.begin(source_city, source, sha1)
+        source_started = time.perf_counter()
+        rows = kept = 0
+        for chunk in read_real_price_csv(opener, chunksize=chunksize):
+            rows += len(chunk)
+            normalized = _prepare_real_price_df(chunk, source_city)
+            kept += len(normalized)
+            writer.write(normalized, source_city, source)
+            if progress:
+                progress(source, source_city, rows, rows / max(time.perf_counter() - source_started, 1e-9))
+        writer.finish(source_city, source, sha1, kept)
+        seconds = time.perf_counter() - source_started
+        totals["sources"].append({"source": source, "city": source_city, "rows": rows, "kept": kept,
+                                  "seconds": seconds, "rows_per_sec": rows / max(seconds, 1e-9)})
+        totals["rows"] += rows
+        totals["kept"] += kept
+
+    totals["seconds"] = time.perf_counter() - started
+    totals["rows_per_sec"] = totals["rows"] / max(totals["seconds"], 1e-9)
+    totals["partitions"] = len(writer.written)
+    return totals
+
+
+if __name__ == "__main__":
+    # 在專案根目錄執行：
+    #   python -m components.real_price_ingest <CSV 或 zip>... [--out 分區根目錄] [--city 縣市]
+    #       [--source 來源名稱（例如 114S3）] [--replace]
+    args = sys.argv[1:]
+    options = {}
+    for flag in ("--out", "--city", "--source"):
+        if flag in args:
+            i = args.index(flag)
+            options[flag] = args[i + 1]
+            del args[i:i + 2]
+    replace = "--replace" in args
+    args = [arg for arg in args if arg != "--replace"]
+    if not args:
+        print("用法：python -m components.real_price_ingest <CSV 或 zip>... [--out 分區根目錄] [--city 縣市] "
+              "[--source 來源名稱] [--replace]")
+        sys.exit(1)
+
+    def report(source, source_city, rows, rate):
+        print(f"\r{source} {source_city}：{rows:,} 列（{rate:,.0f} 列/秒）", end="", flush=True)
+
+    try:
+        result = ingest(args, out_dir=options.get("--out", INGEST_DATA_DIR), city=options.get("--city"),
+                        progress=report, source=options.get("--source"), replace=replace)
+    except ValueError as e:
+        print(e)
+        sys.exit(1)
+    print()
+    for item in result["sources"]:
+        print(f"{item['source']} {item['city']}：{item['rows']:,} 列 → {item['kept']:,} 筆，"
+              f"{item['seconds']:.1f} 秒（{item['rows_per_sec']:,.0f} 列/秒）")
+    print(f"合計 {result['rows']:,} 列 → {result['kept']:,} 筆，{result['partitions']} 個分區，"
+          f"{result['seconds']:.1f} 秒（{result['rows_per_sec']:,.0f} 列/秒）")
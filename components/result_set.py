@@ -0,0 +1,69 @@
+# components/result_set.py
+# 搜尋結果集：只存資料表參照與列編號，各排序方式的順序第一次用到時計算並記住，
+# 換頁時只取出當頁的列，不必每次 rerun 都複製、去重、重新排序整份結果
+import threading
+
+import numpy as np
+
+
+class ResultSet:
+    """
+    frame 的一部分列（rows 為位置，預設全部）；unique_by 指定欄位時只保留每個值第一次出現的列。
+
+    排序結果與 frame.iloc[rows].sort_values(column, ascending=..., na_position='last') 相同。
+    """
+
+    def __init__(self, frame, rows=None, unique_by=None):
+        self.frame = frame
+        rows = np.arange(len(frame)) if rows is None else np.asarray(rows, dtype=np.intp)
+        if unique_by is not None and unique_by in frame.columns:
+            rows = rows[~frame[unique_by].iloc[rows].duplicated(keep='first').to_numpy()]
+        self.rows = rows
+        self._orders = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.rows)
+
+    @property
+    def empty(self):
+        return len(self.rows) == 0
+
+    def order(self, column=None, ascending=True):
+        """依 column 排序後的列編號；沒有指定或沒有這個欄位時為原本順序"""
+        if column is None or column not in self.frame.columns:
+            return self.rows
+        key = (column, ascending)
+        with self._lock:
+            order = self._orders.get(key)
+        if order is None:
+            values = self.frame[column].iloc[self.rows].reset_index(drop=True)
+            permutation = values.sort_values(ascending=ascending, na_position='last').index.to_numpy()
+            order = self.rows[permutation]
+            with self._lock:
+                self._orders[key] = order
+        return order
+
+    def page(self, page, per_page=10, sort=None):
+        """
+        取出第 page 頁（超出範圍時夾在 1 ~ 總頁數），回傳 (當頁資料, 頁碼, 總頁數, 總筆數)。
+        sort 為 (欄位, 是否遞增) 或 None。
+        """
+        order = self.order(*sort) if sort else self.rows
+        total_items = len(order)
+        total_pages = (total_items + per_page - 1) // per_page
+        page = max(1, min(page, total_pages))
+        start = (page - 1) * per_page
+        return self.frame.iloc[order[start:start + per_page]], page, total_pages, total_items
+
+    def to_frame(self, sort=None):
+        """整份結果（依 sort 排序）取出成 DataFrame"""
+        order = self.order(*sort) if sort else self.rows
+        return self.frame.iloc[order]
+
+
+def reuse_result_set(previous, frame, unique_by=None):
+    """frame 還是同一個物件時沿用上次的結果集（連同已算好的排序），否則重建"""
+    if isinstance(previous, ResultSet) and previous.frame is frame:
+        return previous
+    return ResultSet(frame, unique_by=unique_by)
@@ -1,33 +1,42 @@
 import os
-import re
-import pandas as pd
 import streamlit as st
+from config import TAICHUNG_DISTRICTS
 from utils import get_city_options, filter_properties
+from components.listing_store import load_listing_store
+
+
+def district_options_for(file_name):
+    """所選城市房源實際出現的行政區（台中依 TAICHUNG_DISTRICTS 的順序，其餘依名稱排序）"""
+    if not file_name:
+        return ["不限"]
+    try:
+        districts = set(load_listing_store(file_name).search_frame()['行政區'].dropna())
+    except Exception:
+        return ["不限"]
+    districts.discard("")
+    ordered = [d for d in TAICHUNG_DISTRICTS if d in districts]
+    ordered += sorted(districts - set(ordered))
+    return ["不限"] + ordered
+
 
 def render_search_form():
-    with st.form("property_requirements"):
-        st.subheader("📍 房產篩選條件")
+    st.subheader("📍 房產篩選條件")
 
+    # 城市放在表單外：切換城市時立即重新整理，行政區選單才會跟著換成該城市的行政區
+    options = get_city_options()
+    selected_label = st.selectbox("🏙️ 請選擇城市", list(options.keys()), key="search_city")
+    district_options = district_options_for(options.get(selected_label))
+
+    with st.form("property_requirements"):
         housetype = [
             "不限", "大樓", "華廈", "公寓", "套房", "透天", "別墅"
         ]
 
-        options = get_city_options()
         col1, col2 = st.columns([1, 1])
 
         with col1:
-            selected_label = st.selectbox("🏙️ 請選擇城市", list(options.keys()))
             housetype_change = st.selectbox("🏠 房產類別", housetype)
 
-        district_options = [
-            "不限", "中區", "東區", "西區", "南區", "北區",
-            "西屯區", "南屯區", "北屯區", "豐原區", "大里區",
-            "太平區", "清水區", "沙鹿區", "大甲區", "東勢區",
-            "梧棲區", "烏日區", "神岡區", "大肚區", "大雅區",
-            "后里區", "霧峰區", "潭子區", "龍井區", "外埔區",
-            "和平區", "石岡區", "大安區", "新社區"
-        ]
-
         with col2:
             selected_district = st.selectbox("📍 行政區", district_options)
 
@@ -70,18 +79,6 @@ def render_search_form():
     return None
 
 
-def parse_district(address):
-    if not isinstance(address, str):
-        return None
-    match = re.search(r'(?<=[省市])(.+?[區鄉鎮市])', address)
-    if match:
-        return match.group(1)
-    match = re.search(r'(.+?[區鄉鎮市])', address)
-    if match:
-        return match.group(1)
-    return None
-
-
 def handle_search_submit(
     selected_label, options, housetype_change,
     budget_min, budget_max, age_label, area_min, car_grip,
@@ -106,32 +103,8 @@ def handle_search_submit(
     file_path = os.path.join("./Data", options[selected_label])
 
     try:
-        df = pd.read_csv(file_path)
-
-        if '地址' in df.columns:
-            df['行政區'] = df['地址'].apply(parse_district)
-
-        if '屋齡' in df.columns:
-            df['屋齡'] = (
-                df['屋齡']
-                .astype(str)
-                .str.replace('年', '', regex=False)
-                .replace('預售', '0')
-            )
-            df['屋齡'] = pd.to_numeric(df['屋齡'], errors='coerce').fillna(0)
-
-        def parse_layout(layout):
-            if not isinstance(layout, str):
-                return pd.Series([None, None, None])
-            m = re.match(r'(\d+)房(\d+)廳(\d+)衛', layout)
-            if m:
-                return pd.Series(map(int, m.groups()))
-            nums = re.findall(r'\d+', layout)
-            nums += [None] * (3 - len(nums))
-            return pd.Series(nums[:3])
-
-        if '格局' in df.columns:
-            df[['房間數', '廳數', '衛數']] = df['格局'].apply(parse_layout)
+        # 共用房源資料：行政區、數值屋齡與房/廳/衛數已預先解析
+        df = load_listing_store(options[selected_label]).search_frame()
 
         filters = {
             'district': selected_district,
@@ -152,6 +125,7 @@ def handle_search_submit(
         st.session_state.filtered_df = filtered_df
         st.session_state.search_params = {
             'city': selected_label,
+            'file': options[selected_label],
             'district': selected_district,
             'original_count': len(df),
             'filtered_count': len(filtered_df)
@@ -0,0 +1,123 @@
+# components/similarity.py
+# AI 對話搜尋的相似度：行政區、預算、格局、樓層、建坪、屋齡各自整欄算出分數，
+# 只平均有設定的條件；結果與逐列計算的整數分數完全相同
+import numpy as np
+import pandas as pd
+
+
+SIMILARITY_THRESHOLD = 70
+
+LAYOUT_DIMENSIONS = [('房間數', 'rooms'), ('廳數', 'living_rooms'), ('衛數', 'bathrooms')]
+
+
+def _column(frame, rows, column, as_int=False):
+    """取出 rows 的數值欄位，空值（或沒有這個欄位）當成 0；as_int 時向零取整"""
+    if column not in frame.columns:
+        return np.zeros(len(rows))
+    values = frame[column].to_numpy(dtype=float, na_value=np.nan)[rows]
+    values = np.where(np.isnan(values), 0.0, values)
+    return np.trunc(values) if as_int else values
+
+
+def _round(values):
+    # np.rint 與 Python round 一樣採銀行家捨入
+    return np.rint(values)
+
+
+def _band_score(values, low, high, penalty):
+    """
+    區間分數：落在 [low, high] 內 100 分，超出時依 penalty(距離, 邊界) 扣分、最低 0 分；
+    low / high 為 0 表示沒有該邊界。
+    """
+    def below():
+        return np.maximum(0, _round(100 - penalty(low - values, low)))
+
+    def above():
+        return np.maximum(0, _round(100 - penalty(values - high, high)))
+
+    if low > 0 and high > 0:
+        return np.where((low <= values) & (values <= high), 100.0, np.where(values < low, below(), above()))
+    if high > 0:
+        return np.where(values <= high, 100.0, above())
+    return np.where(values >= low, 100.0, below())
+
+
+def _relative(distance, bound):
+    return distance / bound * 150
+
+
+def _district_score(frame, rows, target):
+    dist_list = [d.strip() for d in target.replace('、', ',').replace('，', ',').split(',') if d.strip()]
+    if '行政區' not in frame.columns:
+        districts = pd.Series([''] * len(rows))
+    else:
+        districts = frame['行政區'].iloc[rows].astype(str)
+    # 只比對每個相異的行政區一次
+    codes, uniques = pd.factorize(districts)
+    matched = np.array([any(d in u or u in d for d in dist_list) for u in uniques], dtype=bool)
+    return np.where(matched[codes], 100.0, 30.0) if len(uniques) else np.zeros(0)
+
+
+def similarity_scores(frame, filters, rows=None):
+    """
+    frame 中 rows（位置，預設全部）各列的相似度（0–100 的整數陣列）。
+    沒有任何可比較的條件時全部 100 分。
+    """
+    rows = np.arange(len(frame)) if rows is None else np.asarray(rows, dtype=np.intp)
+    scores = []
+
+    target_district = filters.get('district', '')
+    if target_district and target_district != '不限':
+        scores.append(_district_score(frame, rows, target_district))
+
+    bmin = filters.get('budget_min', 0)
+    bmax = filters.get('budget_max', 0)
+    if bmin > 0 or bmax > 0:
+        scores.append(_band_score(_column(frame, rows, '總價(萬)'), bmin, bmax, _relative))
+
+    layout_scores = []
+    for lcol, lkey in LAYOUT_DIMENSIONS:
+        ltarget = filters.get(lkey, 0)
+        if ltarget > 0:
+            lactual = _column(frame, rows, lcol, as_int=True)
+            layout_scores.append(np.where(
+                lactual == ltarget, 100.0,
+                np.where(lactual > ltarget,
+                         np.maximum(60, _round(100 - (lactual - ltarget) * 15)),
+                         np.maximum(0, _round(100 - (ltarget - lactual) * 35))),
+            ))
+    if layout_scores:
+        scores.append(_round(np.sum(layout_scores, axis=0) / len(layout_scores)))
+
+    fmin = filters.get('floor_min', 0)
+    fmax = filters.get('floor_max', 0)
+    if fmin > 0 or fmax > 0:
+        scores.append(_band_score(_column(frame, rows, '實際樓層', as_int=True), fmin, fmax,
+                                  lambda distance, bound: distance * 20))
+
+    amin = filters.get('area_min', 0)
+    amax = filters.get('area_max', 0)
+    if amin > 0 or amax > 0:
+        scores.append(_band_score(_column(frame, rows, '建坪'), amin, amax, _relative))
+
+    age_min = filters.get('age_min', 0)
+    age_max = filters.get('age_max', 0)
+    if age_min > 0 or age_max > 0:
+        scores.append(_band_score(_column(frame, rows, '屋齡'), age_min, age_max,
+                                  lambda distance, bound: distance * 8))
+
+    if not scores:
+        return np.full(len(rows), 100, dtype=np.int64)
+    return _round(np.sum(scores, axis=0) / len(scores)).astype(np.int64)
+
+
+def select_similar(scores, threshold=SIMILARITY_THRESHOLD, top_k=None):
+    """
+    分數 >= threshold 的位置（保持原本順序）；指定 top_k 時只留分數最高的 top_k 筆
+    （以 argpartition 選出，不必整份排序；同分的邊界筆數任取）。
+    """
+    selected = np.flatnonzero(scores >= threshold)
+    if top_k is not None and len(selected) > top_k:
+        best = np.argpartition(-scores[selected], top_k - 1)[:top_k]
+        selected = np.sort(selected[best])
+    return selected
@@ -1,6 +1,7 @@
 import streamlit as st
 import pandas as pd
-import google.generativeai as genai
+from components.llm_gateway import get_model as get_gemini_model
+from components.city_registry import listing_name_map, slug_from_listing_file
 import os
 import plotly.graph_objects as go
 import plotly.express as px
@@ -9,6 +10,10 @@ import re
 import numpy as np
 from scipy import stats
 from components.favorites import FavoritesManager
+from components.cp_score import SCORE_DIMENSIONS, score_pool
+from components.listing_history import price_change_label, price_history
+from components.listing_store import DEFAULT_LISTING_FILE, get_listing_df
+from components.llm_batch import placeholder_writer, run_analysis_batch, stream_generate
 
 
 try:
@@ -22,44 +27,13 @@ except Exception:
             return "" if value is None else str(value).strip()
 
 
-def safe_generate(model, prompt, fallback_text):
-    """Gemini 容錯包裝：失敗時回退到本地文字"""
-    try:
-        response = model.generate_content(prompt)
-        text = getattr(response, "text", "") or ""
-        text = text.strip()
-        return text if text else fallback_text
-    except Exception:
-        return fallback_text
-
 # 在檔案開頭, name_map 下方加入反向對照表
-name_map = {
-    "Taichung-city_buy_properties.csv": "台中市",
-}
+name_map = listing_name_map()
 # 建立反向對照表: 中文 -> 英文檔名
 reverse_name_map = {v: k for k, v in name_map.items()}
 
 # ── 排名工具函式（在 tab1_module 外部定義，或貼在 tab1_module 最前面）────────
  
-def _parse_age_rank(x):
-    """屋齡字串轉數字"""
-    if pd.isna(x):
-        return np.nan
-    match = re.search(r'(\d+\.?\d*)', str(x))
-    return float(match.group(1)) if match else np.nan
- 
-def _parse_floor_rank(x):
-    """樓層字串轉數字（與範例 parse_floor 一致）"""
-    if pd.isna(x):
-        return np.nan
-    try:
-        # 先嘗試 split('樓') 取第一段，與範例程式邏輯一致
-        parts = str(x).split('樓')
-        val = re.search(r'\d+', parts[0])
-        return int(val.group()) if val else np.nan
-    except Exception:
-        return np.nan
- 
 def _get_type_main(t):
     """處理混合類型，取第一個主要類型"""
     t = str(t).strip()
@@ -72,121 +46,27 @@ def _get_compare_df(df_all, district, type_main):
         (df_all['類型'].astype(str).str.contains(type_main, case=False, na=False))
     ].copy()
  
-def _score_one(row, df_all, weights):
-    result = {
-        '標題':       row.get('標題', ''),
-        '地址':       row.get('地址', ''),
-        '行政區':     row.get('行政區', ''),
-        '類型':       row.get('類型', ''),
-        '總價(萬)':   row.get('總價(萬)', np.nan),
-        '建坪':       row.get('建坪', np.nan),
-        '格局':       row.get('格局', ''),
-        '樓層':       row.get('樓層', ''),
-        '屋齡':       row.get('屋齡', ''),
-        '價格競爭力': np.nan,
-        '空間效率':   np.nan,
-        '屋齡優勢':   np.nan,
-        '樓層定位':   np.nan,
-        '格局流動性': np.nan,
-        '總分':       np.nan,
-        '比較母體數': 0,
-    }
-
-    target_price = pd.to_numeric(row.get('總價(萬)', np.nan), errors='coerce')
-    target_area  = pd.to_numeric(row.get('建坪', np.nan), errors='coerce')
-
-    if pd.isna(target_price) or pd.isna(target_area) or target_area == 0:
-        return result
-
-    # ★ 直接用傳入的 df_all 當比較母體，不再重新篩選
-    compare_df = df_all.copy()
-    compare_df['_總價'] = pd.to_numeric(compare_df['總價(萬)'], errors='coerce')
-    compare_df['_建坪'] = pd.to_numeric(compare_df['建坪'],     errors='coerce')
-    compare_df = compare_df.dropna(subset=['_總價', '_建坪'])
-
-    n = len(compare_df)
-    if n == 0:
-        return result
-    result['比較母體數'] = n
-
-    # 1. 價格競爭力
-    price_percentile = (compare_df['_總價'] < target_price).sum() / n * 100
-    score_price = max(0.0, min(10.0, 10 - price_percentile / 10))
-
-    # 2. 空間效率
-    score_space = 5.0
-    actual = pd.to_numeric(row.get('主+陽', np.nan), errors='coerce')
-    if not pd.isna(actual) and float(actual) > 0:
-        target_usage_rate = float(actual) / float(target_area)
-        compare_df['_實際']   = pd.to_numeric(compare_df['主+陽'], errors='coerce')
-        compare_df['_使用率'] = compare_df['_實際'] / compare_df['_建坪']
-        median_usage = compare_df['_使用率'].median()
-        if not pd.isna(median_usage) and median_usage > 0:
-            score_space = max(0.0, min(10.0, (target_usage_rate / median_usage) * 5))
-
-    # 3. 屋齡優勢
-    score_age = 5.0
-    compare_df['_屋齡'] = compare_df['屋齡'].apply(_parse_age_rank)
-    target_age = _parse_age_rank(row.get('屋齡', np.nan))
-    df_age = compare_df.dropna(subset=['_屋齡'])
-    if len(df_age) > 0 and not pd.isna(target_age):
-        age_percentile = (df_age['_屋齡'] < target_age).sum() / len(df_age) * 100
-        score_age = max(0.0, min(10.0, 10 - age_percentile / 10))
-
-    # 4. 樓層定位
-    score_floor = 5.0
-    compare_df['_樓層'] = compare_df['樓層'].apply(_parse_floor_rank)
-    target_floor = _parse_floor_rank(row.get('樓層', np.nan))
-    df_floor = compare_df.dropna(subset=['_樓層'])
-    if len(df_floor) > 0 and not pd.isna(target_floor):
-        floor_percentile = (df_floor['_樓層'] < target_floor).sum() / len(df_floor) * 100
-        score_floor = max(0.0, min(10.0, 10 - abs(floor_percentile - 50) / 5))
-
-    # 5. 格局流動性
-    score_layout = 0.0
-    target_layout = str(row.get('格局', '')).strip()
-    if target_layout and '格局' in compare_df.columns:
-        same_cnt = (compare_df['格局'].astype(str).str.strip() == target_layout).sum()
-        same_pct = same_cnt / n * 100
-        score_layout = max(0.0, min(10.0, same_pct / 3))
-
-    # 用原始分數計算總分，最後才 round 一次
-    weighted_total = (
-        score_price  * (weights['價格競爭力'] / 100) +
-        score_space  * (weights['空間效率']   / 100) +
-        score_age    * (weights['屋齡優勢']   / 100) +
-        score_floor  * (weights['樓層定位']   / 100) +
-        score_layout * (weights['格局流動性'] / 100)
-    )
-    total_score = round(weighted_total * 10, 1)
-
-    result.update({
-        '價格競爭力': round(score_price,  1),
-        '空間效率':   round(score_space,  1),
-        '屋齡優勢':   round(score_age,    1),
-        '樓層定位':   round(score_floor,  1),
-        '格局流動性': round(score_layout, 1),
-    })
-    result['總分'] = total_score
-    return result
- 
- 
 def run_ranking(selected_row, all_df, weights):
     target_district = selected_row.get('行政區', '')
     target_type     = _get_type_main(str(selected_row.get('類型', '')).strip())
 
-    # df_pool 篩出同區同類型，直接傳給 _score_one 當比較母體
-    df_pool = all_df[
-        (all_df['行政區'] == target_district) &
-        (all_df['類型'].astype(str).str.contains(target_type, case=False, na=False))
-    ].copy()
+    # df_pool 篩出同區同類型，整個母體一次向量化評分
+    df_pool = _get_compare_df(all_df, target_district, target_type)
 
     if df_pool.empty:
         return pd.DataFrame(), None, None
 
-    # ★ 傳入 df_pool，_score_one 直接用，不再重篩
-    records = [_score_one(row, df_pool, weights) for _, row in df_pool.iterrows()]
-    df_result = pd.DataFrame(records)
+    scores = score_pool(df_pool, weights)
+    info_cols = ['標題', '地址', '行政區', '類型', '總價(萬)', '建坪', '格局', '樓層', '屋齡']
+    df_result = pd.DataFrame({
+        col: df_pool[col] if col in df_pool.columns else (np.nan if col in ('總價(萬)', '建坪') else '')
+        for col in info_cols
+    })
+    for dim in SCORE_DIMENSIONS:
+        df_result[dim] = [np.nan if pd.isna(v) else round(v, 1) for v in scores[dim]]
+    df_result['總分'] = scores['總分']
+    df_result['比較母體數'] = scores['比較母體數']
+    df_result = df_result.reset_index(drop=True)
     df_result = df_result.sort_values('總分', ascending=False).reset_index(drop=True)
     df_result.insert(0, '排名', df_result.index + 1)
 
@@ -886,27 +766,12 @@ def get_favorites_data():
     if 'favorites' not in st.session_state or not st.session_state.favorites:
         return pd.DataFrame()
 
-    all_df = None
-    if 'all_properties_df' in st.session_state and not st.session_state.all_properties_df.empty:
-        all_df = st.session_state.all_properties_df
-    elif 'filtered_df' in st.session_state and not st.session_state.filtered_df.empty:
-        all_df = st.session_state.filtered_df
-    else:
-        # 從 CSV 直接載入，確保比較母體永遠存在
-        try:
-            all_df = pd.read_csv('./Data/Taichung-city_buy_properties.csv')
-            # 補上行政區欄位（與條件搜尋邏輯一致）
-            def _parse_district(addr):
-                if pd.isna(addr) or not isinstance(addr, str):
-                    return ""
-                import re
-                match = re.search(r'[市縣](.+?[區鄉鎮市])', addr)
-                return match.group(1) if match else ""
-            if '行政區' not in all_df.columns and '地址' in all_df.columns:
-                all_df['行政區'] = all_df['地址'].apply(_parse_district)
-            st.session_state.all_properties_df = all_df  # 快取起來
-        except Exception:
-            all_df = None
+    # 從共用房源資料取得，確保比較母體永遠存在
+    try:
+        all_df = get_listing_df()
+        st.session_state.all_properties_df = all_df
+    except Exception:
+        all_df = st.session_state.get('filtered_df')
 
     if all_df is None or all_df.empty:
         return pd.DataFrame()
@@ -937,20 +802,11 @@ def tab1_module():
         selected_row = fav_df[fav_df['標題'] == choice].iloc[0]
         
         # ⭐ 取得完整資料集（永遠用完整 CSV，不用 filtered_df）
-        all_df = None
-        if 'all_properties_df' in st.session_state and not st.session_state.all_properties_df.empty:
-            all_df = st.session_state.all_properties_df
-        else:
-            try:
-                all_df = pd.read_csv('./Data/Taichung-city_buy_properties.csv')
-                if '行政區' not in all_df.columns and '地址' in all_df.columns:
-                    all_df['行政區'] = all_df['地址'].apply(
-                        lambda addr: re.search(r'[市縣](.+?[區鄉鎮市])', str(addr)).group(1)
-                        if pd.notna(addr) and re.search(r'[市縣](.+?[區鄉鎮市])', str(addr)) else ""
-                    )
-                st.session_state.all_properties_df = all_df
-            except Exception as e:
-                all_df = None
+        try:
+            all_df = get_listing_df()
+            st.session_state.all_properties_df = all_df
+        except Exception as e:
+            all_df = None
         
         # ⭐ 補充：取得目標房屋的行政區和類型
         target_district = selected_row.get('行政區')
@@ -1010,6 +866,13 @@ def tab1_module():
             area_Price_per = "未提供"
             Actual_space_Price_per = "未提供"
 
+        # 價格歷史：由每日快照累積的調價紀錄
+        history = price_history(slug_from_listing_file(DEFAULT_LISTING_FILE))
+        price_label = price_change_label(history, selected_row.get('編號', '')) or "無調價紀錄"
+        house_id = normalize_property_id(selected_row.get('編號', ''))
+        if not history.empty and house_id in history.index:
+            price_label += f"（{history.loc[house_id, '首次上架']} 起追蹤）"
+
         col1, col2 = st.columns([1, 1])
         with col1:
             st.markdown(f"""
@@ -1054,11 +917,14 @@ def tab1_module():
                 <div style="font-size:14px; color:#cccccc; margin-top:5px;">
                     實際單價：{Actual_space_Price_per} 元/坪
                 </div>
+                <div style="font-size:14px; color:#cccccc; margin-top:5px;">
+                    🏷️ 價格歷史：{price_label}
+                </div>
             </div>
             """, unsafe_allow_html=True)
 
         gemini_key = st.session_state.get("GEMINI_KEY","")
-        model = genai.GenerativeModel("gemini-2.5-flash")
+        model = get_gemini_model(gemini_key, "gemini-2.5-flash")
         
         st.write("\n")
         col1, col2 = st.columns([1, 1])
@@ -1096,10 +962,14 @@ def tab1_module():
             success_count = 0
             fail_count    = 0
 
+            b_model = get_gemini_model(gemini_key, "gemini-2.5-flash")
+
+            # 第一階段：逐間計算比較數據與 prompt（純本地運算）
+            pending = []
+            jobs    = []
             for i, (_, row) in enumerate(fav_df.iterrows()):
                 house_title = row.get('標題', f'第{i+1}間')
-                status_text.info(f"🔄 正在分析第 {i+1}/{total_fav} 間：{house_title}")
-                progress_bar.progress((i) / total_fav)
+                status_text.info(f"🔄 正在準備第 {i+1}/{total_fav} 間資料：{house_title}")
 
                 try:
                     # ── 取得比較母體 ──
@@ -1266,9 +1136,6 @@ def tab1_module():
                         "格局流動性": round(b_score_layout, 1),
                     }
 
-                    genai.configure(api_key=gemini_key)
-                    b_model = genai.GenerativeModel("gemini-2.5-flash")
-
                     b_price_prompt = f"你是台灣房市分析顧問，以下是價格分析數據，請用繁體中文完成：1️⃣解讀價格位置 2️⃣說明是否在主流區間 3️⃣給購屋建議（不超過150字）\n{json.dumps(b_analysis_payload, ensure_ascii=False)}"
                     b_space_prompt = f"你是台灣房市分析顧問，以下是坪數分析數據，請用繁體中文完成：1️⃣解讀空間使用效率 2️⃣說明百分位排名 3️⃣給購屋建議（不超過150字）\n{json.dumps(b_floor_area_payload, ensure_ascii=False)}"
 
@@ -1287,12 +1154,58 @@ def tab1_module():
                     }
                     b_summary_prompt = f"你是台灣房市分析顧問，請根據以下五大面向數據，用繁體中文提供：1.整體評價 2.三大優勢 3.三大劣勢 4.購屋建議（不超過200字）\n{json.dumps(b_summary_data, ensure_ascii=False)}"
 
-                    b_price_text   = safe_generate(b_model, b_price_prompt,   "價格分析暫時無法產生。")
-                    b_space_text   = safe_generate(b_model, b_space_prompt,   "坪數分析暫時無法產生。")
-                    b_age_text     = safe_generate(b_model, b_age_prompt,     "屋齡分析暫時無法產生。") if b_age_prompt   else "（無屋齡資料）"
-                    b_floor_text   = safe_generate(b_model, b_floor_prompt,   "樓層分析暫時無法產生。") if b_floor_prompt  else "（無樓層資料）"
-                    b_layout_text  = safe_generate(b_model, b_layout_prompt,  "格局分析暫時無法產生。") if b_layout_prompt else "（無格局資料）"
-                    b_summary_text = safe_generate(b_model, b_summary_prompt, "綜合總結暫時無法產生。")
+                    pending.append({
+                        'index':       i,
+                        'title':       house_title,
+                        'row':         row,
+                        'df_filtered': b_df_filtered,
+                        'payloads':    (b_analysis_payload, b_floor_area_payload, b_age_analysis_payload,
+                                        b_floor_analysis_payload, b_layout_analysis_payload),
+                        'scores':      b_scores,
+                        'total_score': b_total_score,
+                    })
+                    jobs.append({
+                        'sections': {
+                            'price':  (b_price_prompt,  "價格分析暫時無法產生。"),
+                            'space':  (b_space_prompt,  "坪數分析暫時無法產生。"),
+                            'age':    (b_age_prompt,    "屋齡分析暫時無法產生。" if b_age_prompt    else "（無屋齡資料）"),
+                            'floor':  (b_floor_prompt,  "樓層分析暫時無法產生。" if b_floor_prompt  else "（無樓層資料）"),
+                            'layout': (b_layout_prompt, "格局分析暫時無法產生。" if b_layout_prompt else "（無格局資料）"),
+                        },
+                        'summary': (b_summary_prompt, "綜合總結暫時無法產生。"),
+                    })
+
+                except Exception as e:
+                    fail_count += 1
+                    status_text.warning(f"⚠️ 第 {i+1} 間分析失敗（{house_title}）：{str(e)}")
+
+            # 第二階段：多間房屋同時呼叫 Gemini，各面向並行、總結最後產生
+            def report_progress(done, total, index):
+                status_text.info(f"🔄 AI 分析中：已完成 {done}/{total} 間（{pending[index]['title']}）")
+                progress_bar.progress(done / total)
+
+            if jobs:
+                status_text.info(f"🔄 AI 分析中：共 {len(jobs)} 間，同時進行多間分析…")
+            batch_texts = run_analysis_batch(b_model, jobs, on_progress=report_progress)
+
+            # 第三階段：依原本順序存入 session_state
+            for entry, texts in zip(pending, batch_texts):
+                i           = entry['index']
+                row         = entry['row']
+                house_title = entry['title']
+                try:
+                    b_df_filtered = entry['df_filtered']
+                    (b_analysis_payload, b_floor_area_payload, b_age_analysis_payload,
+                     b_floor_analysis_payload, b_layout_analysis_payload) = entry['payloads']
+                    b_scores      = entry['scores']
+                    b_total_score = entry['total_score']
+
+                    b_price_text   = texts['price']
+                    b_space_text   = texts['space']
+                    b_age_text     = texts['age']
+                    b_floor_text   = texts['floor']
+                    b_layout_text  = texts['layout']
+                    b_summary_text = texts['summary']
 
                     # ── 存入 session_state ──
                     b_property_id  = normalize_property_id(row.get('編號', ''))
@@ -1377,8 +1290,6 @@ def tab1_module():
                     fail_count += 1
                     status_text.warning(f"⚠️ 第 {i+1} 間分析失敗（{house_title}）：{str(e)}")
 
-                progress_bar.progress((i + 1) / total_fav)
-
             # 完成
             progress_bar.progress(1.0)
             if fail_count == 0:
@@ -2218,13 +2129,19 @@ def tab1_module():
                         """
 
                         
-                with st.spinner("🧠AI 正在解讀圖表並產生分析結論..."):
-                    price_text = safe_generate(model, price_prompt, "價格分析暫時無法產生，請參考圖表與數據。")
-                    space_text = safe_generate(model, space_prompt, "坪數分析暫時無法產生，請參考圖表與數據。")
-                    age_text = safe_generate(model, age_prompt if age_analysis_payload else "", "屋齡分析暫時無法產生，請參考圖表與數據。") if age_analysis_payload else "（無屋齡資料）"
-                    floor_text = safe_generate(model, floor_prompt if floor_analysis_payload else "", "樓層分析暫時無法產生，請參考圖表與數據。") if floor_analysis_payload else "（無樓層資料）"
-                    layout_text = safe_generate(model, layout_prompt if layout_analysis_payload else "", "格局分析暫時無法產生，請參考圖表與數據。") if layout_analysis_payload else "（無格局資料）"
-                    summary_text = safe_generate(model, summary_prompt, "綜合總結暫時無法產生，請綜合參考五大面向圖表與分析文字。")
+                # 各面向邊產生邊顯示；完成後由下方的結果區塊以完整文字重畫
+                live_box = st.empty()
+                with st.spinner("🧠AI 正在解讀圖表並產生分析結論..."), live_box.container():
+                    def live(title):
+                        return placeholder_writer(st.empty(), f"**{title}**\n\n")
+
+                    price_text = stream_generate(model, price_prompt, "價格分析暫時無法產生，請參考圖表與數據。", live("💰 價格分析"))
+                    space_text = stream_generate(model, space_prompt, "坪數分析暫時無法產生，請參考圖表與數據。", live("📐 坪數分析"))
+                    age_text = stream_generate(model, age_prompt if age_analysis_payload else "", "屋齡分析暫時無法產生，請參考圖表與數據。", live("🏠 屋齡分析")) if age_analysis_payload else "（無屋齡資料）"
+                    floor_text = stream_generate(model, floor_prompt if floor_analysis_payload else "", "樓層分析暫時無法產生，請參考圖表與數據。", live("🏢 樓層分析")) if floor_analysis_payload else "（無樓層資料）"
+                    layout_text = stream_generate(model, layout_prompt if layout_analysis_payload else "", "格局分析暫時無法產生，請參考圖表與數據。", live("🚪 格局分析")) if layout_analysis_payload else "（無格局資料）"
+                    summary_text = stream_generate(model, summary_prompt, "綜合總結暫時無法產生，請綜合參考五大面向圖表與分析文字。", live("📝 綜合總結"))
+                live_box.empty()
                     
                 # ── ✅ 在 session_state 存入前先算好分數 ──────────────────────────
                 # 給還沒算到的變數加預設值，避免 NameError
@@ -0,0 +1,167 @@
+# components/spatial_index.py
+# 經緯度點的空間索引：一次查詢上千個點的半徑內 / 最近 k 個
+# 座標轉成單位球上的 3D 向量建 KD-tree，弦長與大圓距離單調對應，半徑與 kNN 結果都是精確的
+import numpy as np
+
+try:
+    from scipy.spatial import cKDTree
+    SCIPY_AVAILABLE = True
+except Exception:
+    SCIPY_AVAILABLE = False
+
+from components.geocoding import haversine_many
+
+
+EARTH_RADIUS = 6371000
+
+# 沒有 scipy 時暴力計算，每批最多比較的點對數量
+_BRUTE_FORCE_CHUNK = 2_000_000
+
+
+def _to_unit_vectors(lats, lngs):
+    phi = np.radians(np.asarray(lats, dtype=float))
+    lam = np.radians(np.asarray(lngs, dtype=float))
+    cos_phi = np.cos(phi)
+    return np.column_stack([cos_phi * np.cos(lam), cos_phi * np.sin(lam), np.sin(phi)])
+
+
+def _object_array(values):
+    arr = np.empty(len(values), dtype=object)
+    for i, value in enumerate(values):
+        arr[i] = value
+    return arr
+
+
+def _chord_for(radius_m):
+    """大圓距離（公尺）→ 單位球上的弦長"""
+    angle = np.minimum(np.asarray(radius_m, dtype=float) / EARTH_RADIUS, np.pi)
+    return 2 * np.sin(angle / 2)
+
+
+class SpatialIndex:
+    """
+    經緯度點索引。
+
+    ids 為每個點的識別值（例如 DataFrame index 或 place_id），查詢結果以位置索引
+    回傳，可用 index.ids[positions] 取回原始識別值。距離一律以 haversine_many 計算（公尺）。
+    """
+
+    def __init__(self, lats, lngs, ids=None):
+        self.lats = np.asarray(lats, dtype=float)
+        self.lngs = np.asarray(lngs, dtype=float)
+        if self.lats.shape != self.lngs.shape:
+            raise ValueError("lats 與 lngs 長度不一致")
+        self.ids = _object_array(list(ids) if ids is not None else range(len(self.lats)))
+        self._vectors = _to_unit_vectors(self.lats, self.lngs)
+        self._tree = cKDTree(self._vectors) if SCIPY_AVAILABLE and len(self.lats) else None
+
+    def __len__(self):
+        return len(self.lats)
+
+    def _distances(self, lat, lng, positions):
+        positions = np.asarray(positions, dtype=int)
+        return haversine_many(lat, lng, self.lats[positions], self.lngs[positions])
+
+    def _sorted(self, lat, lng, positions):
+        positions = np.asarray(positions, dtype=int)
+        distances = self._distances(lat, lng, positions)
+        order = np.argsort(distances, kind="stable")
+        return positions[order], distances[order]
+
+    def query_radius(self, lat, lng, radius_m):
+        """半徑內的點，回傳 (位置索引, 距離)，依距離由近到遠"""
+        return self.query_radius_many([lat], [lng], radius_m)[0]
+
+    def query_radius_many(self, lats, lngs, radius_m):
+        """多個中心一次查詢；radius_m 可為純量或與中心等長的陣列"""
+        lats = np.asarray(lats, dtype=float)
+        lngs = np.asarray(lngs, dtype=float)
+        radii = np.broadcast_to(np.asarray(radius_m, dtype=float), lats.shape)
+        if len(self) == 0:
+            return [(np.empty(0, dtype=int), np.empty(0)) for _ in range(len(lats))]
+
+        results = []
+        if self._tree is not None:
+            # 弦長門檻略放寬，再以 haversine 精確過濾，避免浮點誤差漏掉邊界上的點
+            chords = _chord_for(radii) * (1 + 1e-9) + 1e-12
+            candidates = self._tree.query_ball_point(_to_unit_vectors(lats, lngs), chords)
+            for lat, lng, radius, cand in zip(lats, lngs, radii, candidates):
+                positions, distances = self._sorted(lat, lng, cand)
+                keep = distances <= radius
+                results.append((positions[keep], distances[keep]))
+            return results
+
+        step = max(1, _BRUTE_FORCE_CHUNK // len(self))
+        for start in range(0, len(lats), step):
+            block = slice(start, start + step)
+            matrix = haversine_many(lats[block, None], lngs[block, None], self.lats[None, :], self.lngs[None, :])
+            for row, radius in zip(matrix, radii[block]):
+                positions = np.flatnonzero(row <= radius)
+                order = np.argsort(row[positions], kind="stable")
+                results.append((positions[order], row[positions][order]))
+        return results
+
+    def knn(self, lat, lng, k):
+        """最近的 k 個點，回傳 (位置索引, 距離)"""
+        return self.knn_many([lat], [lng], k)[0]
+
+    def knn_many(self, lats, lngs, k):
+        """多個中心各自最近的 k 個點"""
+        lats = np.asarray(lats, dtype=float)
+        lngs = np.asarray(lngs, dtype=float)
+        k = min(int(k), len(self))
+        if k <= 0:
+            return [(np.empty(0, dtype=int), np.empty(0)) for _ in range(len(lats))]
+
+        results = []
+        if self._tree is not None:
+            _, candidates = self._tree.query(_to_unit_vectors(lats, lngs), k=k)
+            candidates = np.asarray(candidates).reshape(len(lats), k)
+            for lat, lng, cand in zip(lats, lngs, candidates):
+                results.append(self._sorted(lat, lng, cand))
+            return results
+
+        step = max(1, _BRUTE_FORCE_CHUNK // len(self))
+        for start in range(0, len(lats), step):
+            block = slice(start, start + step)
+            matrix = haversine_many(lats[block, None], lngs[block, None], self.lats[None, :], self.lngs[None, :])
+            for row in matrix:
+                positions = np.argpartition(row, k - 1)[:k]
+                order = np.argsort(row[positions], kind="stable")
+                results.append((positions[order], row[positions][order]))
+        return results
+
+    def count_within(self, lats, lngs, radius_m):
+        """每個中心半徑內的點數（例如每間房源 500 m 內有幾個捷運站）"""
+        return np.array([len(pos) for pos, _ in self.query_radius_many(lats, lngs, radius_m)], dtype=int)
+
+    def nearest_distance(self, lats, lngs):
+        """每個中心到最近一點的距離；索引為空時為 NaN"""
+        if len(self) == 0:
+            return np.full(len(np.atleast_1d(lats)), np.nan)
+        return np.array([dist[0] for _, dist in self.knn_many(lats, lngs, 1)])
+
+
+def build_listing_index(df, address_col="地址"):
+    """以地址快取中的座標為已地理編碼的房源建索引；ids 為 df 的 index（未解析的房源不列入）"""
+    from components.geocode_cache import get_geocode_cache
+
+    addresses = df[address_col].dropna().astype(str)
+    coords = get_geocode_cache().get_many(addresses.unique().tolist())
+    rows = [(idx, *coords[addr]) for idx, addr in addresses.items() if addr in coords]
+    if not rows:
+        return SpatialIndex([], [], [])
+    ids, lats, lngs = zip(*rows)
+    return SpatialIndex(lats, lngs, ids)
+
+
+def build_facility_index(keywords):
+    """以 Places 快取中已查過的設施建索引（同 place_id 只收一次）；ids 為 place dict"""
+    from components.places_cache import get_places_cache
+
+    places = {}
+    for keyword in ([keywords] if isinstance(keywords, str) else keywords):
+        for place in get_places_cache().places_for_keyword(keyword):
+            places.setdefault(place.get("place_id") or (place["lat"], place["lng"]), place)
+    items = list(places.values())
+    return SpatialIndex([p["lat"] for p in items], [p["lng"] for p in items], items)
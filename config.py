@@ -28,6 +28,72 @@ DEFAULT_RADIUS_RANGE = (100, 2000, 100)
 GOOGLE_MAPS_BASE_URL = "https://maps.googleapis.com/maps/api/"
 GEMINI_MODEL = "gemini-2.0-flash"
 
+# 一鍵批次分析：同時分析的房屋數、同時進行的 Gemini 呼叫數、單次呼叫逾時（秒）
+GEMINI_BATCH_HOUSES = 3
+GEMINI_MAX_CONCURRENT_CALLS = 6
+GEMINI_CALL_TIMEOUT = 60
+
+# Gemini 回應快取（SQLite）：相同模型 + prompt + 生成參數直接重用；存活時間與容量上限
+GEMINI_CACHE_PATH = os.path.join(BASE_DIR, ".cache", "gemini_cache.sqlite3")
+GEMINI_CACHE_TTL_SECONDS = 7 * 24 * 3600
+GEMINI_CACHE_MAX_BYTES = 100 * 1024 * 1024
+
+# Google Places 文字搜尋並行數與每秒請求上限（依 API 配額調整）
+PLACES_MAX_WORKERS = 8
+PLACES_RATE_PER_SEC = 10
+
+# Places 查詢快取（SQLite）：存活時間、容量上限、geohash 精度（7 ≈ 150 m）與半徑級距
+PLACES_CACHE_PATH = os.path.join(BASE_DIR, ".cache", "places_cache.sqlite3")
+PLACES_CACHE_TTL_SECONDS = 7 * 24 * 3600
+PLACES_CACHE_MAX_BYTES = 50 * 1024 * 1024
+PLACES_GEOHASH_PRECISION = 7
+PLACES_RADIUS_STEP = 100
+
+# 地址座標快取與批次地理編碼
+GEOCODE_CACHE_PATH = os.path.join(BASE_DIR, ".cache", "geocode_cache.sqlite3")
+GEOCODE_MAX_WORKERS = 8
+GEOCODE_RATE_PER_SEC = 20
+
+# 房源快照歷史：每個城市一個資料夾、每天一個快照分區，與價格事件紀錄
+LISTING_HISTORY_FOLDER = os.path.join(DATA_FOLDER, "history")
+
+# 台中市行政區（條件搜尋的行政區選單、AI 查詢的本地解析共用）
+TAICHUNG_DISTRICTS = [
+    "中區", "東區", "西區", "南區", "北區",
+    "西屯區", "南屯區", "北屯區", "豐原區", "大里區",
+    "太平區", "清水區", "沙鹿區", "大甲區", "東勢區",
+    "梧棲區", "烏日區", "神岡區", "大肚區", "大雅區",
+    "后里區", "霧峰區", "潭子區", "龍井區", "外埔區",
+    "和平區", "石岡區", "大安區", "新社區"
+]
+
+# 信義房屋的城市代碼（列表網址與房源 CSV 檔名使用），涵蓋實價登錄 CITY_FILE_CODES 的所有縣市；
+# 鍵為城市選單顯示的名稱
+SINYI_CITIES = {
+    "台北市": "Taipei-city",
+    "新北市": "NewTaipei-city",
+    "基隆市": "Keelung-city",
+    "桃園市": "Taoyuan-city",
+    "新竹市": "Hsinchu-city",
+    "新竹縣": "Hsinchu-county",
+    "苗栗縣": "Miaoli-county",
+    "台中市": "Taichung-city",
+    "彰化縣": "Changhua-county",
+    "南投縣": "Nantou-county",
+    "雲林縣": "Yunlin-county",
+    "嘉義市": "Chiayi-city",
+    "嘉義縣": "Chiayi-county",
+    "台南市": "Tainan-city",
+    "高雄市": "Kaohsiung-city",
+    "屏東縣": "Pingtung-county",
+    "宜蘭縣": "Yilan-county",
+    "花蓮縣": "Hualien-county",
+    "台東縣": "Taitung-county",
+    "澎湖縣": "Penghu-county",
+    "金門縣": "Kinmen-county",
+    "連江縣": "Lienchiang-county",
+}
+
 # 除錯模式
 DEBUG = True
 
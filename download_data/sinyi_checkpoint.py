@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+# 爬蟲進度檢查點：每解析完一頁就把該頁資料附加寫入磁碟，中斷後可從最後完成的頁面繼續
+import json
+import os
+import shutil
+import time
+
+# 超過這個時間（秒）的檢查點視為過期，重新開始；
+# 排程每週執行一次，保留 8 天才能讓下一次排程接續上一次中斷的進度
+DEFAULT_MAX_AGE = 8 * 24 * 3600
+
+
+class CrawlCheckpoint:
+    """
+    單一城市的抓取進度。
+
+    目錄內 pages.jsonl 每行是一頁 {"page": 頁碼, "rows": [...]}，寫入後立即 fsync；
+    最後一行若因中斷而不完整會在讀取時略過。meta.json 記錄模式與開始時間，
+    過期或早於上一次輸出的檢查點不會被接續；接續時沿用檢查點當初的模式（見 self.mode），已完成的頁面才對得上。
+    要求完整抓取時不接續增量模式的檢查點：增量結果會沿用已下架的物件，只有完整抓取能清掉它們。
+    """
+
+    def __init__(self, city, data_dir="./Data", mode="full", max_age=DEFAULT_MAX_AGE):
+        self.city = city
+        self.mode = mode
+        self.max_age = max_age
+        self.dir = os.path.join(data_dir, ".checkpoints", city)
+        self.pages_path = os.path.join(self.dir, "pages.jsonl")
+        self.meta_path = os.path.join(self.dir, "meta.json")
+
+    def _read_meta(self):
+        try:
+            with open(self.meta_path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def pages(self):
+        """依寫入順序產生 (page, rows)；遇到不完整或不連續的頁面即停止"""
+        if not os.path.exists(self.pages_path):
+            return
+        expected = None
+        with open(self.pages_path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    return
+                if expected is not None and entry["page"] != expected:
+                    return
+                expected = entry["page"] + 1
+                yield entry["page"], entry["rows"]
+
+    def resume(self, written_at=None):
+        """
+        接續既有進度，回傳下一個要抓的頁碼；沒有可用的檢查點時重新開始並回傳 1。
+        接續時 self.mode 會改成檢查點記錄的模式（要求 full 時只接續 full 的檢查點），呼叫端應以它為準。
+
+        written_at 為這個城市上一次成功輸出的時間：比它早開始的檢查點已被之後的抓取取代
+        （例如從快取還原回來的舊進度），不再接續。
+        """
+        meta = self._read_meta()
+        started_at = meta.get("started_at", 0) if meta else 0
+        usable = (
+            meta is not None
+            and meta.get("mode") in ("full", "delta")
+            and time.time() - started_at <= self.max_age
+            and (written_at is None or started_at > written_at)
+            and not (self.mode == "full" and meta.get("mode") != "full")
+        )
+        if not usable:
+            return self.reset()
+        self.mode = meta["mode"]
+
+        last_page = 0
+        valid_lines = []
+        for page, rows in self.pages():
+            last_page = page
+            valid_lines.append(json.dumps({"page": page, "rows": rows}, ensure_ascii=False))
+        # 去掉中斷時寫了一半的尾端，之後的頁面才能接著附加
+        self._rewrite(valid_lines)
+        return last_page + 1
+
+    def reset(self):
+        """清除既有進度，重新開始，回傳 1"""
+        shutil.rmtree(self.dir, ignore_errors=True)
+        os.makedirs(self.dir, exist_ok=True)
+        tmp_path = self.meta_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"city": self.city, "mode": self.mode, "started_at": time.time()}, f)
+        os.replace(tmp_path, self.meta_path)
+        return 1
+
+    def _rewrite(self, lines):
+        tmp_path = self.pages_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for line in lines:
+                f.write(line + "\n")
+        os.replace(tmp_path, self.pages_path)
+
+    def append_page(self, page, rows):
+        """寫入一頁的解析結果（整行寫入後 fsync，確保中斷時不會只留下一半）"""
+        line = json.dumps({"page": page, "rows": rows}, ensure_ascii=False)
+        with open(self.pages_path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def rows(self):
+        """所有已完成頁面的資料（依頁碼順序）"""
+        return [row for _, rows in self.pages() for row in rows]
+
+    def finish(self):
+        """輸出完成後刪除檢查點"""
+        shutil.rmtree(self.dir, ignore_errors=True)
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+# 增量抓取：以 編號 + 總價 比對上一次的 CSV，連續多頁都是未變動的物件時提前停止，
+# 其餘物件沿用上一次的資料
+import os
+
+import pandas as pd
+
+from sinyi_parser import COLUMNS
+
+# 一頁中未變動物件的比例達到此值才算「已知頁」；連續幾頁已知頁就停止抓取
+DEFAULT_KNOWN_RATIO = 0.95
+DEFAULT_STOP_PAGES = 3
+
+NO_ID = '無編號'
+
+
+def load_snapshot(path):
+    """讀取上一次輸出的 CSV（全部以字串讀入，沿用時輸出與原檔相同）；不存在時回傳空 list"""
+    if not os.path.exists(path):
+        return []
+    df = pd.read_csv(path, dtype=str, keep_default_na=False, encoding='utf-8-sig')
+    if list(df.columns) != COLUMNS:
+        return []
+    return df.to_dict('records')
+
+
+class DeltaTracker:
+    """
+    追蹤本次抓取與上一次快照的差異。
+
+    observe(rows) 每抓完一頁呼叫一次，回傳 True 代表已連續 stop_pages 頁
+    幾乎都是未變動的物件，可以停止抓取；carry_over() 回傳本次沒有抓到、
+    沿用上一次的資料。新上架 / 價格變動 / 未變動的筆數記錄在 stats。
+
+    注意：提前停止時無法得知後段物件是否已下架，需定期以完整模式重新抓取。
+    """
+
+    def __init__(self, previous_rows, known_ratio=DEFAULT_KNOWN_RATIO, stop_pages=DEFAULT_STOP_PAGES):
+        self.previous = previous_rows
+        self.known = {r['編號']: r['總價(萬)'] for r in previous_rows if r['編號'] != NO_ID}
+        self.known_ratio = known_ratio
+        self.stop_pages = stop_pages
+        self.streak = 0
+        self.stopped = False
+        self.seen_ids = set()
+        self.seen_rows = set()
+        self.stats = {"new": 0, "changed": 0, "unchanged": 0}
+
+    def observe(self, rows):
+        unchanged = 0
+        for row in rows:
+            house_id = row['編號']
+            if house_id == NO_ID:
+                self.seen_rows.add(tuple(row[c] for c in COLUMNS))
+            else:
+                self.seen_ids.add(house_id)
+            price = self.known.get(house_id)
+            if price is None:
+                self.stats["new"] += 1
+            elif price != row['總價(萬)']:
+                self.stats["changed"] += 1
+            else:
+                self.stats["unchanged"] += 1
+                unchanged += 1
+
+        # 全部被類型過濾掉的頁面不影響判斷
+        if rows:
+            self.streak = self.streak + 1 if unchanged / len(rows) >= self.known_ratio else 0
+        self.stopped = bool(self.known) and self.streak >= self.stop_pages
+        return self.stopped
+
+    def carry_over(self):
+        """提前停止時，上一次快照中本次沒有抓到的資料（保持原順序）；未提前停止時為空"""
+        if not self.stopped:
+            return []
+        carried = []
+        for row in self.previous:
+            if row['編號'] == NO_ID:
+                if tuple(row[c] for c in COLUMNS) not in self.seen_rows:
+                    carried.append(row)
+            elif row['編號'] not in self.seen_ids:
+                carried.append(row)
+        return carried
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+# 列表頁的快速解析：以 selectolax（lexbor）+ 預先編譯的 CSS selector / regex 取出與 sinyi_parser 完全相同的欄位
+import re
+
+try:
+    from selectolax.lexbor import LexborHTMLParser
+    FAST_PARSER_AVAILABLE = True
+except ImportError:
+    FAST_PARSER_AVAILABLE = False
+
+from sinyi_parser import ALLOWED_TYPES, parse_list_page
+
+_NUMBER_RE = re.compile(r'[\d.]+')
+_PRICE_RE = re.compile(r'[\d,.]+')
+_HOUSE_ID_RE = re.compile(r'/buy/house/([A-Za-z0-9]+)')
+
+# 各欄位的 selector，對應 sinyi_parser.parse_list_item 的 find / find_all（皆為第一個符合的子孫節點）
+_ITEM = 'div.buy-list-item'
+_TITLE = 'div.LongInfoCard_Type_Name'
+_ADDRESS = 'div.LongInfoCard_Type_Address'
+_HOUSE_INFO = 'div.longInfoCard_LongInfoCard_Type_HouseInfo__tZXDa'
+_PARKING = 'span.longInfoCard_LongInfoCard_Type_Parking__ZXl_e'
+_PRICE_BLOCK = 'div.LongInfoCard_Type_Right'
+_RED_PRICE = 'span[style*="color: rgb(221, 37, 37)"]'
+_LINK = 'a[href]'
+
+
+def _text(node):
+    """等同 BeautifulSoup 的 get_text(strip=True)：各文字節點去頭尾空白後直接相接"""
+    return node.text(deep=True, separator='', strip=True)
+
+
+def _span_texts(node):
+    return [_text(span) for span in node.css('span')] if node is not None else []
+
+
+def parse_list_item_fast(item):
+    """單一卡片節點 → 房屋 dict；不在 ALLOWED_TYPES 內回傳 None（與 parse_list_item 相同）"""
+    title_tag = item.css_first(_TITLE)
+    if title_tag is None:
+        raise AttributeError("'NoneType' object has no attribute 'get_text'")
+    title = _text(title_tag)
+
+    spans = _span_texts(item.css_first(_ADDRESS))
+    house_type = spans[2] if len(spans) > 2 else ''
+    if house_type not in ALLOWED_TYPES:
+        return None
+    address = spans[0] if len(spans) > 0 else ''
+    age = spans[1] if len(spans) > 1 else ''
+    if age == "--":
+        age = ""
+
+    spans = _span_texts(item.css_first(_HOUSE_INFO))
+    area = ""
+    if len(spans) > 0:
+        match = _NUMBER_RE.search(spans[0])
+        area = match.group() if match else ""
+    Actual_space = ""
+    if len(spans) > 1:
+        match = _NUMBER_RE.search(spans[1])
+        Actual_space = match.group() if match else ""
+    layout = spans[2] if len(spans) > 2 else ""
+    if layout == "--":
+        layout = ""
+    floor = spans[3] if len(spans) > 3 else ""
+    if floor == "--樓/--樓":
+        floor = ""
+
+    Car_Grip_tag = item.css_first(_PARKING)
+    Car_Grip = _text(Car_Grip_tag) if Car_Grip_tag is not None else ''
+    if Car_Grip == '':
+        Car_Grip = '無車位'
+
+    price = ""
+    price_block = item.css_first(_PRICE_BLOCK)
+    if price_block is not None:
+        red_price_span = price_block.css_first(_RED_PRICE)
+        if red_price_span is not None:
+            match = _PRICE_RE.search(_text(red_price_span))
+            price = match.group().replace(",", "") if match else ""
+
+    house_id = '無編號'
+    a_tag = item.css_first(_LINK)
+    if a_tag is not None:
+        # <a href> 沒有值時 lexbor 回傳 None，BeautifulSoup 為空字串
+        match = _HOUSE_ID_RE.search(a_tag.attributes.get('href') or '')
+        if match:
+            house_id = match.group(1)
+
+    return {
+        '標題': title,
+        '地址': address,
+        '屋齡': age,
+        '類型': house_type,
+        '建坪': area,
+        '主+陽': Actual_space,
+        '格局': layout,
+        '樓層': floor,
+        '車位': Car_Grip,
+        '總價(萬)': price,
+        '編號': house_id
+    }
+
+
+def parse_list_page_fast(html):
+    """與 sinyi_parser.parse_list_page 相同的介面與輸出：沒有任何卡片時回傳 None"""
+    if not FAST_PARSER_AVAILABLE:
+        raise RuntimeError("未安裝 selectolax，無法使用快速解析")
+    property_list = LexborHTMLParser(html).css(_ITEM)
+
+    if not property_list:
+        return None
+
+    rows = []
+    for item in property_list:
+        try:
+            row = parse_list_item_fast(item)
+        except Exception as e:
+            print(f"解析錯誤: {e}")
+            continue
+        if row is not None:
+            rows.append(row)
+    return rows
+
+
+def get_page_parser(engine="auto"):
+    """
+    依名稱取得列表頁解析函式："fast" / "bs4"；"auto" 在有 selectolax 時用快速解析，否則用 BeautifulSoup。
+    """
+    if engine == "bs4" or (engine == "auto" and not FAST_PARSER_AVAILABLE):
+        return parse_list_page
+    if engine in ("auto", "fast"):
+        return parse_list_page_fast
+    raise ValueError(f"未知的解析方式: {engine}")
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+# 信義房屋列表頁的 HTTP 抓取引擎：不開瀏覽器，共用連線池、有上限的並行抓取、全域限速、失敗重試
+import os
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from components.rate_limit import TokenBucket  # noqa: E402
+
+
+SINYI_BASE_URL = "https://www.sinyi.com.tw"
+LIST_PATH = "/buy/list/{city}/default-desc/{page}"
+
+# 同時抓取的頁數與每秒請求上限（對網站保持禮貌）
+DEFAULT_MAX_WORKERS = 4
+DEFAULT_RATE_PER_SEC = 2
+
+# 暫時性錯誤才重試
+RETRY_HTTP_STATUS = {429, 500, 502, 503, 504}
+
+HEADERS = {
+    "User-Agent": (
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+        "(KHTML, like Gecko) Chrome/124.0 Safari/537.36"
+    ),
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "zh-TW,zh;q=0.9,en;q=0.8",
+}
+
+
+class FetchError(Exception):
+    """重試後仍無法取得列表頁"""
+
+
+def list_page_url(city, page, base_url=SINYI_BASE_URL):
+    return base_url.rstrip("/") + LIST_PATH.format(city=city, page=page)
+
+
+_SHARED_BUDGET = None
+_SHARED_BUDGET_LOCK = threading.Lock()
+
+
+def shared_budget(rate_per_sec=DEFAULT_RATE_PER_SEC, max_inflight=DEFAULT_MAX_WORKERS):
+    """
+    整個 process 共用的禮貌預算：(限速器, 同時請求上限的 semaphore)。
+    第一次呼叫時依參數建立，之後沿用；多個城市同時抓取也不會超過這個預算。
+    """
+    global _SHARED_BUDGET
+    with _SHARED_BUDGET_LOCK:
+        if _SHARED_BUDGET is None:
+            _SHARED_BUDGET = (
+                TokenBucket(rate_per_sec, capacity=max(1.0, float(rate_per_sec))),
+                threading.BoundedSemaphore(max(1, int(max_inflight))),
+            )
+        return _SHARED_BUDGET
+
+
+class SinyiHttpFetcher:
+    """
+    以 HTTP 直接抓取列表頁。
+
+    base_url 可改成本機測試伺服器（例如提供存好的 HTML fixture）；
+    max_workers 為同時抓取中的頁數，rate_per_sec 為每秒請求上限。
+    limiter / inflight 預設為 shared_budget()，同一 process 內所有抓取共用。
+    """
+
+    def __init__(self, base_url=SINYI_BASE_URL, max_workers=DEFAULT_MAX_WORKERS,
+                 rate_per_sec=DEFAULT_RATE_PER_SEC, retries=3, backoff=1.0, timeout=20,
+                 limiter=None, inflight=None):
+        self.base_url = base_url
+        self.max_workers = max(1, int(max_workers))
+        shared_limiter, shared_inflight = shared_budget(rate_per_sec, self.max_workers)
+        self.limiter = limiter or shared_limiter
+        self.inflight = inflight or shared_inflight
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_workers)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update(HEADERS)
+
+    def fetch_page(self, city, page):
+        """抓取單一列表頁 HTML；重試後仍失敗拋出 FetchError"""
+        url = list_page_url(city, page, self.base_url)
+        for attempt in range(self.retries + 1):
+            last_try = attempt == self.retries
+            self.limiter.acquire()
+            try:
+                with self.inflight:
+                    resp = self.session.get(url, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if last_try:
+                    raise FetchError(f"第 {page} 頁連線失敗: {e}") from e
+            else:
+                if resp.status_code == 404:
+                    # 超過最後一頁時部分網站直接回 404，視為空頁
+                    return ""
+                if resp.status_code not in RETRY_HTTP_STATUS:
+                    if resp.status_code >= 400:
+                        raise FetchError(f"第 {page} 頁回應 HTTP {resp.status_code}")
+                    if not resp.encoding or resp.encoding.lower() == "iso-8859-1":
+                        # 未宣告 charset 時 requests 預設 ISO-8859-1，網站實際為 UTF-8
+                        resp.encoding = "utf-8"
+                    return resp.text
+                if last_try:
+                    raise FetchError(f"第 {page} 頁回應 HTTP {resp.status_code}")
+            time.sleep(self.backoff * (2 ** attempt))
+
+    def iter_pages(self, city, start_page=1):
+        """
+        依頁碼順序產生 (page, html)，同時最多 max_workers 頁在抓取中。
+
+        總頁數未知：呼叫端解析到空頁時停止讀取即可，尚未開始的請求會被取消
+        （最多多抓 max_workers - 1 頁）。
+        """
+        pool = ThreadPoolExecutor(max_workers=self.max_workers)
+        pending = deque()
+        next_page = start_page
+        try:
+            while True:
+                while len(pending) < self.max_workers:
+                    pending.append((next_page, pool.submit(self.fetch_page, city, next_page)))
+                    next_page += 1
+                page, future = pending.popleft()
+                print(f"正在抓取第 {page} 頁: {list_page_url(city, page, self.base_url)}")
+                yield page, future.result()
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
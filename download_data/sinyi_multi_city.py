@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+# 多城市抓取：同時抓取多個城市，所有城市共用同一份禮貌預算（每秒請求數與同時請求數），
+# 每個城市各自有檢查點並寫出自己的 CSV，完成後自動登記到城市選單
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from components.city_registry import register_city, resolve_city  # noqa: E402
+from config import SINYI_CITIES  # noqa: E402
+
+from sinyi_http_fetch import DEFAULT_MAX_WORKERS, DEFAULT_RATE_PER_SEC, SINYI_BASE_URL, shared_budget
+from sinyi_taichung_buy import run
+
+# 同時進行的城市數
+DEFAULT_CITY_WORKERS = 4
+
+
+def parse_cities(value):
+    """"all" 或以逗號分隔的城市（中文名稱或城市代碼）→ [(代碼, 顯示名稱)]"""
+    if not value or value.strip().lower() == "all":
+        return [(slug, name) for name, slug in SINYI_CITIES.items()]
+    cities = [resolve_city(v) for v in value.split(",") if v.strip()]
+    return list(dict.fromkeys(cities))
+
+
+def crawl_cities(cities, engine="http", base_url=SINYI_BASE_URL, mode="full", resume=True,
+                 data_dir="./Data", max_cities=DEFAULT_CITY_WORKERS):
+    """
+    同時抓取多個城市，回傳 {代碼: {"name", "status", "rows", "seconds"}}。
+
+    總請求量受 shared_budget 限制，總耗時取決於預算而不是城市數；
+    單一城市失敗不影響其他城市，重新執行時會從該城市的檢查點繼續。
+    """
+    results = {}
+
+    def crawl_one(slug, name):
+        started = time.monotonic()
+        output_path, total = run(slug, engine, base_url, mode, resume, data_dir)
+        register_city(slug, name, data_dir, rows=total)
+        return total, time.monotonic() - started
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_cities, len(cities) or 1))) as pool:
+        futures = {pool.submit(crawl_one, slug, name): (slug, name) for slug, name in cities}
+        for done, future in enumerate(as_completed(futures), start=1):
+            slug, name = futures[future]
+            try:
+                total, seconds = future.result()
+                results[slug] = {"name": name, "status": "完成", "rows": total, "seconds": seconds}
+                print(f"[{done}/{len(cities)}] {name}（{slug}）完成：{total} 筆，{seconds:.0f} 秒")
+            except Exception as e:
+                results[slug] = {"name": name, "status": f"失敗: {e}", "rows": 0, "seconds": 0.0}
+                print(f"[{done}/{len(cities)}] {name}（{slug}）失敗：{e}")
+    return results
+
+
+if __name__ == "__main__":
+    # -----------------------------
+    # CITIES：all 或逗號分隔的城市；其餘設定與單一城市抓取相同
+    # -----------------------------
+    cities = parse_cities(os.environ.get("CITIES", "all"))
+    engine = os.environ.get("FETCH_ENGINE", "http")
+    mode = os.environ.get("CRAWL_MODE", "full")
+    base_url = os.environ.get("SINYI_BASE_URL", SINYI_BASE_URL)
+    resume = os.environ.get("CRAWL_RESUME", "1") != "0"
+    max_cities = int(os.environ.get("CITY_WORKERS", DEFAULT_CITY_WORKERS))
+
+    # 先以環境變數建立共用預算，之後每個城市的抓取都沿用
+    shared_budget(
+        float(os.environ.get("FETCH_RATE", DEFAULT_RATE_PER_SEC)),
+        int(os.environ.get("FETCH_WORKERS", DEFAULT_MAX_WORKERS)),
+    )
+    print(f"目標城市: {len(cities)} 個（同時 {max_cities} 個，抓取方式: {engine}，模式: {mode}）")
+
+    started = time.monotonic()
+    results = crawl_cities(cities, engine, base_url, mode, resume, "./Data", max_cities)
+
+    print(f"\n{'城市':<8}{'筆數':>8}{'秒數':>8}  狀態")
+    for slug, r in results.items():
+        print(f"{r['name']:<8}{r['rows']:>8}{r['seconds']:>8.0f}  {r['status']}")
+    failed = [slug for slug, r in results.items() if r["status"] != "完成"]
+    print(f"總耗時 {time.monotonic() - started:.0f} 秒，成功 {len(results) - len(failed)} / {len(results)} 個城市")
+    if failed:
+        sys.exit(1)
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+# 信義房屋買屋列表頁解析：Selenium 與 HTTP 兩種抓取方式共用，輸出欄位與順序完全相同
+import re
+
+from bs4 import BeautifulSoup
+
+# -----------------------------
+# 只保留這幾種類型
+# -----------------------------
+ALLOWED_TYPES = {"大樓", "華廈", "公寓", "套房", "透天", "別墅"}
+
+# CSV 欄位順序
+COLUMNS = ['標題', '地址', '屋齡', '類型', '建坪', '主+陽', '格局', '樓層', '車位', '總價(萬)', '編號']
+
+
+def parse_list_item(item):
+    """單一 buy-list-item → 房屋 dict；不在 ALLOWED_TYPES 內回傳 None"""
+    # 標題
+    title = item.find('div', class_='LongInfoCard_Type_Name').get_text(strip=True)
+
+    # 地址/屋齡/類型
+    address_tag = item.find('div', class_='LongInfoCard_Type_Address')
+    spans = address_tag.find_all('span') if address_tag else []
+    address = spans[0].get_text(strip=True) if len(spans) > 0 else ''
+    age = spans[1].get_text(strip=True) if len(spans) > 1 else ''
+    if age == "--":
+        age = ""
+    house_type = spans[2].get_text(strip=True) if len(spans) > 2 else ''
+
+    # 只保留指定類型
+    if house_type not in ALLOWED_TYPES:
+        return None
+
+    # 建坪/主+陽/格局/樓層
+    house_info_tag = item.find('div', class_='longInfoCard_LongInfoCard_Type_HouseInfo__tZXDa')
+    spans = house_info_tag.find_all('span') if house_info_tag else []
+
+    area = ""
+    if len(spans) > 0:
+        match = re.search(r'[\d.]+', spans[0].get_text(strip=True))
+        area = match.group() if match else ""
+
+    Actual_space = ""
+    if len(spans) > 1:
+        match = re.search(r'[\d.]+', spans[1].get_text(strip=True))
+        Actual_space = match.group() if match else ""
+
+    layout = spans[2].get_text(strip=True) if len(spans) > 2 else ""
+    if layout == "--":
+        layout = ""
+    floor = spans[3].get_text(strip=True) if len(spans) > 3 else ""
+    if floor == "--樓/--樓":
+        floor = ""
+
+    # 車位
+    Car_Grip_tag = item.find('span', class_='longInfoCard_LongInfoCard_Type_Parking__ZXl_e')
+    Car_Grip = Car_Grip_tag.get_text(strip=True) if Car_Grip_tag and Car_Grip_tag.get_text(strip=True) != '' else '無車位'
+
+    # 總價
+    price = ""
+    price_block = item.find('div', class_='LongInfoCard_Type_Right')
+    if price_block:
+        red_price_span = price_block.find('span', style=lambda s: s and "color: rgb(221, 37, 37)" in s)
+        if red_price_span:
+            price = red_price_span.get_text(strip=True)
+            match = re.search(r'[\d,.]+', price)
+            price = match.group().replace(",", "") if match else ""
+
+    # 編號
+    a_tag = item.find('a', href=True)
+    house_id = '無編號'
+    if a_tag:
+        match = re.search(r'/buy/house/([A-Za-z0-9]+)', a_tag['href'])
+        if match:
+            house_id = match.group(1)
+
+    return {
+        '標題': title,
+        '地址': address,
+        '屋齡': age,
+        '類型': house_type,
+        '建坪': area,
+        '主+陽': Actual_space,
+        '格局': layout,
+        '樓層': floor,
+        '車位': Car_Grip,
+        '總價(萬)': price,
+        '編號': house_id
+    }
+
+
+def parse_list_page(html):
+    """
+    列表頁 HTML → 房屋 dict 清單（依頁面順序）。
+    頁面上沒有任何 buy-list-item 時回傳 None，代表已超過最後一頁。
+    """
+    soup = BeautifulSoup(html, 'html.parser')
+    property_list = soup.find_all('div', class_='buy-list-item')
+
+    if not property_list:
+        return None
+
+    rows = []
+    for item in property_list:
+        try:
+            row = parse_list_item(item)
+        except Exception as e:
+            print(f"解析錯誤: {e}")
+            continue
+        if row is not None:
+            rows.append(row)
+    return rows
@@ -1,156 +1,220 @@
 # -*- coding: utf-8 -*-
 import os
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from bs4 import BeautifulSoup
+import sys
 import pandas as pd
-import re
 import time
 
-# -----------------------------
-# 只保留這幾種類型
-# -----------------------------
-ALLOWED_TYPES = {"大樓", "華廈", "公寓", "套房", "透天", "別墅"}
-
-# -----------------------------
-# 從環境變數讀取城市，預設台中
-# -----------------------------
-city = os.environ.get("SINGLE_CITY", "Taichung-city")
-print(f"目標城市: {city}")
-
-# -----------------------------
-# Selenium headless 設定，不開啟瀏覽器畫面
-# -----------------------------
-options = Options()
-options.add_argument("--headless")
-options.add_argument("--disable-gpu")
-options.add_argument("--window-size=1920,1080")
-options.add_argument("--no-sandbox")
-options.add_argument("--disable-dev-shm-usage")
-
-driver = webdriver.Chrome(options=options)
-
-page = 1
-all_properties = []
-
-while True:
-    url = f"https://www.sinyi.com.tw/buy/list/{city}/default-desc/{page}"
-    print(f"正在抓取第 {page} 頁: {url}")
-    driver.get(url)
-
-    # 等待房屋列表載入完成
-    try:
-        WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located((By.CSS_SELECTOR, "div.buy-list-item"))
-        )
-    except:
-        print(f"第 {page} 頁載入超時，結束抓取")
-        break
-
-    # 滾動頁面，確保 JS 渲染完成
-    driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-    time.sleep(2)
+try:
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+    SELENIUM_AVAILABLE = True
+except ImportError:
+    SELENIUM_AVAILABLE = False
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from components.city_registry import listing_file_name, read_manifest  # noqa: E402
+from components.listing_history import record_snapshot  # noqa: E402
+
+from sinyi_checkpoint import CrawlCheckpoint
+from sinyi_delta import DEFAULT_STOP_PAGES, DeltaTracker, load_snapshot
+from sinyi_fast_parser import get_page_parser
+from sinyi_http_fetch import (
+    DEFAULT_MAX_WORKERS, DEFAULT_RATE_PER_SEC, SINYI_BASE_URL, SinyiHttpFetcher, list_page_url,
+    shared_budget,
+)
+
+
+def selenium_pages(city, start_page=1, base_url=SINYI_BASE_URL):
+    """以 headless Chrome 依序產生 (page, html)；等不到房屋列表時結束。每次載入頁面都受 shared_budget 限制"""
+    if not SELENIUM_AVAILABLE:
+        raise RuntimeError("未安裝 selenium，無法使用瀏覽器抓取")
 
     # -----------------------------
-    # 解析 HTML
+    # Selenium headless 設定，不開啟瀏覽器畫面
     # -----------------------------
-    soup = BeautifulSoup(driver.page_source, 'html.parser')
-    property_list = soup.find_all('div', class_='buy-list-item')
-
-    if not property_list:
-        print("已經沒有更多頁面，結束抓取")
-        break
-
-    for item in property_list:
+    options = Options()
+    options.add_argument("--headless")
+    options.add_argument("--disable-gpu")
+    options.add_argument("--window-size=1920,1080")
+    options.add_argument("--no-sandbox")
+    options.add_argument("--disable-dev-shm-usage")
+
+    limiter, inflight = _budget()
+    driver = webdriver.Chrome(options=options)
+    page = start_page
+    try:
+        while True:
+            url = list_page_url(city, page, base_url)
+            print(f"正在抓取第 {page} 頁: {url}")
+            limiter.acquire()
+            with inflight:
+                driver.get(url)
+
+            # 等待房屋列表載入完成
+            try:
+                WebDriverWait(driver, 10).until(
+                    EC.presence_of_element_located((By.CSS_SELECTOR, "div.buy-list-item"))
+                )
+            except Exception:
+                print(f"第 {page} 頁載入超時，結束抓取")
+                return
+
+            # 滾動頁面，確保 JS 渲染完成
+            driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
+            time.sleep(2)
+
+            yield page, driver.page_source
+            page += 1
+    finally:
+        driver.quit()
+
+
+def _budget():
+    """與 HTTP 抓取共用的禮貌預算（尚未建立時依環境變數 FETCH_RATE / FETCH_WORKERS 建立）"""
+    return shared_budget(
+        float(os.environ.get("FETCH_RATE", DEFAULT_RATE_PER_SEC)),
+        int(os.environ.get("FETCH_WORKERS", DEFAULT_MAX_WORKERS)),
+    )
+
+
+def http_pages(city, start_page=1, base_url=SINYI_BASE_URL):
+    """以 HTTP 並行抓取列表頁，並行數與限速可用環境變數 FETCH_WORKERS / FETCH_RATE 調整"""
+    fetcher = SinyiHttpFetcher(
+        base_url=base_url,
+        max_workers=int(os.environ.get("FETCH_WORKERS", DEFAULT_MAX_WORKERS)),
+        rate_per_sec=float(os.environ.get("FETCH_RATE", DEFAULT_RATE_PER_SEC)),
+    )
+    return fetcher.iter_pages(city, start_page)
+
+
+def parse_page(city, page, html):
+    """
+    解析列表頁；解析方式由環境變數 PARSER_ENGINE（auto / fast / bs4）決定。
+    設定 SAVE_HTML_DIR 時同時保存原始 HTML，可作為解析器比對與效能測試的語料。
+    """
+    save_dir = os.environ.get("SAVE_HTML_DIR")
+    if save_dir:
+        os.makedirs(save_dir, exist_ok=True)
+        with open(os.path.join(save_dir, f"{city}_{page}.html"), "w", encoding="utf-8") as f:
+            f.write(html)
+    return get_page_parser(os.environ.get("PARSER_ENGINE", "auto"))(html)
+
+
+def crawl_pages(city, engine="http", base_url=SINYI_BASE_URL, start_page=1):
+    """
+    依頁碼順序產生 (page, rows)，抓到空頁時結束；呼叫端可隨時停止讀取。
+
+    engine="http" 時先以 HTTP 抓取，失敗時改用 Selenium 從失敗的頁碼繼續；
+    engine="selenium" 時全程使用瀏覽器。
+    """
+    next_page = start_page
+
+    if engine == "http":
         try:
-            # 標題
-            title = item.find('div', class_='LongInfoCard_Type_Name').get_text(strip=True)
-
-            # 地址/屋齡/類型
-            address_tag = item.find('div', class_='LongInfoCard_Type_Address')
-            spans = address_tag.find_all('span') if address_tag else []
-            address = spans[0].get_text(strip=True) if len(spans) > 0 else ''
-            age = spans[1].get_text(strip=True) if len(spans) > 1 else ''
-            if age == "--":
-                age = ""
-            house_type = spans[2].get_text(strip=True) if len(spans) > 2 else ''
-
-            # 只保留指定類型
-            if house_type not in ALLOWED_TYPES:
-                continue
-
-            # 建坪/主+陽/格局/樓層
-            house_info_tag = item.find('div', class_='longInfoCard_LongInfoCard_Type_HouseInfo__tZXDa')
-            spans = house_info_tag.find_all('span') if house_info_tag else []
-
-            area = ""
-            if len(spans) > 0:
-                match = re.search(r'[\d.]+', spans[0].get_text(strip=True))
-                area = match.group() if match else ""
-
-            Actual_space = ""
-            if len(spans) > 1:
-                match = re.search(r'[\d.]+', spans[1].get_text(strip=True))
-                Actual_space = match.group() if match else ""
-
-            layout = spans[2].get_text(strip=True) if len(spans) > 2 else ""
-            if layout == "--":
-                layout = ""
-            floor = spans[3].get_text(strip=True) if len(spans) > 3 else ""
-            if floor == "--樓/--樓":
-                floor = ""
-
-            # 車位
-            Car_Grip_tag = item.find('span', class_='longInfoCard_LongInfoCard_Type_Parking__ZXl_e')
-            Car_Grip = Car_Grip_tag.get_text(strip=True) if Car_Grip_tag and Car_Grip_tag.get_text(strip=True) != '' else '無車位'
-
-            # 總價
-            price = ""
-            price_block = item.find('div', class_='LongInfoCard_Type_Right')
-            if price_block:
-                red_price_span = price_block.find('span', style=lambda s: s and "color: rgb(221, 37, 37)" in s)
-                if red_price_span:
-                    price = red_price_span.get_text(strip=True)
-                    match = re.search(r'[\d,.]+', price)
-                    price = match.group().replace(",", "") if match else ""
-
-            # 編號
-            a_tag = item.find('a', href=True)
-            house_id = '無編號'
-            if a_tag:
-                match = re.search(r'/buy/house/([A-Za-z0-9]+)', a_tag['href'])
-                if match:
-                    house_id = match.group(1)
-
-            all_properties.append({
-                '標題': title,
-                '地址': address,
-                '屋齡': age,
-                '類型': house_type,
-                '建坪': area,
-                '主+陽': Actual_space,
-                '格局': layout,
-                '樓層': floor,
-                '車位': Car_Grip,
-                '總價(萬)': price,
-                '編號': house_id
-            })
+            for page, html in http_pages(city, start_page, base_url):
+                rows = parse_page(city, page, html)
+                if rows is None:
+                    if page == 1:
+                        # 第 1 頁就沒有列表：多半是頁面需要 JS 渲染或被擋，交給瀏覽器處理
+                        raise RuntimeError("第 1 頁沒有房屋列表")
+                    print("已經沒有更多頁面，結束抓取")
+                    return
+                yield page, rows
+                next_page = page + 1
         except Exception as e:
-            print(f"解析錯誤: {e}")
-            continue
+            print(f"HTTP 抓取失敗（{e}），改用 Selenium 從第 {next_page} 頁繼續")
+
+    for page, html in selenium_pages(city, next_page, base_url):
+        rows = parse_page(city, page, html)
+        if rows is None:
+            print("已經沒有更多頁面，結束抓取")
+            return
+        yield page, rows
+
+
+def crawl(city, engine="http", base_url=SINYI_BASE_URL):
+    """抓取整個城市的列表，回傳房屋 dict 清單（不寫檢查點）"""
+    return [row for _, rows in crawl_pages(city, engine, base_url) for row in rows]
+
+
+def run(city, engine="http", base_url=SINYI_BASE_URL, mode="full", resume=True, data_dir="./Data"):
+    """
+    抓取並輸出 CSV，回傳輸出路徑與筆數。
+
+    每頁解析完立即寫入檢查點，中斷後重新執行會從最後完成的頁面繼續（resume=False 則重來）。
+    一筆都沒有抓到時拋出 RuntimeError，不覆寫既有的 CSV。
+    mode="delta" 時與上一次的 CSV 比對 編號 + 總價，連續多頁未變動就停止，其餘沿用上一次的資料。
+    """
+    output_path = os.path.join(data_dir, f"{city}_buy_properties.csv")
+    checkpoint = CrawlCheckpoint(city, data_dir, mode)
+    # git checkout 會重設 CSV 的修改時間，上一次輸出的時間以城市登記檔記錄的為準
+    written_at = read_manifest(data_dir).get(listing_file_name(city), {}).get("updated_at")
+    start_page = checkpoint.resume(written_at) if resume else checkpoint.reset()
+    if checkpoint.mode != mode:
+        print(f"檢查點以 {checkpoint.mode} 模式開始，沿用該模式接續")
+        mode = checkpoint.mode
+
+    delta = None
+    if mode == "delta":
+        delta = DeltaTracker(
+            load_snapshot(output_path),
+            stop_pages=int(os.environ.get("DELTA_STOP_PAGES", DEFAULT_STOP_PAGES)),
+        )
+        # 接續時先以已完成的頁面重建比對狀態
+        for _, rows in checkpoint.pages():
+            delta.observe(rows)
+
+    if start_page > 1:
+        print(f"從檢查點繼續：已完成 {start_page - 1} 頁")
+
+    if delta is None or not delta.stopped:
+        for page, rows in crawl_pages(city, engine, base_url, start_page):
+            checkpoint.append_page(page, rows)
+            if delta is not None and delta.observe(rows):
+                print(f"至第 {page} 頁已連續 {delta.stop_pages} 頁無變動，停止抓取並沿用上次資料")
+                break
+
+    all_properties = checkpoint.rows()
+    if delta is not None:
+        carried = delta.carry_over()
+        all_properties.extend(carried)
+        print(f"增量結果：新上架 {delta.stats['new']}、價格變動 {delta.stats['changed']}、"
+              f"未變動 {delta.stats['unchanged']}、沿用 {len(carried)} 筆")
+
+    if not all_properties:
+        # 多半是被擋或頁面改版；寫出空檔會蓋掉上一次的資料，且空 CSV 讀取時會出錯
+        raise RuntimeError(f"{city} 沒有抓到任何房屋資料，保留上一次的 CSV")
+
+    # -----------------------------
+    # 存成 CSV，放到 Data 資料夾
+    # -----------------------------
+    os.makedirs(data_dir, exist_ok=True)
+    df = pd.DataFrame(all_properties)
+    df.to_csv(output_path, index=False, encoding='utf-8-sig')
+    checkpoint.finish()
 
-    page += 1
+    # 同一份結果另存為當天的快照分區（當天已有快照則略過），供價格歷史與快照比對使用
+    if not df.empty:
+        diff = record_snapshot(df, city, history_dir=os.path.join(data_dir, "history"))
+        if diff is not None:
+            print(f"快照比對：新上架 {len(diff['new'])}、下架 {len(diff['removed'])}、"
+                  f"調價 {len(diff['price_changed'])}")
+    return output_path, len(all_properties)
 
-# -----------------------------
-# 存成 CSV，放到 Data 資料夾
-# -----------------------------
-os.makedirs("./Data", exist_ok=True)
-output_path = f"./Data/{city}_buy_properties.csv"
-df = pd.DataFrame(all_properties)
-df.to_csv(output_path, index=False, encoding='utf-8-sig')
-print(f"總共抓到 {len(all_properties)} 筆房屋資料，已儲存到 {output_path}")
 
-driver.quit()
+if __name__ == "__main__":
+    # -----------------------------
+    # 從環境變數讀取城市、抓取方式與模式，預設台中、HTTP、完整抓取
+    # -----------------------------
+    city = os.environ.get("SINGLE_CITY", "Taichung-city")
+    engine = os.environ.get("FETCH_ENGINE", "http")
+    mode = os.environ.get("CRAWL_MODE", "full")
+    base_url = os.environ.get("SINYI_BASE_URL", SINYI_BASE_URL)
+    resume = os.environ.get("CRAWL_RESUME", "1") != "0"
+    print(f"目標城市: {city}（抓取方式: {engine}，模式: {mode}）")
+
+    output_path, total = run(city, engine, base_url, mode, resume)
+    print(f"總共抓到 {total} 筆房屋資料，已儲存到 {output_path}")
@@ -1,10 +1,12 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-import re
 import json
-import google.generativeai as genai
+from components.llm_batch import placeholder_writer
+from components.llm_gateway import collect_stream_parts, get_gateway
 from components.favorites import FavoritesManager, normalize_property_id
+from components.cp_score import DEFAULT_SCORE_WEIGHTS, score_pool
+from components.listing_store import get_listing_df
 
 
 # ══════════════════════════════════════════════
@@ -12,36 +14,14 @@ from components.favorites import FavoritesManager, normalize_property_id
 # ══════════════════════════════════════════════
 
 def _load_data():
-    if 'all_properties_df' in st.session_state and not st.session_state.all_properties_df.empty:
-        return st.session_state.all_properties_df
     try:
-        df = pd.read_csv('./Data/Taichung-city_buy_properties.csv')
-        if '行政區' not in df.columns and '地址' in df.columns:
-            df['行政區'] = df['地址'].apply(
-                lambda addr: re.search(r'[市縣](.+?[區鄉鎮市])', str(addr)).group(1)
-                if pd.notna(addr) and re.search(r'[市縣](.+?[區鄉鎮市])', str(addr)) else ""
-            )
+        df = get_listing_df()
         st.session_state.all_properties_df = df
         return df
     except Exception as e:
         return None
 
 
-def _parse_age(x):
-    if pd.isna(x): return np.nan
-    match = re.search(r'(\d+\.?\d*)', str(x))
-    return float(match.group(1)) if match else np.nan
-
-
-def _parse_floor(x):
-    if pd.isna(x): return np.nan
-    try:
-        val = re.search(r'\d+', str(x).split('樓')[0])
-        return int(val.group()) if val else np.nan
-    except:
-        return np.nan
-
-
 def tool_search_properties(district="", housetype="", budget_max=0, budget_min=0, rooms=0, age_max=0):
     """搜尋房屋工具"""
     df = _load_data()
@@ -64,16 +44,11 @@ def tool_search_properties(district="", housetype="", budget_max=0, budget_min=0
         result['_price'] = pd.to_numeric(result['總價(萬)'], errors='coerce')
         result = result[result['_price'] >= budget_min]
 
-    if rooms > 0 and '格局' in result.columns:
-        def get_rooms(layout):
-            m = re.search(r'(\d+)房', str(layout))
-            return int(m.group(1)) if m else 0
-        result['_rooms'] = result['格局'].apply(get_rooms)
-        result = result[result['_rooms'] >= rooms]
+    if rooms > 0 and '房間數' in result.columns:
+        result = result[result['房間數'].fillna(0) >= rooms]
 
-    if age_max > 0 and '屋齡' in result.columns:
-        result['_age'] = result['屋齡'].apply(_parse_age)
-        result = result[result['_age'] <= age_max]
+    if age_max > 0 and '屋齡數值' in result.columns:
+        result = result[result['屋齡數值'] <= age_max]
 
     return result.to_dict('records')
 
@@ -83,10 +58,7 @@ def tool_score_properties(properties, weights=None, use_pool=None):
         return []
 
     if weights is None:
-        weights = st.session_state.get('score_weights', {
-            "價格競爭力": 30, "空間效率": 25,
-            "屋齡優勢": 20, "樓層定位": 15, "格局流動性": 10
-        })
+        weights = st.session_state.get('score_weights', DEFAULT_SCORE_WEIGHTS)
 
     first = properties[0]
     district = first.get('行政區', '')
@@ -111,70 +83,11 @@ def tool_score_properties(properties, weights=None, use_pool=None):
         if df_pool.empty:
             df_pool = pd.DataFrame(properties)
 
-    def score_one(row):
-        try:
-            target_price = pd.to_numeric(row.get('總價(萬)', np.nan), errors='coerce')
-            target_area  = pd.to_numeric(row.get('建坪', np.nan), errors='coerce')
-            if pd.isna(target_price) or pd.isna(target_area) or target_area == 0:
-                return np.nan
-
-            compare = df_pool.copy()
-            compare['_p'] = pd.to_numeric(compare['總價(萬)'], errors='coerce')
-            compare['_a'] = pd.to_numeric(compare['建坪'], errors='coerce')
-            compare = compare.dropna(subset=['_p', '_a'])
-            n = len(compare)
-            if n == 0: return np.nan
-
-            price_pct = (compare['_p'] < target_price).sum() / n * 100
-            score_price = max(0.0, min(10.0, 10 - price_pct / 10))
-
-            score_space = 5.0
-            actual = pd.to_numeric(row.get('主+陽', np.nan), errors='coerce')
-            if not pd.isna(actual) and float(actual) > 0 and float(target_area) > 0:
-                usage = float(actual) / float(target_area)
-                compare['_r'] = pd.to_numeric(compare['主+陽'], errors='coerce') / compare['_a']
-                med = compare['_r'].median()
-                if not pd.isna(med) and med > 0:
-                    score_space = max(0.0, min(10.0, (usage / med) * 5))
-
-            score_age = 5.0
-            compare['_age'] = compare['屋齡'].apply(_parse_age)
-            target_age = _parse_age(row.get('屋齡'))
-            df_age = compare.dropna(subset=['_age'])
-            if len(df_age) > 0 and not pd.isna(target_age):
-                age_pct = (df_age['_age'] < target_age).sum() / len(df_age) * 100
-                score_age = max(0.0, min(10.0, 10 - age_pct / 10))
-
-            score_floor = 5.0
-            compare['_floor'] = compare['樓層'].apply(_parse_floor)
-            target_floor = _parse_floor(row.get('樓層'))
-            df_floor = compare.dropna(subset=['_floor'])
-            if len(df_floor) > 0 and not pd.isna(target_floor):
-                floor_pct = (df_floor['_floor'] < target_floor).sum() / len(df_floor) * 100
-                score_floor = max(0.0, min(10.0, 10 - abs(floor_pct - 50) / 5))
-
-            score_layout = 0.0
-            target_layout = str(row.get('格局', '')).strip()
-            if target_layout and '格局' in compare.columns:
-                same = (compare['格局'].astype(str).str.strip() == target_layout).sum()
-                score_layout = max(0.0, min(10.0, (same / n * 100) / 3))
-
-            weighted = (
-                score_price  * (weights['價格競爭力'] / 100) +
-                score_space  * (weights['空間效率']   / 100) +
-                score_age    * (weights['屋齡優勢']   / 100) +
-                score_floor  * (weights['樓層定位']   / 100) +
-                score_layout * (weights['格局流動性'] / 100)
-            )
-            return round(weighted * 10, 1)
-        except:
-            return np.nan
-
-    # 對全區所有房屋評分，不只是搜尋結果
+    # 對全區所有房屋評分，不只是搜尋結果（整個母體一次向量化計算）
     all_records = df_pool.to_dict('records')
+    totals = score_pool(df_pool, weights)['總分'].tolist()
     scored = []
-    for p in all_records:
-        cp = score_one(p)
+    for p, cp in zip(all_records, totals):
         p['CP分數'] = cp if not pd.isna(cp) else 0
         scored.append(p)
 
@@ -198,7 +111,7 @@ def tool_get_market_stats(district="", housetype=""):
 
     filtered['_price'] = pd.to_numeric(filtered['總價(萬)'], errors='coerce')
     filtered['_area']  = pd.to_numeric(filtered['建坪'], errors='coerce')
-    filtered['_age']   = filtered['屋齡'].apply(_parse_age)
+    filtered['_age']   = filtered['屋齡數值']
 
     stats = {
         "區域": district or "全台中市",
@@ -280,8 +193,8 @@ TOOLS = [
 # Agent 執行邏輯
 # ══════════════════════════════════════════════
 
-def run_agent(user_input, model, step_container):
-    """執行 Agent，回傳最終回覆與推薦房屋"""
+def run_agent(user_input, model, step_container, on_text=None):
+    """執行 Agent，回傳最終回覆與推薦房屋；有 on_text 時以串流呼叫，邊收邊回報目前的回覆文字"""
 
     history = st.session_state.get('assistant_history', [])
 
@@ -315,13 +228,17 @@ def run_agent(user_input, model, step_container):
             response = model.generate_content(
                 messages,
                 tools=TOOLS,
-                generation_config={"temperature": 0.3}
+                generation_config={"temperature": 0.3},
+                stream=on_text is not None
             )
+            if on_text is not None:
+                parts = collect_stream_parts(response, on_text)
         except Exception as e:
             return f"❌ Gemini 呼叫錯誤：{e}", []
 
-        candidate = response.candidates[0]
-        parts = candidate.content.parts
+        if on_text is None:
+            candidate = response.candidates[0]
+            parts = candidate.content.parts
 
         has_tool_call = any(hasattr(p, 'function_call') and p.function_call.name for p in parts)
         text_parts = [p.text for p in parts if hasattr(p, 'text') and p.text]
@@ -473,7 +390,6 @@ def render_assistant_page():
         return
 
     try:
-        genai.configure(api_key=gemini_key)
         system_instruction = """你是台中市房產 AI 助手，名字叫「房小智」。
 
 你可以使用以下工具幫助使用者：
@@ -495,10 +411,8 @@ def render_assistant_page():
 - 推薦時房屋標題必須完整引用原始資料的標題，不可縮寫或修改
 - 不要說「請稍等」之類的話，直接呼叫工具執行"""
 
-        model = genai.GenerativeModel(
-            'gemini-2.5-flash',
-            system_instruction=system_instruction
-        )
+        # 工具呼叫的回應依對話狀態而定，只共用模型物件、不快取回應
+        model = get_gateway().get_model(gemini_key, 'gemini-2.5-flash', system_instruction)
 
     except Exception as e:
         st.error(f"❌ Gemini 初始化錯誤：{e}")
@@ -614,12 +528,15 @@ def render_assistant_page():
                 st.markdown("**⚙️ Agent 執行中...**")
                 step_box = st.container()
 
+            reply_placeholder = st.empty()
             with st.spinner("思考中..."):
-                final_reply, recommended = run_agent(final_input, model, step_box)
+                final_reply, recommended = run_agent(
+                    final_input, model, step_box, placeholder_writer(reply_placeholder)
+                )
 
             step_placeholder.empty()
 
-            st.write(final_reply)
+            reply_placeholder.write(final_reply)
 
             if recommended:
                 st.markdown("#### 🏆 推薦房屋")
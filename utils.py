@@ -1,94 +1,33 @@
 import os
-import pandas as pd
 import math
 import streamlit as st
+from components.city_registry import listing_name_map
+from components.listing_index import get_listing_index
 
 def get_city_options(data_dir="./Data"):
-    """ 獲取城市選項，只顯示對照表內有定義的檔案 """
+    """ 獲取城市選項，只顯示對照表內有定義的檔案（含爬蟲新登記的城市） """
     if not os.path.exists(data_dir):
         return {}
-    name_map = {
-        "Taichung-city_buy_properties.csv": "台中市",
-    }
+    name_map = listing_name_map(data_dir)
     files = [f for f in os.listdir(data_dir) if f.endswith(".csv")]
     options = {name_map[f]: f for f in files if f in name_map}
     return dict(sorted(options.items(), key=lambda x: x[0]))
 
 
 def filter_properties(df, filters):
-    """ 根據篩選條件過濾房產資料 """
-    filtered_df = df.copy()
-    try:
-        # 行政區
-        if filters.get('district') and filters['district'] != "不限":
-            if '行政區' in filtered_df.columns:
-                filtered_df = filtered_df[filtered_df['行政區'] == filters['district']]
-
-        # 類型
-        if filters.get('housetype') and filters['housetype'] != "不限":
-            if '類型' in filtered_df.columns:
-                filtered_df = filtered_df[
-                    filtered_df['類型'].astype(str).str.contains(filters['housetype'], case=False, na=False)
-                ]
-
-        # 預算
-        if filters.get('budget_min', 0) > 0 and '總價(萬)' in filtered_df.columns:
-            filtered_df = filtered_df[filtered_df['總價(萬)'] >= filters['budget_min']]
-        if filters.get('budget_max', 1000000) < 1000000 and '總價(萬)' in filtered_df.columns:
-            filtered_df = filtered_df[filtered_df['總價(萬)'] <= filters['budget_max']]
-
-        # 屋齡（改為區間篩選，支援 age_min + age_max）
-        if '屋齡' in filtered_df.columns:
-            age_min = filters.get('age_min', 0)
-            age_max = filters.get('age_max', 100)
-            # 非「不限」(0~100 全範圍) 才套用篩選
-            if not (age_min == 0 and age_max == 100):
-                filtered_df = filtered_df[
-                    (filtered_df['屋齡'] >= age_min) & (filtered_df['屋齡'] <= age_max)
-                ]
-
-        # 建坪
-        if filters.get('area_min', 0) > 0 and '建坪' in filtered_df.columns:
-            filtered_df = filtered_df[filtered_df['建坪'] >= filters['area_min']]
-
-        # 車位
-        if 'car_grip' in filters and '車位' in filtered_df.columns:
-            if filters['car_grip'] == "需要":
-                filtered_df = filtered_df[
-                    (filtered_df['車位'].notna()) &
-                    (filtered_df['車位'] != "無車位") &
-                    (filtered_df['車位'] != 0)
-                ]
-            elif filters['car_grip'] == "不要":
-                filtered_df = filtered_df[
-                    (filtered_df['車位'].isna()) |
-                    (filtered_df['車位'] == "無車位") |
-                    (filtered_df['車位'] == 0)
-                ]
-
-        # 房間數
-        if filters.get('num_rooms') and filters['num_rooms'] != "不限":
-            filtered_df = filtered_df[
-                pd.to_numeric(filtered_df['房間數'], errors='coerce') == filters['num_rooms']
-            ]
-
-        # 廳數
-        if filters.get('num_living') and filters['num_living'] != "不限":
-            filtered_df = filtered_df[
-                pd.to_numeric(filtered_df['廳數'], errors='coerce') == filters['num_living']
-            ]
-
-        # 衛數
-        if filters.get('num_baths') and filters['num_baths'] != "不限":
-            filtered_df = filtered_df[
-                pd.to_numeric(filtered_df['衛數'], errors='coerce') == filters['num_baths']
-            ]
+    """
+    根據篩選條件過濾房產資料。
 
+    條件在資料表的索引上以列編號求交集（不複製整張表），只取出符合的列；
+    同一份資料表的索引只建一次，重複的條件直接使用快取結果。
+    """
+    try:
+        rows = get_listing_index(df).query(filters)
     except Exception as e:
         st.error(f"篩選過程中發生錯誤: {e}")
         return df
 
-    return filtered_df
+    return df.iloc[rows]
 
 
 def display_pagination(df, items_per_page=10):